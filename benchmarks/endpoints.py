@@ -0,0 +1,241 @@
+"""
+Endpoint benchmark suite (driven by manage.py bench_endpoints).
+
+Every named route in hotel_backend/urls.py has a case below. Each case
+is requested through Django's test client against whatever database is
+active: the command points it at a throwaway database seeded by
+seed_hotels. Per endpoint the suite records latency percentiles,
+queries per request and the peak Python allocation of one request. The
+results are JSON, so they can be committed as benchmarks/baseline.json
+and compared against later runs.
+
+Query counts are deterministic and gate strictly. Latency and memory
+gate with a relative tolerance above a noise floor, and are only
+meaningful against a baseline recorded on the same kind of machine.
+"""
+import itertools
+import json
+import math
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import date, timedelta
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from bookings.auth import EmailTokenObtainPairSerializer
+from bookings.cache import catalog_cache
+from bookings.models import Hotel, Room, User
+from payment.models import Payment
+
+# Namespaces that belong to third-party apps rather than our API.
+IGNORED_NAMESPACES = {'admin', 'rest_framework'}
+
+# build(fixtures, n) -> (path, payload); n counts calls to the case so
+# writes can use fresh rows on every request.
+Case = namedtuple('Case', 'name method auth build')
+
+FAR_FUTURE = date(2040, 1, 1)
+
+
+def _get(name, query=None, **kwargs):
+    def build(fixtures, n):
+        resolve = lambda values: {key: value(fixtures) if callable(value) else value for key, value in values.items()}
+        return reverse(name, kwargs=resolve(kwargs)), resolve(query or {})
+    return build
+
+
+def _booking(fixtures, n):
+    rooms = fixtures['rooms']
+    room = rooms[n % len(rooms)]
+    check_in = FAR_FUTURE + timedelta(days=3 * (n // len(rooms)))
+    return reverse('create-booking'), {
+        'hotel': str(room.hotel.uid), 'room': str(room.uid),
+        'check_in': check_in.isoformat(), 'check_out': (check_in + timedelta(days=2)).isoformat(),
+    }
+
+
+def _register(fixtures, n):
+    return reverse('register'), {
+        'username': f'bench{n}', 'email': f'bench{n}@bench.example', 'password': 'bench-pass-1', 'password2': 'bench-pass-1',
+    }
+
+
+def _webhook(fixtures, n):
+    payments = fixtures['payments']
+    return reverse('payment-webhook'), {'transaction_id': payments[n % len(payments)].transaction_id, 'status': 'success'}
+
+
+CASES = [
+    Case('hotel-list', 'get', None, _get('hotel-list', {'location': 'Gondar, Ethiopia'})),
+    Case('hotel-filter', 'get', None, _get('hotel-filter', {'price__gte': 50, 'price__lte': 150, 'amenities': 'Spa'})),
+    Case('hotel-search', 'get', None, _get('hotel-search', {'q': 'lake'})),
+    Case('hotel-detail', 'get', None, _get('hotel-detail', uid=lambda f: f['hotel'].uid)),
+    Case('hotel-detail-uuid', 'get', None, _get('hotel-detail-uuid', uid=lambda f: f['hotel'].uid)),
+    Case('room-list', 'get', None, _get('room-list', hotel_uid=lambda f: f['hotel'].uid)),
+    Case('room-list-by-uuid', 'get', None, _get('room-list-by-uuid', hotel_uid=lambda f: f['hotel'].uid)),
+    Case('room-detail', 'get', None,
+         _get('room-detail', hotel_uid=lambda f: f['hotel'].uid, room_uid=lambda f: f['room'].uid)),
+    Case('hotel-reviews', 'get', None, _get('hotel-reviews', hotel_uid=lambda f: f['hotel'].uid)),
+    # GET only: a user may review a room once, so a repeated POST would measure the 400.
+    Case('room-reviews', 'get', None,
+         _get('room-reviews', hotel_uid=lambda f: f['hotel'].uid, room_uid=lambda f: f['room'].uid)),
+    Case('room-booked-ranges', 'get', None, _get('room-booked-ranges', room_id=lambda f: f['room'].id)),
+    Case('availability', 'get', None, _get('availability', {
+        'check_in': date.today().isoformat(), 'check_out': (date.today() + timedelta(days=3)).isoformat(),
+        'location': 'Bahir Dar, Ethiopia',
+    })),
+    Case('quotes', 'get', None, _get('quotes', {
+        'hotel': lambda f: f['hotel'].uid,
+        'check_in': date.today().isoformat(), 'check_out': (date.today() + timedelta(days=7)).isoformat(),
+    })),
+    Case('stay-list', 'get', None, _get('stay-list')),
+    Case('stay-detail', 'get', None, _get('stay-detail', uid=lambda f: f['room'].uid)),
+    Case('catalog-cache-stats', 'get', 'admin', _get('catalog-cache-stats')),
+    Case('metrics', 'get', None, _get('metrics')),
+    Case('media', 'get', None, _get('media', path=lambda f: f['hotel'].featured_image.name or 'missing.jpg')),
+    Case('create-booking', 'post', 'user', _booking),
+    Case('register', 'post', None, _register),
+    Case('token_obtain_pair', 'post', None,
+         lambda f, n: (reverse('token_obtain_pair'), {'email': f['user'].email, 'password': f['password']})),
+    Case('token_refresh', 'post', None, lambda f, n: (reverse('token_refresh'), {'refresh': f['refresh']})),
+    Case('payment-initiate', 'post', 'user', lambda f, n: (reverse('payment-initiate'), {'amount': '120.00'})),
+    Case('payment-initiate-async', 'post', 'user',
+         lambda f, n: (reverse('payment-initiate-async'), {'amount': '120.00'})),
+    Case('payment-status', 'get', 'user', _get('payment-status', pk=lambda f: f['payments'][0].pk)),
+    Case('payment-verify', 'post', 'user',
+         lambda f, n: (reverse('payment-verify'), {'payment_id': f['payments'][0].pk, 'success': True})),
+    Case('payment-webhook', 'post', None, _webhook),
+]
+
+
+def route_names(patterns=None, namespace=None):
+    """Names of every route in the URLconf, outside IGNORED_NAMESPACES."""
+    names = set()
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace not in IGNORED_NAMESPACES:
+                names |= route_names(pattern.url_patterns, pattern.namespace)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(f'{namespace}:{pattern.name}' if namespace else pattern.name)
+    return names
+
+
+def uncovered_routes():
+    return sorted(route_names() - {case.name for case in CASES})
+
+
+def make_fixtures(password='password123', payments=200):
+    """Users, tokens and payments the cases need, on top of a seeded catalog."""
+    hotel = Hotel.objects.filter(is_active=True, rooms__isnull=False).order_by('id').first()
+    if hotel is None:
+        raise ValueError("No hotel with rooms; seed the database first")
+    user = User.objects.create_user(email='bench-user@bench.example', username='bench-user', password=password)
+    admin = User.objects.create_user(email='bench-admin@bench.example', username='bench-admin',
+                                     password=password, is_staff=True)
+    Payment.objects.bulk_create([
+        Payment(user=user, amount='120.00', gateway='telebirr', transaction_id=f'bench-{i}')
+        for i in range(payments)
+    ])
+    user_token, admin_token = (EmailTokenObtainPairSerializer.get_token(u) for u in (user, admin))
+    return {
+        'hotel': hotel,
+        'room': hotel.rooms.order_by('id').first(),
+        'rooms': list(Room.objects.select_related('hotel').order_by('id')[:500]),
+        'user': user,
+        'password': password,
+        'refresh': str(user_token),
+        'payments': list(Payment.objects.filter(user=user).order_by('id')),
+        'auth': {
+            'user': {'HTTP_AUTHORIZATION': f'Bearer {user_token.access_token}'},
+            'admin': {'HTTP_AUTHORIZATION': f'Bearer {admin_token.access_token}'},
+        },
+    }
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def run_case(case, fixtures, iterations=50, warmup=3, memory_iterations=5, cold=False):
+    client = Client(raise_request_exception=False)
+    headers = fixtures['auth'].get(case.auth, {})
+    counter = itertools.count()
+
+    def call():
+        path, payload = case.build(fixtures, next(counter))
+        if cold:
+            catalog_cache.backend.clear()
+        if case.method == 'get':
+            return client.get(path, payload, **headers)
+        return client.post(path, json.dumps(payload), content_type='application/json', **headers)
+
+    for _ in range(warmup):
+        call()
+
+    timings, queries, statuses = [], [], set()
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = call()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        statuses.add(response.status_code)
+
+    # Separate pass: tracemalloc slows every allocation, so it stays out of the timings.
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _ in range(memory_iterations):
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            call()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'method': case.method.upper(),
+        'status': sorted(statuses),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'queries': max(queries),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run_suite(fixtures, only=None, **options):
+    return {case.name: run_case(case, fixtures, **options)
+            for case in CASES if not only or case.name in only}
+
+
+def compare(results, baseline, latency_tolerance=0.25, memory_tolerance=0.25, noise_ms=1.0, noise_kib=64):
+    """
+    Regressions of `results` against `baseline`, as human-readable strings.
+    A case missing from the baseline is one too: it would otherwise go ungated.
+    """
+    regressions = []
+    for name, current in results['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            regressions.append(f"{name}: not in the baseline, re-record it with --update-baseline")
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            limit = max(before[metric] * (1 + latency_tolerance), before[metric] + noise_ms)
+            if current[metric] > limit:
+                regressions.append(f"{name}: {metric} {before[metric]} -> {current[metric]}")
+        if current['queries'] > before['queries']:
+            regressions.append(f"{name}: queries {before['queries']} -> {current['queries']}")
+        limit = max(before['peak_kib'] * (1 + memory_tolerance), before['peak_kib'] + noise_kib)
+        if current['peak_kib'] > limit:
+            regressions.append(f"{name}: peak_kib {before['peak_kib']} -> {current['peak_kib']}")
+        if any(code >= 500 for code in current['status']):
+            regressions.append(f"{name}: server error {current['status']}")
+    return regressions
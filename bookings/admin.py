@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Room, Booking, Review, Hotel, User
+from .models import Room, Booking, Review, Hotel, User, RoomNight, RateRule
 
 @admin.register(Hotel)
 class HotelAdmin(admin.ModelAdmin):
@@ -27,3 +27,15 @@ class ReviewAdmin(admin.ModelAdmin):
     list_display = ('user', 'room', 'rating', 'created_at')
     list_filter = ('rating', 'created_at')
     search_fields = ('user__username', 'room__name')
+
+@admin.register(RoomNight)
+class RoomNightAdmin(admin.ModelAdmin):
+    list_display = ('room', 'date', 'booking')
+    list_filter = ('date',)
+
+@admin.register(RateRule)
+class RateRuleAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'hotel', 'room', 'kind', 'start_date', 'end_date', 'is_active')
+    list_filter = ('kind', 'is_active')
+    search_fields = ('name', 'hotel__name', 'room__name')
+    raw_id_fields = ('hotel', 'room')
@@ -0,0 +1,111 @@
+"""
+Aggregates denormalized onto Hotel and Room.
+
+    Hotel.min_price     cheapest available room (NULL when none is available)
+    Hotel.room_count    number of available rooms
+    Hotel.max_capacity  largest available room (0 when none is available)
+    rating_sum, rating_count  of the reviews of a room / of all a hotel's rooms
+
+The hotel lists show, filter and sort on these columns directly, so
+ordering by the cheapest room or the best rating needs no subquery per
+hotel. Saving or deleting a Room refreshes only its hotel; a review adds
+or removes its rating with F() expressions, so concurrent reviews never
+lose an update (see signals.py). Bulk inserts and queryset .update() or
+.delete() calls skip signals and are followed by refresh_room_stats(),
+refresh_ratings() or `manage.py rebuild_aggregates`.
+"""
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Max, Min, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+
+from .cache import CATALOG_SCOPE, catalog_cache, hotel_scope
+from .models import Hotel, Review, Room
+
+ROOM_STATS = ('min_price', 'room_count', 'max_capacity')
+EMPTY_STATS = (None, 0, 0)
+
+BATCH_SIZE = 500   # hotel ids per IN (...) clause
+
+
+def room_stats(hotel_ids):
+    """{hotel id: (min_price, room_count, max_capacity)} from the available rooms."""
+    rows = (Room.objects.filter(hotel_id__in=hotel_ids, is_available=True)
+            .values('hotel_id')
+            .annotate(min_price=Min('price'), room_count=Count('id'), max_capacity=Max('capacity'))
+            .order_by())
+    return {row['hotel_id']: tuple(row[field] for field in ROOM_STATS) for row in rows}
+
+
+def refresh_room_stats(hotel_ids=None):
+    """
+    Recompute the room aggregates of `hotel_ids` (every hotel when None) and
+    write the ones that changed, moving their updated_at so conditional GETs
+    on the lists see the new values. Returns the number of hotels updated.
+    """
+    if hotel_ids is None:
+        hotel_ids = Hotel.objects.values_list('id', flat=True).order_by('id')
+    hotel_ids = list(hotel_ids)
+    changed = []
+    with transaction.atomic():
+        for start in range(0, len(hotel_ids), BATCH_SIZE):
+            batch = hotel_ids[start:start + BATCH_SIZE]
+            stats = room_stats(batch)
+            for hotel_id, uid, *current in Hotel.objects.filter(id__in=batch).values_list('id', 'uid', *ROOM_STATS):
+                wanted = stats.get(hotel_id, EMPTY_STATS)
+                if tuple(current) != wanted:
+                    changed.append(uid)
+                    # .update() skips Hotel.save() and its signals, hence updated_at here.
+                    Hotel.objects.filter(id=hotel_id).update(
+                        **dict(zip(ROOM_STATS, wanted)), updated_at=timezone.now())
+    if changed:
+        catalog_cache.bump(CATALOG_SCOPE, *(hotel_scope(uid) for uid in changed))
+    return len(changed)
+
+
+# ───── Ratings ───────────────────────────────────────────────────────────────
+
+def average_rating(rating_sum, rating_count):
+    """Mean rating rounded to two places, None without reviews."""
+    return round(rating_sum / rating_count, 2) if rating_count else None
+
+
+def with_rating(queryset):
+    """Annotate `rating` (mean, 0 without reviews) from the stored sums, for ?ordering=rating."""
+    mean = Cast('rating_sum', FloatField()) / NullIf(F('rating_count'), 0)
+    return queryset.annotate(rating=Coalesce(mean, Value(0.0)))
+
+
+def add_rating(room_id, rating, sign=1):
+    """Count (sign=1) or uncount (sign=-1) one review of `room_id` on the room and its hotel."""
+    hotel_id, hotel_uid = Room.objects.filter(pk=room_id).values_list('hotel_id', 'hotel__uid').first() or (None, None)
+    if hotel_id is None:
+        return   # the room is gone, and its aggregates with it
+    now = timezone.now()
+    change = {'rating_sum': F('rating_sum') + sign * rating, 'rating_count': F('rating_count') + sign,
+              'updated_at': now}
+    with transaction.atomic():
+        Room.objects.filter(pk=room_id).update(**change)
+        Hotel.objects.filter(pk=hotel_id).update(**change)
+    catalog_cache.bump(CATALOG_SCOPE, hotel_scope(hotel_uid))
+    transaction.on_commit(lambda: catalog_cache.bump(CATALOG_SCOPE, hotel_scope(hotel_uid)))
+
+
+def refresh_ratings():
+    """Recompute every rating_sum/rating_count from the reviews; returns the number of rows corrected."""
+    corrected, hotel_uids = 0, set()
+    with transaction.atomic():
+        for model, key in ((Room, 'room_id'), (Hotel, 'room__hotel_id')):
+            wanted = {row[key]: (row['total'], row['count']) for row in (
+                Review.objects.values(key).annotate(total=Sum('rating'), count=Count('id')).order_by())}
+            uid = 'uid' if model is Hotel else 'hotel__uid'
+            for pk, hotel_uid, *current in model.objects.values_list('pk', uid, 'rating_sum', 'rating_count'):
+                stats = wanted.get(pk, (0, 0))
+                if tuple(current) != stats:
+                    model.objects.filter(pk=pk).update(rating_sum=stats[0], rating_count=stats[1],
+                                                       updated_at=timezone.now())
+                    corrected += 1
+                    hotel_uids.add(hotel_uid)
+    if hotel_uids:
+        catalog_cache.bump(CATALOG_SCOPE, *(hotel_scope(uid) for uid in hotel_uids))
+    return corrected
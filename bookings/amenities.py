@@ -0,0 +1,35 @@
+"""
+Amenity vocabulary and bitmask encoding.
+
+Each amenity owns one bit of Hotel.amenity_mask, by its position in
+AMENITIES. Only append to the list: reordering or removing an entry
+changes the meaning of masks already stored.
+"""
+
+AMENITIES = [
+    "Free WiFi", "Pool", "Gym", "Spa", "Restaurant", "Bar", "Parking",
+    "Airport Shuttle", "Pet Friendly", "Breakfast Included",
+    "Room Service", "Laundry Service", "24h Front Desk",
+]
+
+AMENITY_BITS = {name.lower(): 1 << position for position, name in enumerate(AMENITIES)}
+
+
+def amenity_mask(names):
+    """Bitmask of the known amenities in `names` (case-insensitive; others ignored)."""
+    mask = 0
+    for name in names or []:
+        mask |= AMENITY_BITS.get(str(name).strip().lower(), 0)
+    return mask
+
+
+def parse_amenities(value):
+    """
+    Mask for a comma-separated `?amenities=` value.
+    Raises ValueError naming any amenity outside the vocabulary.
+    """
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name.lower() not in AMENITY_BITS]
+    if unknown:
+        raise ValueError(f"Unknown amenities: {', '.join(unknown)}")
+    return amenity_mask(names)
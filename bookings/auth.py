@@ -1,10 +1,17 @@
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+from .authentication import CLAIMS
+
+
 class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
-        return super().get_token(user)
+        token = super().get_token(user)
+        for claim, field in CLAIMS.items():
+            value = getattr(user, field)
+            token[claim] = str(value) if claim == 'uid' else value
+        return token
 
     def validate(self, attrs):
         # attrs initially has {'email': ..., 'password': ...}
@@ -0,0 +1,97 @@
+"""
+Claims-based JWT authentication.
+
+Kept apart from bookings/auth.py: DRF imports authentication classes
+while loading its settings, before its views module can be imported.
+
+Access tokens issued by EmailTokenObtainPairSerializer carry the claims
+in CLAIMS besides simplejwt's user_id.
+ClaimsJWTAuthentication trusts them, as they are signed, and builds a
+ClaimsUser from them without touching the database: request.user.pk,
+.uid, .email, .is_admin and .is_staff are free. The first access to any
+other field loads the row through a small per-process LRU, so a request
+that does need it costs at most one query, usually none.
+
+The trade-off is the one every stateless token makes: a change to a
+claim (e.g. revoking is_staff) or deactivating the user takes effect
+when the token expires (SIMPLE_JWT['ACCESS_TOKEN_LIFETIME']), not on
+the next request. Tokens issued before the claims existed fall back to
+the regular per-request lookup.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import ClaimsUser, User
+
+# token claim -> User field
+CLAIMS = {'uid': 'uid', 'email': 'email', 'is_admin': 'is_admin', 'is_staff': 'is_staff'}
+
+DEFAULTS = {
+    'USER_CACHE_SIZE': 1024,
+    'USER_CACHE_TTL': 30,   # seconds a loaded row is reused
+}
+
+
+def claims_auth_options():
+    return {**DEFAULTS, **getattr(settings, 'CLAIMS_AUTH', {})}
+
+
+class UserRowCache:
+    """LRU of User rows (attname -> value dicts) with a TTL; per process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = OrderedDict()
+
+    def get(self, pk):
+        options = claims_auth_options()
+        now = time.monotonic()
+        with self._lock:
+            hit = self._rows.get(pk)
+            if hit and hit[0] > now:
+                self._rows.move_to_end(pk)
+                return hit[1]
+        attnames = [field.attname for field in User._meta.concrete_fields]
+        row = User.objects.filter(pk=pk).values(*attnames).first()
+        if row is not None:
+            with self._lock:
+                self._rows[pk] = (now + options['USER_CACHE_TTL'], row)
+                self._rows.move_to_end(pk)
+                while len(self._rows) > options['USER_CACHE_SIZE']:
+                    self._rows.popitem(last=False)
+        return row
+
+    def discard(self, pk):
+        with self._lock:
+            self._rows.pop(pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+user_rows = UserRowCache()
+
+
+def cached_user_row(pk):
+    return user_rows.get(pk)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in CLAIMS):
+            return super().get_user(validated_token)
+        try:
+            pk = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            return super().get_user(validated_token)
+        claimed = {'id': pk, **{field: User._meta.get_field(field).to_python(validated_token[claim])
+                                for claim, field in CLAIMS.items()}}
+        # from_db wants the values in field order and defers every field left out.
+        fields = [field.attname for field in User._meta.concrete_fields if field.attname in claimed]
+        return ClaimsUser.from_db(None, fields, [claimed[name] for name in fields])
@@ -0,0 +1,53 @@
+from django.db.models import Exists, OuterRef
+
+from .models import Booking, Room, RoomNight
+
+
+def booked_ranges(room_id):
+    """
+    Date ranges of the active bookings of one room, read straight off the
+    (room, status, check_in, check_out) index.
+    """
+    return Booking.objects.filter(
+        room_id=room_id,
+        status__in=Booking.ACTIVE_STATUSES,
+    ).values('check_in', 'check_out')
+
+
+def taken_nights(check_in, check_out):
+    """
+    Occupied RoomNight rows inside the stay [check_in, check_out).
+    Filtered by room this is a range probe on the (room, date) unique index.
+    """
+    return RoomNight.objects.filter(date__gte=check_in, date__lt=check_out)
+
+
+def available_rooms(check_in, check_out, location=None, capacity=None):
+    """
+    Every bookable room that is free for the whole stay, in a single query.
+    The overlap test is a correlated EXISTS probe per candidate room rather
+    than a scan over all bookings.
+    """
+    busy = taken_nights(check_in, check_out).filter(room=OuterRef('pk'))
+    rooms = Room.objects.filter(is_available=True, hotel__is_active=True)
+    if location:
+        rooms = rooms.filter(hotel__location__icontains=location)
+    if capacity:
+        rooms = rooms.filter(capacity__gte=capacity)
+    return (
+        rooms.filter(~Exists(busy))
+        .select_related('hotel')
+        .order_by('hotel_id', 'price', 'id')
+    )
+
+
+def group_by_hotel(rooms):
+    """
+    Fold an iterable of rooms (ordered by hotel) into [(hotel, [rooms])].
+    """
+    groups = []
+    for room in rooms:
+        if not groups or groups[-1][0].pk != room.hotel_id:
+            groups.append((room.hotel, []))
+        groups[-1][1].append(room)
+    return groups
@@ -0,0 +1,114 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+# Version scope shared by every catalog-wide payload (lists, stays).
+CATALOG_SCOPE = 'catalog'
+
+
+def hotel_scope(hotel_uid):
+    """Version scope of one hotel's detail and room payloads."""
+    return f'hotel:{hotel_uid}'
+
+
+class CatalogCache:
+    """
+    Serialized catalog payloads keyed by a version counter per scope.
+
+    Writers never delete payloads; they bump the version of every scope the
+    change touches, so later reads build new keys and the old entries simply
+    age out of the backend. The backend is any Django cache alias
+    (CATALOG_CACHE_ALIAS), local memory by default.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self):
+        return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+    def version(self, scope):
+        key = f'catalog:version:{scope}'
+        version = self.backend.get(key)
+        if version is None:
+            # Seeded from the clock so an evicted counter never reuses a
+            # version that may still have payloads cached under it.
+            self.backend.add(key, time.time_ns(), timeout=None)
+            version = self.backend.get(key)
+        return version
+
+    def bump(self, *scopes):
+        for scope in scopes:
+            key = f'catalog:version:{scope}'
+            try:
+                self.backend.incr(key)
+            except ValueError:
+                self.backend.set(key, time.time_ns(), timeout=None)
+
+    def key(self, scope, request):
+        # The absolute URL covers query string, cursor and the host used
+        # to build absolute image URLs.
+        digest = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        return f'catalog:{scope}:{self.version(scope)}:{digest}'
+
+    def get(self, key):
+        data = self.backend.get(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def set(self, key, data):
+        self.backend.set(key, data, timeout=self.timeout)
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / lookups if lookups else 0.0,
+        }
+
+
+catalog_cache = CatalogCache()
+
+
+class CachedCatalogMixin:
+    """
+    Serve list()/retrieve() from catalog_cache. Views scoped to one hotel
+    override get_cache_scope(); everything else shares CATALOG_SCOPE.
+    """
+
+    def get_cache_scope(self):
+        return CATALOG_SCOPE
+
+    def cached_response(self, request, render):
+        key = catalog_cache.key(self.get_cache_scope(), request)
+        data = catalog_cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = render()
+        if response.status_code == 200:
+            catalog_cache.set(key, response.data)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedCatalogMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedCatalogMixin, self).retrieve(request, *args, **kwargs))
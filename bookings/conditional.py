@@ -0,0 +1,58 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def validators_for(queryset, request, *extra):
+    """
+    (etag, last_modified) for a representation of `queryset`, from a single
+    COUNT/MAX aggregate over it. The count catches deletions, MAX(updated_at)
+    catches edits; the absolute URL and renderer format pin the exact body.
+    """
+    state = queryset.order_by().aggregate(
+        count=Count('id'),
+        last_id=Max('id'),
+        last_modified=Max('updated_at'),
+    )
+    return make_validators(request, state['last_modified'], state['count'], state['last_id'], *extra)
+
+
+def make_validators(request, last_modified, *state):
+    parts = [request.build_absolute_uri(), request.accepted_renderer.format, last_modified, *state]
+    etag = hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()
+    return etag, last_modified
+
+
+class ConditionalGetMixin:
+    """
+    Honour If-None-Match / If-Modified-Since on GET before any serialization.
+    By default the validators cover the view's filtered queryset, narrowed to
+    the looked-up object on detail views; get_validators() may be overridden.
+    """
+
+    def get_validators(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg not in self.kwargs:
+            return validators_for(queryset, self.request)
+        queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        etag, last_modified = validators_for(queryset, self.request)
+        # No validators for a missing object; let the view raise its 404.
+        return (etag, last_modified) if last_modified else (None, None)
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        etag = quote_etag(etag) if etag else None
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            if timestamp and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(timestamp)
+            if etag:
+                response.headers.setdefault('ETag', etag)
+        return response
@@ -0,0 +1,59 @@
+from django.db.models import F, Sum
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from .amenities import AMENITIES, parse_amenities
+from .search import get_search_index
+
+
+class IndexedSearchFilter(filters.SearchFilter):
+    """
+    ?search=… answered from the hotel full-text index instead of
+    `LIKE '%term%'` over `search_fields`.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return queryset.filter(id__in=self.matching_ids(request, query))
+
+    @staticmethod
+    def matching_ids(request, query):
+        # Every match, not the ranked top of search(): pagination and facets
+        # need the whole set. The validators, the page and the facets each
+        # filter the queryset, so the index is queried once per request.
+        results = request.__dict__.setdefault('_indexed_search', {})
+        if query not in results:
+            results[query] = get_search_index().search(query, limit=None)
+        return results[query]
+
+
+class AmenityFilterBackend(filters.BaseFilterBackend):
+    """
+    ?amenities=Spa,Bar keeps hotels offering all of the listed amenities,
+    matched as `amenity_mask & wanted = wanted` on the integer bitset.
+    """
+    amenities_param = 'amenities'
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get(self.amenities_param, '')
+        if not value.strip():
+            return queryset
+        try:
+            wanted = parse_amenities(value)
+        except ValueError as exc:
+            raise ValidationError({self.amenities_param: [str(exc)]})
+        return queryset.alias(amenity_hits=F('amenity_mask').bitand(wanted)).filter(amenity_hits=wanted)
+
+
+def amenity_facets(queryset):
+    """
+    Number of hotels in `queryset` offering each amenity, from one aggregate:
+    SUM((amenity_mask >> bit) & 1) per vocabulary entry.
+    """
+    counts = queryset.order_by().aggregate(**{
+        f'amenity_{bit}': Sum(F('amenity_mask').bitrightshift(bit).bitand(1))
+        for bit in range(len(AMENITIES))
+    })
+    return {name: counts[f'amenity_{bit}'] or 0 for bit, name in enumerate(AMENITIES)}
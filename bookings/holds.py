@@ -0,0 +1,59 @@
+"""
+Expiry of unpaid booking holds.
+
+A PENDING booking occupies its RoomNight rows until it is paid (settled to
+COMPLETED) or its hold_expires_at passes. A payment still in flight
+(status 'pending', e.g. retrying through the outbox) that was started less
+than BOOKING_HOLD_PAYMENT_GRACE ago keeps the hold, but never for longer
+than that grace past hold_expires_at: a payment abandoned by the client
+or never confirmed by the gateway cannot pin the room. A payment that
+succeeds after its booking was cancelled does not revive it (settlement
+only completes PENDING bookings). expire_holds() cancels expired
+holds in batches: each batch is one indexed SELECT on
+(status, hold_expires_at), one conditional UPDATE and one DELETE of the
+released nights, committed on its own so a long sweep never holds the
+write lock for long.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from payment.models import Payment
+from .models import Booking, RoomNight
+
+
+def expired(now):
+    grace_start = now - timedelta(seconds=settings.BOOKING_HOLD_PAYMENT_GRACE)
+    in_flight = Payment.objects.filter(booking=OuterRef('pk'), status='pending', created_at__gt=grace_start)
+    return Booking.objects.filter(
+        Q(hold_expires_at__lte=grace_start) | ~Exists(in_flight),
+        status=Booking.PENDING, hold_expires_at__lte=now,
+    )
+
+
+def expire_holds(batch_size=500, now=None):
+    """Cancel every hold expired at `now`; returns sweep metrics."""
+    now = now or timezone.now()
+    started = time.perf_counter()
+    metrics = {'cancelled': 0, 'nights_released': 0, 'batches': 0}
+    while True:
+        with transaction.atomic():
+            ids = list(
+                expired(now).order_by('hold_expires_at').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            # Re-checked in the UPDATE: a booking paid, or being paid, since the SELECT keeps its nights.
+            cancelled = expired(now).filter(id__in=ids).update(
+                status=Booking.CANCELLED, hold_expires_at=None
+            )
+            released, _ = RoomNight.objects.filter(booking_id__in=ids, booking__status=Booking.CANCELLED).delete()
+        metrics['batches'] += 1
+        metrics['cancelled'] += cancelled
+        metrics['nights_released'] += released
+    metrics['seconds'] = time.perf_counter() - started
+    return metrics
@@ -0,0 +1,134 @@
+"""
+Responsive derivatives of hotel and room images.
+
+Each source image (Hotel.featured_image, Room.image) is resized with
+Pillow to the configured WIDTHS, in every configured format. The
+derivatives are stored as
+
+    <DIRECTORY>/<digest[:2]>/<digest>-<width>w.<ext>
+
+where `digest` hashes the source bytes together with the settings. A
+derivative name therefore never points at different bytes, and can be
+served with a far-future Cache-Control. The manifest of a source is
+saved in the model's `image_derivatives` field:
+
+    {'source': 'hotel_images/x.jpg', 'digest': '…', 'width': 1600, 'height': 1067,
+     'variants': {'webp': {'320': 'derivatives/…-320w.webp', …}, 'jpeg': {…}}}
+
+Running generation again for an unchanged source and unchanged settings
+returns the previous manifest without decoding anything. Any source
+Pillow fails on (AVIF without a plugin, truncated files, decompression
+bombs, …) raises ImageDerivativeError and keeps serving the original
+upload only.
+"""
+import hashlib
+import io
+import json
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from hotel_backend.media import prehashed
+
+DEFAULTS = {
+    'WIDTHS': (320, 640, 1280),
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': {'webp': 80, 'jpeg': 82},
+    'DIRECTORY': 'derivatives',
+    'GENERATE_ON_UPLOAD': True,   # generate when an admin/API save changes the image
+}
+
+PIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+class ImageDerivativeError(Exception):
+    pass
+
+
+def image_options():
+    return {**DEFAULTS, **getattr(settings, 'IMAGE_DERIVATIVES', {})}
+
+
+def source_digest(data, options):
+    recipe = json.dumps([options['WIDTHS'], options['FORMATS'], options['QUALITY']], sort_keys=True)
+    return hashlib.sha256(recipe.encode() + b'\0' + data).hexdigest()[:24]
+
+
+def derivative_name(options, digest, width, fmt):
+    return f"{options['DIRECTORY']}/{digest[:2]}/{digest}-{width}w.{EXTENSIONS[fmt]}"
+
+
+def is_current(manifest, name, storage=default_storage):
+    """True when `manifest` was built from `name` and all its files still exist."""
+    return bool(manifest) and manifest.get('source') == name and all(
+        storage.exists(path) for variants in manifest['variants'].values() for path in variants.values()
+    )
+
+
+def generate_derivatives(name, previous=None, storage=default_storage, options=None):
+    """Build (or reuse) the derivatives of the stored image `name`; returns its manifest."""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    options = options or image_options()
+    try:
+        with storage.open(name, 'rb') as f:
+            data = f.read()
+    except OSError as exc:
+        raise ImageDerivativeError(f"{name}: {exc}") from exc
+    digest = source_digest(data, options)
+    if previous and previous.get('digest') == digest and is_current(previous, name, storage):
+        return previous
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        image.load()
+    except UnidentifiedImageError as exc:
+        raise ImageDerivativeError(f"{name}: not an image format Pillow can decode here") from exc
+    except Exception as exc:   # DecompressionBombError, truncated or malformed data, plugin errors
+        raise ImageDerivativeError(f"{name}: {type(exc).__name__}: {exc}") from exc
+
+    # Never upscale: a source narrower than the largest width tops out at its own width.
+    widths = [width for width in sorted(options['WIDTHS']) if width < image.width]
+    if image.width < max(options['WIDTHS']):
+        widths.append(image.width)
+    variants = {fmt: {} for fmt in options['FORMATS']}
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        try:
+            resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+        except Exception as exc:
+            raise ImageDerivativeError(f"{name}: {type(exc).__name__}: {exc}") from exc
+        for fmt in options['FORMATS']:
+            path = derivative_name(options, digest, width, fmt)
+            if not storage.exists(path):
+                path = storage.save(path, prehashed(ContentFile(encode(name, resized, fmt, options))))
+            variants[fmt][str(width)] = path
+    return {'source': name, 'digest': digest, 'width': image.width, 'height': image.height, 'variants': variants}
+
+
+def encode(name, image, fmt, options):
+    try:
+        frame = image.convert('RGB') if fmt == 'jpeg' and image.mode != 'RGB' else image
+        buffer = io.BytesIO()
+        frame.save(buffer, PIL_FORMATS[fmt], quality=options['QUALITY'][fmt], optimize=True)
+    except Exception as exc:
+        raise ImageDerivativeError(f"{name}: {type(exc).__name__}: {exc}") from exc
+    return buffer.getvalue()
+
+
+def srcset(manifest, name, url):
+    """
+    {'webp': 'https://…-320w.webp 320w, …', …} for the image `name`, or
+    None when it has no derivatives (yet) or the manifest is for an older image.
+    """
+    if not manifest or not name or manifest.get('source') != name:
+        return None
+    return {
+        fmt: ', '.join(f"{url(path)} {width}w" for width, path in sorted(paths.items(), key=lambda item: int(item[0])))
+        for fmt, paths in manifest['variants'].items()
+    }
@@ -0,0 +1,112 @@
+import json
+import os
+import platform
+import time
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from benchmarks.endpoints import compare, make_fixtures, run_suite, uncovered_routes
+
+BENCHMARKS_DIR = os.path.join(settings.BASE_DIR, 'benchmarks')
+DATASET_OPTIONS = ('hotels', 'rooms_per_hotel', 'users', 'bookings', 'seed')
+
+
+class Command(BaseCommand):
+    help = "Benchmark every API route against a throwaway seeded database and gate on a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hotels', type=int, default=2000)
+        parser.add_argument('--rooms-per-hotel', type=int, default=10)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--bookings', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--workers', type=int, default=1, help="Processes used by seed_hotels")
+        parser.add_argument('--iterations', type=int, default=50, help="Timed requests per endpoint")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed requests per endpoint")
+        parser.add_argument('--cold', action='store_true', help="Clear the catalog cache before every request")
+        parser.add_argument('--only', nargs='*', help="Route names to run (default all)")
+        parser.add_argument('--output', default=os.path.join(BENCHMARKS_DIR, 'results', 'latest.json'))
+        parser.add_argument('--baseline', default=os.path.join(BENCHMARKS_DIR, 'baseline.json'))
+        parser.add_argument('--update-baseline', action='store_true', help="Write the results as the new baseline")
+        parser.add_argument('--latency-tolerance', type=float, default=0.25, help="Allowed relative p50/p95 growth")
+        parser.add_argument('--memory-tolerance', type=float, default=0.25, help="Allowed relative peak growth")
+        parser.add_argument('--no-fail', action='store_true', help="Report regressions without failing")
+
+    def handle(self, *args, **options):
+        missing = uncovered_routes()
+        if missing:
+            raise CommandError(f"No benchmark case for route(s): {', '.join(missing)}")
+
+        dataset = {key: options[key] for key in DATASET_OPTIONS}
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            started = time.perf_counter()
+            call_command('seed_hotels', **dataset, workers=options['workers'], stdout=self.stdout)
+            self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s, benchmarking…")
+            # Nothing listens here: the async initiate path fails fast instead of waiting on a real gateway.
+            with override_settings(PAYMENT_GATEWAY={'ORDER_URL': 'http://127.0.0.1:9/api/order'}):
+                endpoints = run_suite(
+                    make_fixtures(),
+                    only=options['only'],
+                    iterations=options['iterations'],
+                    warmup=options['warmup'],
+                    cold=options['cold'],
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        results = {
+            'meta': {
+                'dataset': dataset,
+                'iterations': options['iterations'],
+                'cold': options['cold'],
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'machine': platform.machine(),
+                'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'endpoints': endpoints,
+        }
+        self.report(endpoints)
+        self.write(options['output'], results)
+
+        if options['update_baseline']:
+            self.write(options['baseline'], results)
+            return
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(self.style.WARNING(f"No baseline at {options['baseline']}; nothing to compare"))
+            return
+        with open(options['baseline']) as f:
+            baseline = json.load(f)
+        if baseline['meta']['dataset'] != dataset or baseline['meta']['cold'] != options['cold']:
+            raise CommandError("Baseline was recorded with a different dataset/--cold; re-run with the same options")
+        regressions = compare(results, baseline, options['latency_tolerance'], options['memory_tolerance'])
+        for line in regressions:
+            self.stdout.write(self.style.ERROR(f"REGRESSION {line}"))
+        if regressions and not options['no_fail']:
+            raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}")
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+
+    def report(self, endpoints):
+        self.stdout.write(f"{'endpoint':<24} {'status':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                          f"{'queries':>7} {'peak KiB':>9}")
+        for name, row in endpoints.items():
+            status = ','.join(map(str, row['status']))
+            self.stdout.write(f"{name:<24} {status:<10} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+                              f"{row['p99_ms']:>8.2f} {row['queries']:>7} {row['peak_kib']:>9.1f}")
+
+    def write(self, path, results):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        self.stdout.write(f"Wrote {path}")
@@ -0,0 +1,79 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from bookings.models import Hotel, Room
+from bookings.serializers import (
+    HotelListSerializer,
+    HotelListFastSerializer,
+    RoomSerializer,
+    RoomFastSerializer,
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare per-row cost of the ModelSerializer and fast list serializers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000, help="Synthetic rooms to serialize")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per serializer (best is kept)")
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        # Synthetic rows are created inside a transaction that is always rolled back.
+        try:
+            with transaction.atomic():
+                self.seed(rows)
+                self.run(repeat)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, rows):
+        hotels = Hotel.objects.bulk_create([
+            Hotel(name=f"Bench Hotel {i}", location="Addis Ababa, Ethiopia", price=Decimal('100.00'),
+                  amenities=["Free WiFi", "Spa"], featured_image=f"hotel_images/bench_{i}.jpg")
+            for i in range(max(1, rows // 10))
+        ])
+        Room.objects.bulk_create([
+            Room(hotel=hotels[i % len(hotels)], name=f"Room {i}", description="Comfortable and spacious room.",
+                 price=Decimal('80.00'), capacity=2, image=f"room_images/bench_{i}.jpg")
+            for i in range(rows)
+        ])
+
+    def run(self, repeat):
+        request = Request(APIRequestFactory().get('/'))
+        context = {'request': request}
+        cases = [
+            ('hotel list', HotelListSerializer, HotelListFastSerializer, Hotel.objects.all()),
+            ('room', RoomSerializer, RoomFastSerializer, Room.objects.select_related('hotel')),
+        ]
+        for label, slow_class, fast_class, queryset in cases:
+            instances = list(queryset)
+            values = list(fast_class.values(queryset))
+            slow = self.best_of(repeat, lambda: slow_class(instances, many=True, context=context).data)
+            fast = self.best_of(repeat, lambda: fast_class(values, context=context).data)
+            count = len(instances)
+            self.stdout.write(
+                f"{label:<10} rows={count:<6} "
+                f"model={slow / count * 1e6:8.2f} µs/row  "
+                f"fast={fast / count * 1e6:8.2f} µs/row  "
+                f"speedup={slow / fast:5.1f}x"
+            )
+
+    @staticmethod
+    def best_of(repeat, func):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
@@ -0,0 +1,99 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils import timezone
+
+from bookings.cache import CATALOG_SCOPE, catalog_cache, hotel_scope
+from bookings.images import ImageDerivativeError, generate_derivatives
+from bookings.models import Hotel
+from bookings.signals import IMAGE_FIELDS
+
+BATCH_SIZE = 500
+
+
+def build(job):
+    """Worker: (name, previous manifest) -> (name, manifest, error)."""
+    name, previous = job
+    try:
+        return name, generate_derivatives(name, previous), None
+    except ImageDerivativeError as exc:
+        return name, None, str(exc)
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/JPEG derivatives of hotel and room images (skips unchanged sources)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help="Worker processes resizing images")
+        parser.add_argument('--model', choices=('hotel', 'room'), action='append',
+                            help="Only this model (repeatable; default both)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        models = [model for model in IMAGE_FIELDS
+                  if not options['model'] or model._meta.model_name in options['model']]
+
+        # Many rows share one upload (seeded hotels do), so work per distinct source.
+        sources = {}
+        for model in models:
+            for _, name, manifest, _ in self.rows(model):
+                previous = sources.setdefault(name, None)
+                if previous is None and manifest and manifest.get('source') == name:
+                    sources[name] = manifest
+        jobs = list(sources.items())
+
+        if options['processes'] > 1 and len(jobs) > 1:
+            # Workers only touch storage, but must not inherit open connections.
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(options['processes']) as pool:
+                results = pool.map(build, jobs, chunksize=max(1, len(jobs) // (options['processes'] * 4)))
+        else:
+            results = map(build, jobs)
+
+        built = unchanged = failed = 0
+        manifests = {}
+        for name, manifest, error in results:
+            if error:
+                failed += 1
+                self.stderr.write(f"  ✗ {error}")
+            elif manifest == sources[name]:
+                unchanged += 1
+            else:
+                built += 1
+            if manifest:
+                manifests[name] = manifest
+
+        rows = self.save(models, manifests)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(jobs)} source(s): {built} built, {unchanged} unchanged, {failed} failed; "
+            f"{rows} row(s) updated in {time.perf_counter() - started:.1f}s"
+        ))
+
+    @staticmethod
+    def rows(model):
+        """(pk, image name, manifest, hotel uid) of every row with an image."""
+        field = IMAGE_FIELDS[model]
+        rows = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+        return rows.values_list('pk', field, 'image_derivatives', 'uid' if model is Hotel else 'hotel__uid').iterator()
+
+    def save(self, models, manifests):
+        """Store each manifest on the rows that still differ and invalidate their cached payloads."""
+        updated, hotel_uids = 0, set()
+        now = timezone.now()
+        with transaction.atomic():
+            for model in models:
+                stale = {}
+                for pk, name, manifest, hotel_uid in self.rows(model):
+                    if name in manifests and manifest != manifests[name]:
+                        stale.setdefault(name, []).append(pk)
+                        hotel_uids.add(hotel_uid)
+                for name, pks in stale.items():
+                    for start in range(0, len(pks), BATCH_SIZE):
+                        # updated_at moves so conditional GETs see the new srcset.
+                        updated += model.objects.filter(pk__in=pks[start:start + BATCH_SIZE]).update(
+                            image_derivatives=manifests[name], updated_at=now)
+        if updated:
+            catalog_cache.bump(CATALOG_SCOPE, *(hotel_scope(uid) for uid in hotel_uids))
+        return updated
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bookings.holds import expire_holds
+
+
+class Command(BaseCommand):
+    help = "Cancel PENDING bookings whose hold has expired and release their nights"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Bookings cancelled per UPDATE")
+        parser.add_argument('--loop', action='store_true', help="Keep sweeping every --interval seconds")
+        parser.add_argument('--interval', type=float, default=60, help="Seconds between sweeps with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            metrics = expire_holds(batch_size=options['batch_size'])
+            self.stdout.write(
+                f"cancelled={metrics['cancelled']} nights_released={metrics['nights_released']} "
+                f"batches={metrics['batches']} elapsed_ms={metrics['seconds'] * 1000:.1f}"
+            )
+            if not options['loop']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,72 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hotel_backend.query_inspector import inspector_options
+
+
+class Command(BaseCommand):
+    help = "Aggregate query inspector reports (JSONL) by SQL fingerprint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="Report files (default QUERY_INSPECTOR['REPORT_PATH'])")
+        parser.add_argument('--sort', choices=('requests', 'count', 'total_ms', 'slow'), default='total_ms')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--json', action='store_true', help="Print the aggregate as JSON")
+
+    def handle(self, *args, **options):
+        stats = {}
+        for path in options['paths'] or [inspector_options()['REPORT_PATH']]:
+            try:
+                with open(path) as f:
+                    for line in f:
+                        if line.strip():
+                            self.add(stats, json.loads(line))
+            except FileNotFoundError:
+                raise CommandError(f"No report at {path}")
+
+        rows = sorted(stats.values(), key=lambda row: -row[options['sort']])[:options['limit']]
+        for row in rows:
+            row['total_ms'] = round(row['total_ms'], 3)
+            row['views'] = sorted(row['views'])
+            row['callsites'] = dict(sorted(row['callsites'].items(), key=lambda item: -item[1])[:3])
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+        self.stdout.write(f"{'fingerprint':<12} {'requests':>8} {'count':>7} {'max/req':>7} {'total ms':>10} "
+                          f"{'slow':>5}  sql")
+        for row in rows:
+            self.stdout.write(f"{row['fingerprint']:<12} {row['requests']:>8} {row['count']:>7} {row['max_per_request']:>7} "
+                              f"{row['total_ms']:>10.1f} {row['slow']:>5}  {row['sql'][:100]}")
+            for site, count in row['callsites'].items():
+                self.stdout.write(f"{'':<12} {count:>8} × {site}")
+
+    @staticmethod
+    def add(stats, report):
+        def entry(key, sql):
+            if key not in stats:
+                stats[key] = {'fingerprint': key, 'sql': sql, 'requests': 0, 'count': 0, 'max_per_request': 0,
+                              'total_ms': 0.0, 'slow': 0, 'views': set(), 'callsites': {}}
+            return stats[key]
+
+        view = report.get('view') or report.get('path')
+        seen = set()
+        for duplicate in report['duplicates']:
+            row = entry(duplicate['fingerprint'], duplicate['sql'])
+            row['count'] += duplicate['count']
+            row['max_per_request'] = max(row['max_per_request'], duplicate['count'])
+            row['total_ms'] += duplicate['total_ms']
+            for site, count in duplicate['callsites'].items():
+                row['callsites'][site] = row['callsites'].get(site, 0) + count
+            seen.add(duplicate['fingerprint'])
+        for slow in report['slow']:
+            row = entry(slow['fingerprint'], slow['sql'])
+            row['slow'] += 1
+            if slow['fingerprint'] not in seen:
+                # Not a duplicate, so its time isn't in total_ms yet.
+                row['count'] += 1
+                row['total_ms'] += slow['ms']
+                row['callsites'][slow['callsite']] = row['callsites'].get(slow['callsite'], 0) + 1
+        for key in seen | {slow['fingerprint'] for slow in report['slow']}:
+            stats[key]['requests'] += 1
+            stats[key]['views'].add(view)
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bookings.aggregates import refresh_ratings, refresh_room_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized room and rating aggregates (after bulk loads or .update() calls)"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        hotels = refresh_room_stats()
+        ratings = refresh_ratings()
+        self.stdout.write(self.style.SUCCESS(
+            f"{hotels} hotel(s) corrected, {ratings} rating row(s) corrected "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -1,8 +1,29 @@
-import random, os
-from django.core.management.base import BaseCommand
-from django.core.files import File
+import multiprocessing
+import os
+import random
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
 from django.conf import settings
-from bookings.models import Hotel, Room
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from bookings.aggregates import refresh_room_stats
+from bookings.amenities import AMENITIES as POSSIBLE_AMENITIES, amenity_mask
+from bookings.cache import CATALOG_SCOPE, catalog_cache
+from bookings.models import Booking, Hotel, RateRule, Review, Room, RoomNight, User
+from bookings.pricing import invalidate_prices
+from bookings.search import get_search_index
+from hotel_backend.media import is_content_addressed_storage
+from payment.models import Payment
 
 HOTEL_NAMES = [
     "Blue Nile Retreat", "Addis Comfort Inn", "Lalibela Sky Hotel",
@@ -23,17 +44,19 @@ LOCATIONS = [
     "Jimma, Ethiopia", "Jinka, Ethiopia", "Semera, Ethiopia", "Negele Borana, Ethiopia"
 ]
 
-POSSIBLE_AMENITIES = [
-    "Free WiFi", "Pool", "Gym", "Spa", "Restaurant", "Bar", "Parking",
-    "Airport Shuttle", "Pet Friendly", "Breakfast Included",
-    "Room Service", "Laundry Service", "24h Front Desk"
-]
-
 BED_TYPES = ['SINGLE', 'QUEEN', 'KING']
 
 PROJECT_ROOT = settings.BASE_DIR
 MEDIA_IMAGES = os.path.join(PROJECT_ROOT, 'media', 'hotel_images')
 
+SEED_EMAIL_DOMAIN = 'seed.example'
+SEED_PASSWORD = 'password123'
+
+# Each room gets consecutive week-long slots; a stay fits inside its slot,
+# so generated bookings never overlap without having to check.
+SLOT_DAYS = 7
+BOOKING_STATUSES = [(Booking.COMPLETED, 70), (Booking.CANCELLED, 20), (Booking.PENDING, 10)]
+
 
 def find_image_path(name):
     slug = name.lower().replace(' ', '_')
@@ -44,55 +67,235 @@ def find_image_path(name):
     return None
 
 
+def existing_images():
+    """
+    Storage names of the bundled images in media/hotel_images, keyed by hotel
+    name. A content-addressed storage gets each file saved once (a no-op when
+    it already holds the bytes); otherwise the files are referenced in place.
+    """
+    images = {}
+    for name in HOTEL_NAMES:
+        path = find_image_path(name)
+        if not path:
+            continue
+        storage_name = f"hotel_images/{os.path.basename(path)}"
+        if is_content_addressed_storage():
+            with open(path, 'rb') as f:
+                storage_name = default_storage.save(storage_name, File(f))
+        images[name] = storage_name
+    return images
+
+
+# ───── Row generators ────────────────────────────────────────────────────────
+# Every row draws from its own RNG keyed by (seed, kind, index), so the output
+# is the same whatever the batch size or number of worker processes.
+
+def row_rng(seed, kind, index):
+    return random.Random(f"{seed}:{kind}:{index}")
+
+
+def row_uuid(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def room_price(seed, room_index):
+    return Decimal(str(round(row_rng(seed, 'room-price', room_index).uniform(30, 200), 2)))
+
+
+def generate_users(plan, start, stop):
+    return [
+        User(
+            id=plan['user_base'] + i,
+            uid=row_uuid(row_rng(plan['seed'], 'user', i)),
+            email=f"guest{i}@{SEED_EMAIL_DOMAIN}",
+            username=f"guest{i}",
+            password=plan['password'],
+        )
+        for i in range(start, stop)
+    ]
+
+
+def generate_hotels(plan, start, stop):
+    hotels = []
+    for i in range(start, stop):
+        rng = row_rng(plan['seed'], 'hotel', i)
+        base_name = HOTEL_NAMES[i % len(HOTEL_NAMES)]
+        name = base_name if i < len(HOTEL_NAMES) else f"{base_name} {i // len(HOTEL_NAMES) + 1}"
+        amenities = rng.sample(POSSIBLE_AMENITIES, k=5)
+        image = plan['images'].get(base_name)
+        hotels.append(Hotel(
+            id=plan['hotel_base'] + i,
+            uid=row_uuid(rng),
+            name=name,
+            location=LOCATIONS[i % len(LOCATIONS)],
+            description=f"A lovely stay at {name}.",
+            has_pool='Pool' in amenities,
+            has_gym='Gym' in amenities,
+            price=Decimal(str(round(rng.uniform(50, 300), 2))),
+            stars=rng.randint(1, 5),
+            amenities=amenities,
+            amenity_mask=amenity_mask(amenities),  # bulk_create skips Hotel.save()
+            is_active=True,
+            featured_image=image,
+            image_url=settings.MEDIA_URL + image if image else None,
+        ))
+    return hotels
+
+
+def generate_rooms(plan, start, stop):
+    rooms = []
+    for i in range(start, stop):
+        rng = row_rng(plan['seed'], 'room', i)
+        rooms.append(Room(
+            id=plan['room_base'] + i,
+            uid=row_uuid(rng),
+            hotel_id=plan['hotel_base'] + i // plan['rooms_per_hotel'],
+            name=f"Room {i % plan['rooms_per_hotel'] + 1}",
+            description="Comfortable and spacious room.",
+            bed_count=rng.randint(1, 3),
+            bathroom_count=rng.randint(1, 2),
+            bed_type=rng.choice(BED_TYPES),
+            price=room_price(plan['seed'], i),
+            capacity=rng.choice([1, 2, 3, 4]),
+            is_available=True,
+        ))
+    return rooms
+
+
+def generate_bookings(plan, start, stop):
+    statuses, weights = zip(*BOOKING_STATUSES)
+    hold_expires_at = plan['now'] + timedelta(seconds=settings.BOOKING_HOLD_TTL)
+    bookings, nights = [], []
+    for i in range(start, stop):
+        rng = row_rng(plan['seed'], 'booking', i)
+        room_index, slot = i % plan['rooms'], i // plan['rooms']
+        length = rng.randint(1, 4)
+        check_in = plan['start_date'] + timedelta(days=slot * SLOT_DAYS + rng.randint(0, SLOT_DAYS - length))
+        status = rng.choices(statuses, weights)[0]
+        booking = Booking(
+            id=plan['booking_base'] + i,
+            uid=row_uuid(rng),
+            hotel_id=plan['hotel_base'] + room_index // plan['rooms_per_hotel'],
+            room_id=plan['room_base'] + room_index,
+            user_id=plan['user_base'] + rng.randrange(plan['users']),
+            check_in=check_in,
+            check_out=check_in + timedelta(days=length),
+            total_price=room_price(plan['seed'], room_index) * length,
+            status=status,
+            hold_expires_at=hold_expires_at if status == Booking.PENDING else None,
+        )
+        bookings.append(booking)
+        if status in Booking.ACTIVE_STATUSES:
+            # bulk_create skips Booking.save(), so materialize the nights here.
+            nights.extend(RoomNight(room_id=booking.room_id, booking_id=booking.id, date=night)
+                          for night in booking.stay_dates())
+    return bookings, nights
+
+
+def generate(job):
+    generator, plan, start, stop = job
+    return generator(plan, start, stop)
+
+
 class Command(BaseCommand):
-    help = "Seed hotels + rooms + attach images + set image_url"
+    help = "Seed hotels, rooms, users and bookings in bulk (deterministic for a given --seed)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hotels', type=int, default=len(HOTEL_NAMES), help="Hotels to create")
+        parser.add_argument('--rooms-per-hotel', type=int, default=3, help="Rooms per hotel")
+        parser.add_argument('--users', type=int, default=0, help=f"Guest users (guestN@{SEED_EMAIL_DOMAIN})")
+        parser.add_argument('--bookings', type=int, default=0, help="Bookings spread over all rooms")
+        parser.add_argument('--seed', type=int, default=None, help="RNG seed; same seed, same rows")
+        parser.add_argument('--start-date', type=date.fromisoformat, default=None,
+                            help="First possible check-in (default today)")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per bulk insert transaction")
+        parser.add_argument('--workers', type=int, default=1, help="Processes generating rows")
 
     def handle(self, *args, **options):
-        # Wipe existing data (optional)
-        Hotel.objects.all().delete()
-        Room.objects.all().delete()
-
-        for name, loc in zip(HOTEL_NAMES, LOCATIONS):
-            amenities = random.sample(POSSIBLE_AMENITIES, k=5)
-            defaults = {
-                'location': loc,
-                'description': f"A lovely stay at {name}.",
-                'has_pool': 'Pool' in amenities,
-                'has_gym': 'Gym' in amenities,
-                'price': round(random.uniform(50, 300), 2),
-                'stars': random.randint(1, 5),
-                'amenities': amenities,
-                'is_active': True,
-            }
-            hotel, _ = Hotel.objects.get_or_create(name=name, defaults=defaults)
-
-            # Attach featured_image and set image_url
-            img_path = find_image_path(name)
-            if img_path:
-                with open(img_path, 'rb') as f:
-                    hotel.featured_image.save(os.path.basename(img_path), File(f), save=True)
-                ext = os.path.splitext(img_path)[1]
-                slug = name.lower().replace(' ', '_')
-                hotel.image_url = settings.MEDIA_URL + f"hotel_images/{slug}{ext}"
-                hotel.save()
-                self.stdout.write(self.style.SUCCESS(f"Seeded image & URL for {name}"))
-            else:
-                self.stdout.write(self.style.WARNING(f"No image found for {name}"))
-
-            # Seed rooms
-            target = random.randint(1, 5)
-            for i in range(target):
-                Room.objects.create(
-                    hotel=hotel,
-                    name=f"Room {i+1}",
-                    description="Comfortable and spacious room.",
-                    bed_count=random.randint(1, 3),
-                    bathroom_count=random.randint(1, 2),   # New field
-                    bed_type=random.choice(BED_TYPES),     # New field
-                    price=round(random.uniform(30, 200), 2),
-                    capacity=random.choice([1, 2, 3, 4]),
-                    is_available=True
-                )
-            self.stdout.write(f" → {hotel.name} has {hotel.rooms.count()} rooms")
-
-        self.stdout.write(self.style.SUCCESS("🎉 Seeding complete."))
+        if options['bookings'] and not options['users']:
+            raise CommandError("--bookings needs --users")
+        if options['bookings'] and not options['hotels'] * options['rooms_per_hotel']:
+            raise CommandError("--bookings needs at least one room")
+        seed = options['seed'] if options['seed'] is not None else random.randrange(2 ** 32)
+        started = time.perf_counter()
+
+        self.wipe()
+        plan = {
+            'seed': seed,
+            'now': timezone.now(),
+            'start_date': options['start_date'] or date.today(),
+            'images': existing_images(),
+            'password': make_password(SEED_PASSWORD),  # hashed once, shared by every seeded user
+            'users': options['users'],
+            'rooms': options['hotels'] * options['rooms_per_hotel'],
+            'rooms_per_hotel': options['rooms_per_hotel'],
+            'user_base': self.next_id(User),
+            'hotel_base': self.next_id(Hotel),
+            'room_base': self.next_id(Room),
+            'booking_base': self.next_id(Booking),
+        }
+
+        self.workers = options['workers']
+        self.batch_size = options['batch_size']
+        pool = multiprocessing.Pool(self.workers) if self.workers > 1 else None
+        try:
+            self.stage(pool, User, generate_users, plan, options['users'])
+            self.stage(pool, Hotel, generate_hotels, plan, options['hotels'])
+            self.stage(pool, Room, generate_rooms, plan, plan['rooms'])
+            self.stage(pool, Booking, generate_bookings, plan, options['bookings'])
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        with connection.cursor() as cursor:
+            # Explicit ids leave sequences behind on PostgreSQL; no-op on SQLite.
+            for statement in connection.ops.sequence_reset_sql(no_style(), [User, Hotel, Room, Booking]):
+                cursor.execute(statement)
+        # bulk_create skips the Room signals that keep these up to date.
+        refresh_room_stats(range(plan['hotel_base'], plan['hotel_base'] + options['hotels']))
+        get_search_index().rebuild()
+        catalog_cache.bump(CATALOG_SCOPE)
+        invalidate_prices()   # room ids are reused, so compiled calendars would price the old rooms
+
+        self.stdout.write(self.style.SUCCESS(
+            f"🎉 Seeding complete in {time.perf_counter() - started:.1f}s (seed={seed}, "
+            f"password for {SEED_EMAIL_DOMAIN} users: {SEED_PASSWORD})"
+        ))
+
+    def wipe(self):
+        with transaction.atomic():
+            # Raw deletes skip the per-row cascade and signals; the search
+            # index and catalog cache are rebuilt once at the end instead.
+            # Payments are kept, unlinked, so the tables are emptied children
+            # first with DELETE: PostgreSQL refuses to TRUNCATE bookings_booking
+            # while payment_payment references it, whatever the rows.
+            Payment.objects.filter(booking__isnull=False).update(booking=None)
+            with connection.cursor() as cursor:
+                for model in (RoomNight, Booking, Review, RateRule, Room, Hotel):
+                    cursor.execute(f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)}")
+            User.objects.filter(email__endswith=f"@{SEED_EMAIL_DOMAIN}").delete()
+
+    @staticmethod
+    def next_id(model):
+        return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+    def stage(self, pool, model, generator, plan, total):
+        """Generate `total` rows in batch_size chunks (in the pool if any) and insert each in one transaction."""
+        if not total:
+            return
+        started = time.perf_counter()
+        jobs = [(generator, plan, start, min(start + self.batch_size, total))
+                for start in range(0, total, self.batch_size)]
+        chunks = pool.imap(generate, jobs) if pool else map(generate, jobs)
+        nights = 0
+        for rows in chunks:
+            room_nights = []
+            if model is Booking:
+                rows, room_nights = rows
+            with transaction.atomic():
+                model.objects.bulk_create(rows, batch_size=self.batch_size)
+                RoomNight.objects.bulk_create(room_nights, batch_size=self.batch_size)
+            nights += len(room_nights)
+        extra = f" ({nights} room nights)" if nights else ""
+        self.stdout.write(f" → {total} {model._meta.verbose_name_plural}{extra} in {time.perf_counter() - started:.1f}s")
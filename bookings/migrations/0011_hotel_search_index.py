@@ -0,0 +1,42 @@
+from django.db import migrations
+
+FTS_TABLE = 'bookings_hotel_fts'
+FTS_VOCAB_TABLE = 'bookings_hotel_fts_vocab'
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite-only; other databases use the in-process index in
+    # bookings/search.py and need no schema.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        "name, location, description, amenities, rooms, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(f"CREATE VIRTUAL TABLE {FTS_VOCAB_TABLE} USING fts5vocab({FTS_TABLE}, 'row')")
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, name, location, description, amenities, rooms) "
+        "SELECT h.id, h.name, h.location, h.description, "
+        "(SELECT group_concat(value, ' ') FROM json_each(h.amenities)), "
+        "(SELECT group_concat(r.name || ' ' || r.description, ' ') FROM bookings_room r WHERE r.hotel_id = h.id) "
+        "FROM bookings_hotel h"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_VOCAB_TABLE}")
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_hotel_room_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
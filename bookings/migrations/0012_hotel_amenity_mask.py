@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:08
+
+from django.db import migrations, models
+
+from bookings.amenities import amenity_mask
+
+
+def backfill_amenity_masks(apps, schema_editor):
+    Hotel = apps.get_model('bookings', 'Hotel')
+    hotels = list(Hotel.objects.only('id', 'amenities'))
+    for hotel in hotels:
+        hotel.amenity_mask = amenity_mask(hotel.amenities)
+    Hotel.objects.bulk_update(hotels, ['amenity_mask'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0011_hotel_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hotel',
+            name='amenity_mask',
+            field=models.PositiveBigIntegerField(default=0, editable=False, help_text='Bitset of amenities, see bookings/amenities.py'),
+        ),
+        migrations.RunPython(backfill_amenity_masks, migrations.RunPython.noop),
+    ]
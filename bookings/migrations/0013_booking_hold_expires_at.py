@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:18
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_holds(apps, schema_editor):
+    # Existing unpaid bookings get a full hold from the time of the deploy,
+    # not from created_at: otherwise the first sweep would cancel every one
+    # of them at once, including those with a payment under way.
+    Booking = apps.get_model('bookings', 'Booking')
+    Booking.objects.filter(status='PENDING').update(
+        hold_expires_at=timezone.now() + timedelta(seconds=settings.BOOKING_HOLD_TTL)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0012_hotel_amenity_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='hold_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'hold_expires_at'], name='booking_status_hold_idx'),
+        ),
+        migrations.RunPython(backfill_holds, migrations.RunPython.noop),
+    ]
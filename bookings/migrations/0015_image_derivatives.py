@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0014_claimsuser'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hotel',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized copies of featured_image, see bookings/images.py'),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized copies of image, see bookings/images.py'),
+        ),
+    ]
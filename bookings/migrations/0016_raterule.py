@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0015_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('kind', models.CharField(choices=[('SEASON', 'Season'), ('WEEKDAY', 'Weekday'), ('LENGTH_OF_STAY', 'Length of stay')], max_length=20)),
+                ('start_date', models.DateField(blank=True, help_text='First night the rule applies to', null=True)),
+                ('end_date', models.DateField(blank=True, help_text='Last night the rule applies to', null=True)),
+                ('weekdays', models.PositiveSmallIntegerField(default=0, help_text='Bitmask of nights, Monday = 1 … Sunday = 64; 0 = every night')),
+                ('min_nights', models.PositiveSmallIntegerField(default=1)),
+                ('percent', models.DecimalField(decimal_places=2, default=0, help_text='± % of the price', max_digits=6)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, help_text='± per night', max_digits=8)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('hotel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rate_rules', to='bookings.hotel')),
+                ('room', models.ForeignKey(blank=True, help_text='Empty: every room of the hotel', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rate_rules', to='bookings.room')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hotel', 'is_active'], name='raterule_hotel_active_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:56
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_room_stats(apps, schema_editor):
+    Hotel = apps.get_model('bookings', 'Hotel')
+    Room = apps.get_model('bookings', 'Room')
+    rooms = Room.objects.filter(hotel=OuterRef('pk'), is_available=True).order_by().values('hotel')
+
+    def aggregate(expression):
+        return Subquery(rooms.annotate(value=expression).values('value'))
+
+    Hotel.objects.update(
+        min_price=aggregate(Min('price')),
+        room_count=Coalesce(aggregate(Count('id')), Value(0), output_field=IntegerField()),
+        max_capacity=Coalesce(aggregate(Max('capacity')), Value(0), output_field=IntegerField()),
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0016_raterule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hotel',
+            name='max_capacity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hotel',
+            name='min_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, help_text='Cheapest available room; empty when none is available', max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='hotel',
+            name='room_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='hotel',
+            index=models.Index(fields=['is_active', 'min_price'], name='hotel_active_min_price_idx'),
+        ),
+        migrations.RunPython(backfill_room_stats, migrations.RunPython.noop),
+    ]
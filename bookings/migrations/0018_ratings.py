@@ -0,0 +1,71 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:59
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def drop_duplicate_reviews(apps, schema_editor):
+    # Keep each user's latest review of a room so the unique constraint can be added.
+    Review = apps.get_model('bookings', 'Review')
+    latest = (Review.objects.values('user', 'room').order_by()
+              .annotate(latest=Max('id')).values_list('latest', flat=True))
+    Review.objects.exclude(id__in=list(latest)).delete()
+
+
+def backfill_ratings(apps, schema_editor):
+    Hotel = apps.get_model('bookings', 'Hotel')
+    Room = apps.get_model('bookings', 'Room')
+    Review = apps.get_model('bookings', 'Review')
+
+    def aggregate(reviews, expression):
+        value = Subquery(reviews.annotate(value=expression).values('value'))
+        return Coalesce(value, Value(0), output_field=IntegerField())
+
+    for model, key in ((Room, 'room'), (Hotel, 'room__hotel')):
+        reviews = Review.objects.filter(**{key: OuterRef('pk')}).order_by().values(key)
+        model.objects.update(
+            rating_sum=aggregate(reviews, Sum('rating')),
+            rating_count=aggregate(reviews, Count('id')),
+        )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0017_hotel_room_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hotel',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hotel',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="Of all its rooms' reviews"),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='rating',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.RunPython(drop_duplicate_reviews, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('user', 'room'), name='unique_review_per_user_room'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
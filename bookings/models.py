@@ -1,8 +1,28 @@
 import uuid
-from django.db import models
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
+from django.utils import timezone
 
 from django.contrib.auth.models import AbstractUser
 
+from .amenities import amenity_mask
+
+
+def skip_maintained_fields(instance, kwargs):
+    """
+    Leave instance.MAINTAINED_FIELDS out of a full save() of an existing row.
+    They are only written with F() or recomputed by bookings/aggregates.py,
+    so the values an instance loaded earlier holds are stale by definition.
+    """
+    if instance._state.adding or kwargs.get('force_insert') or kwargs.get('update_fields') is not None:
+        return
+    skipped = {*instance.MAINTAINED_FIELDS, *instance.get_deferred_fields()}
+    kwargs['update_fields'] = [field.name for field in instance._meta.concrete_fields
+                               if not field.primary_key and field.name not in skipped and field.attname not in skipped]
+
 # Create your models here.
 class User(AbstractUser):
     email    = models.EmailField(unique=True)
@@ -18,6 +38,28 @@ class User(AbstractUser):
     def __str__(self):
        return self.uid
 
+
+class ClaimsUser(User):
+    """
+    A User built from access-token claims (see bookings/authentication.py) with
+    every other field deferred. The first access to a deferred field
+    loads the whole row at once, through the auth user cache.
+    """
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is None or from_queryset is not None or not deferred.issuperset(fields):
+            return super().refresh_from_db(using, fields, from_queryset)
+        from .authentication import cached_user_row
+        row = cached_user_row(self.pk)
+        if row is None:
+            raise User.DoesNotExist(f"User {self.pk} no longer exists")
+        for attname in deferred:
+            self.__dict__[attname] = row[attname]
+
+
 class Hotel(models.Model):
     uid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     name           = models.CharField(max_length=200)
@@ -28,12 +70,44 @@ class Hotel(models.Model):
                         default=3
                      )
     amenities      = models.JSONField(default=list, help_text="Up to 5 amenities")
+    amenity_mask   = models.PositiveBigIntegerField(default=0, editable=False,
+                        help_text="Bitset of amenities, see bookings/amenities.py")
     image_url      = models.URLField(blank=True, null=True)
     has_pool       = models.BooleanField(default=False)
     has_gym        = models.BooleanField(default=False)
     price          = models.DecimalField(max_digits=10, decimal_places=2)
     is_active      = models.BooleanField(default=True)
     featured_image = models.ImageField(upload_to='hotel_images/', blank=True, null=True)
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False,
+                        help_text="Resized copies of featured_image, see bookings/images.py")
+    # Aggregates of the available rooms, maintained by bookings/aggregates.py.
+    min_price      = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True, editable=False,
+                        help_text="Cheapest available room; empty when none is available")
+    room_count     = models.PositiveIntegerField(default=0, editable=False)
+    max_capacity   = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum     = models.PositiveIntegerField(default=0, editable=False, help_text="Of all its rooms' reviews")
+    rating_count   = models.PositiveIntegerField(default=0, editable=False)
+    updated_at     = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # HotelListAPI: is_active = ? AND location = ?
+            models.Index(fields=['is_active', 'location'], name='hotel_active_location_idx'),
+            # HotelFilterAPI: is_active = ? AND price BETWEEN ? AND ?
+            models.Index(fields=['is_active', 'price'], name='hotel_active_price_idx'),
+            # ?ordering=min_price and min_price__gte/lte on the hotel lists
+            models.Index(fields=['is_active', 'min_price'], name='hotel_active_min_price_idx'),
+        ]
+
+    MAINTAINED_FIELDS = ('min_price', 'room_count', 'max_capacity', 'rating_sum', 'rating_count')
+
+    def save(self, *args, **kwargs):
+        self.amenity_mask = amenity_mask(self.amenities)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'amenities' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'amenity_mask'}
+        skip_maintained_fields(self, kwargs)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -55,14 +129,88 @@ class Room(models.Model):
     capacity      = models.PositiveIntegerField()
     is_available  = models.BooleanField(default=True)
     image         = models.ImageField(upload_to='room_images/', blank=True, null=True)
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False,
+                        help_text="Resized copies of image, see bookings/images.py")
+    # Review aggregates, maintained by bookings/aggregates.py.
+    rating_sum    = models.PositiveIntegerField(default=0, editable=False)
+    rating_count  = models.PositiveIntegerField(default=0, editable=False)
+    updated_at    = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # HotelDetailSerializer.get_rooms: hotel_id = ? AND is_available = ?
+            models.Index(fields=['hotel', 'is_available'], name='room_hotel_available_idx'),
+        ]
+
+    MAINTAINED_FIELDS = ('rating_sum', 'rating_count')
+
+    def save(self, *args, **kwargs):
+        skip_maintained_fields(self, kwargs)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        room = super().from_db(db, field_names, values)
+        # Lets the aggregate signal refresh the hotel a room was moved away from.
+        room._loaded_hotel_id = room.__dict__.get('hotel_id')
+        return room
 
     def __str__(self):
         return self.name
 
+class RateRule(models.Model):
+    """
+    An adjustment of Room.price, compiled into nightly rates by bookings/pricing.py.
+
+    SEASON and WEEKDAY rules change the rate of each night they match (by
+    date range and/or weekday mask). LENGTH_OF_STAY rules change the total
+    of stays of at least min_nights; only the longest matching one applies.
+    """
+    SEASON = 'SEASON'; WEEKDAY = 'WEEKDAY'; LENGTH_OF_STAY = 'LENGTH_OF_STAY'
+    KIND_CHOICES = [(SEASON, 'Season'), (WEEKDAY, 'Weekday'), (LENGTH_OF_STAY, 'Length of stay')]
+    NIGHTLY_KINDS = (SEASON, WEEKDAY)
+
+    hotel      = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name='rate_rules')
+    room       = models.ForeignKey(Room, on_delete=models.CASCADE, null=True, blank=True, related_name='rate_rules',
+                    help_text="Empty: every room of the hotel")
+    name       = models.CharField(max_length=100, blank=True)
+    kind       = models.CharField(max_length=20, choices=KIND_CHOICES)
+    start_date = models.DateField(null=True, blank=True, help_text="First night the rule applies to")
+    end_date   = models.DateField(null=True, blank=True, help_text="Last night the rule applies to")
+    weekdays   = models.PositiveSmallIntegerField(default=0,
+                    help_text="Bitmask of nights, Monday = 1 … Sunday = 64; 0 = every night")
+    min_nights = models.PositiveSmallIntegerField(default=1)
+    percent    = models.DecimalField(max_digits=6, decimal_places=2, default=0, help_text="± % of the price")
+    amount     = models.DecimalField(max_digits=8, decimal_places=2, default=0, help_text="± per night")
+    is_active  = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # pricing.compile_calendars: hotel_id IN (...) AND is_active
+            models.Index(fields=['hotel', 'is_active'], name='raterule_hotel_active_idx'),
+        ]
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if self.room_id and self.room.hotel_id != self.hotel_id:
+            raise ValidationError({'room': "The room must belong to the rule's hotel."})
+        if self.start_date and self.end_date and self.start_date > self.end_date:
+            raise ValidationError({'end_date': "End date must not be before the start date."})
+        if self.kind == self.SEASON and not (self.start_date or self.end_date):
+            raise ValidationError({'start_date': "A season needs a start and/or end date."})
+        if self.kind == self.WEEKDAY and not 0 < self.weekdays < 128:
+            raise ValidationError({'weekdays': "Pick at least one weekday."})
+
+    def __str__(self):
+        return self.name or f"{self.get_kind_display()} {self.percent:+}% {self.amount:+}"
+
 class Booking(models.Model):
     uid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     PENDING     = 'PENDING'; COMPLETED = 'COMPLETED'; CANCELLED = 'CANCELLED'
     STATUS_CHOICES = [(PENDING,'Pending'), (COMPLETED,'Completed'), (CANCELLED,'Cancelled')]
+    # Bookings in these states hold their room for the booked nights.
+    ACTIVE_STATUSES = (PENDING, COMPLETED)
 
     hotel       = models.ForeignKey(Hotel, on_delete=models.CASCADE)
     user        = models.ForeignKey(User,  on_delete=models.CASCADE)
@@ -72,21 +220,92 @@ class Booking(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     status      = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
     created_at  = models.DateTimeField(auto_now_add=True)
+    # Unpaid PENDING bookings release their nights after this (see holds.py).
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         # unique_together = ('room','check_in','check_out')
 
         # def __str__(self):
         #   return f"Booking #{self.uid}"
-        pass
+        indexes = [
+            # RoomBookedRangesAPI: room_id = ? AND status IN (...), covering the dates
+            models.Index(fields=['room', 'status', 'check_in', 'check_out'], name='booking_room_status_dates_idx'),
+            # expire_booking_holds: status = 'PENDING' AND hold_expires_at <= now
+            models.Index(fields=['status', 'hold_expires_at'], name='booking_status_hold_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # The booking row and its RoomNight rows commit or fail together, so a
+        # clash on the (room, date) constraint rolls the booking back too.
+        if self._state.adding and self.status == self.PENDING and self.hold_expires_at is None:
+            self.hold_expires_at = timezone.now() + timedelta(seconds=settings.BOOKING_HOLD_TTL)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.sync_nights()
+
+    def stay_dates(self):
+        """Dates of every night of the stay (check-out day excluded)."""
+        return [self.check_in + timedelta(days=i) for i in range((self.check_out - self.check_in).days)]
+
+    def sync_nights(self):
+        """
+        Make this booking's RoomNight rows match its room, dates and status.
+        Raises IntegrityError if another booking already holds one of the nights.
+        """
+        held = RoomNight.objects.filter(booking=self)
+        if self.status not in self.ACTIVE_STATUSES:
+            held.delete()
+            return
+
+        wanted = set(self.stay_dates())
+        existing = {(room_id, night) for room_id, night in held.values_list('room_id', 'date')}
+        stale = [night for room_id, night in existing if room_id != self.room_id or night not in wanted]
+        if stale:
+            held.filter(date__in=stale).delete()
+        missing = wanted - {night for room_id, night in existing if room_id == self.room_id}
+        RoomNight.objects.bulk_create(
+            [RoomNight(room_id=self.room_id, booking=self, date=night) for night in sorted(missing)]
+        )
+
+
+class RoomNight(models.Model):
+    """
+    One occupied night of a room, materialized from its active booking.
+    The (room, date) constraint lets the database itself reject double-booking.
+    """
+    room    = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='nights')
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='room_nights')
+    date    = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'date'], name='unique_room_night'),
+        ]
+
+    def __str__(self):
+        return f"{self.room} on {self.date}"
 
 class Review(models.Model):
     uid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     user       = models.ForeignKey(User, on_delete=models.CASCADE)
     room       = models.ForeignKey(Room, on_delete=models.CASCADE)
-    rating     = models.PositiveSmallIntegerField()
+    rating     = models.PositiveSmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment    = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'room'], name='unique_review_per_user_room'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        review = super().from_db(db, field_names, values)
+        # The (room, rating) already counted in the aggregates, see signals.review_saved.
+        if 'room_id' in field_names and 'rating' in field_names:
+            review._counted = (review.room_id, review.rating)
+        return review
+
     def __str__(self):
         return f"{self.user.username}'s review"
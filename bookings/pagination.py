@@ -0,0 +1,146 @@
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Keyset pagination with opaque cursors.
+
+    Unlike DRF's CursorPagination, which keys on the first ordering field and
+    falls back to OFFSET for ties, the cursor stores the full sort key of the
+    boundary row and the next page is fetched with a lexicographic
+    `(a, b, id) > (x, y, z)` filter. Every page is therefore an index range
+    scan of `page_size` rows, however deep it is. `id` is always appended as
+    the final tie-breaker.
+
+    Nullable model fields (e.g. Hotel.min_price) sort their NULLs after every
+    value in ascending order and before them in descending order, on every
+    database, so a reversed page is exactly the previous one.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(super().get_ordering(request, queryset, view))
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering += ('id',)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        position = json.loads(self.cursor.position) if self.cursor and self.cursor.position else None
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        nullable = self.nullable_fields(queryset.model, ordering)
+        queryset = queryset.order_by(*(self.order_expression(field, nullable) for field in ordering))
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position, nullable))
+
+        # Fetch one extra row to learn whether there is another page.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        if not self.page:
+            self.has_next = self.has_previous = False
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    @staticmethod
+    def nullable_fields(model, ordering):
+        nullable = set()
+        for field in ordering:
+            name = field.lstrip('-')
+            try:
+                if model._meta.get_field(name).null:
+                    nullable.add(name)
+            except FieldDoesNotExist:
+                pass   # annotations such as `rank`
+        return nullable
+
+    @staticmethod
+    def order_expression(field, nullable=()):
+        name = field.lstrip('-')
+        if name not in nullable:
+            return field
+        return F(name).desc(nulls_first=True) if field.startswith('-') else F(name).asc(nulls_last=True)
+
+    @staticmethod
+    def after(ordering, position, nullable=()):
+        """
+        Rows strictly past `position` in `ordering`, as a Q object:
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND id > z).
+        For a nullable `a`, NULL is past every value ascending and before
+        every value descending.
+        """
+        condition, equal = Q(), Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            descending = field.startswith('-')
+            if name in nullable and value is None:
+                past = Q(**{f'{name}__isnull': False}) if descending else Q(pk__in=[])
+                same = Q(**{f'{name}__isnull': True})
+            else:
+                past = Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+                if name in nullable and not descending:
+                    past |= Q(**{f'{name}__isnull': True})
+                same = Q(**{name: value})
+            condition |= equal & past
+            equal &= same
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        fields = [field.lstrip('-') for field in ordering]
+        if isinstance(instance, dict):
+            values = [instance[field] for field in fields]
+        else:
+            values = [getattr(instance, field) for field in fields]
+        return json.dumps(values, cls=DjangoJSONEncoder)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+
+class SearchRankPagination(KeysetCursorPagination):
+    """Keyset pages over a `rank` annotation (best match first)."""
+    ordering = 'rank'
+
+
+class AvailabilityPagination(KeysetCursorPagination):
+    """Free rooms in available_rooms() order: by hotel, cheapest first."""
+    ordering = ('hotel_id', 'price', 'id')
+    page_size = 50
+
+
+class ReviewPagination(KeysetCursorPagination):
+    """Newest reviews first."""
+    ordering = '-id'
@@ -0,0 +1,229 @@
+"""
+Server-side room pricing.
+
+A room's nightly rate is its price adjusted by every active SEASON and
+WEEKDAY RateRule matching the night, hotel-wide and room-specific:
+
+    rate = price × (100 + Σ percent) / 100 + Σ amount      (never below 0)
+
+A stay's total is the sum of its nightly rates, then adjusted by the
+LENGTH_OF_STAY rule with the largest min_nights the stay reaches, if
+any.
+
+Rates are compiled per room into a RateCalendar: prefix sums, in cents,
+of the nightly rates from today over HORIZON_DAYS. Quoting any stay in
+the horizon is then the difference of two prefix entries, and a hotel's
+rooms are compiled together from one room query and one rule query.
+Stays outside the horizon are priced night by night from the same rules.
+
+Compiled calendars live in process memory and are dropped when their
+version moves. Every change to a room or a rule bumps PRICING_SCOPE in
+the catalog cache, which the process making the change sees at once.
+The catalog cache is per process by default (LocMem), so the version
+also includes the count and latest updated_at of rooms and of rules,
+read from the database at most every VERSION_TTL seconds: other
+processes recompile within that delay, whatever the cache backend. The
+date rolling over has the same effect. Queryset .update() calls skip
+both (as they skip the signals), so set updated_at when pricing fields
+are bulk-updated.
+"""
+import threading
+import time
+from array import array
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import accumulate
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .cache import catalog_cache
+from .models import RateRule, Room
+
+PRICING_SCOPE = 'pricing'
+
+DEFAULTS = {
+    'HORIZON_DAYS': 550,   # nights compiled ahead of today
+    'MAX_NIGHTS': 90,      # longest stay a quote or booking may span
+    'MAX_BATCH': 100,      # items per POST /api/quotes/
+    'VERSION_TTL': 1.0,    # seconds between checks of the rooms' and rules' version in the database
+}
+
+Quote = namedtuple('Quote', 'room_id check_in check_out nightly subtotal adjustment total')
+
+CENT = Decimal('0.01')
+
+
+def pricing_options():
+    return {**DEFAULTS, **getattr(settings, 'PRICING', {})}
+
+
+def to_cents(value):
+    return int((Decimal(value) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return (Decimal(cents) / 100).quantize(CENT)
+
+
+def _percent_of(cents, basis_points):
+    """cents × basis_points / 10000, rounded half away from zero."""
+    value = abs(cents * basis_points)
+    rounded = (value * 2 + 10000) // 20000
+    return rounded if cents * basis_points >= 0 else -rounded
+
+
+class NightlyRule:
+    __slots__ = ('start', 'end', 'weekdays', 'basis_points', 'cents')
+
+    def __init__(self, rule):
+        self.start = rule.start_date
+        self.end = rule.end_date
+        self.weekdays = rule.weekdays
+        self.basis_points = to_cents(rule.percent)   # hundredths of a percent
+        self.cents = to_cents(rule.amount)
+
+
+class RoomRates:
+    """A room's price and rules, able to price any night."""
+
+    def __init__(self, room_id, price, rules):
+        self.room_id = room_id
+        self.price_cents = to_cents(price)
+        self.nightly_rules = [NightlyRule(rule) for rule in rules if rule.kind in RateRule.NIGHTLY_KINDS]
+        # Longest first, so the first rule a stay reaches is the one that applies.
+        self.stay_rules = sorted(
+            ((rule.min_nights, to_cents(rule.percent), to_cents(rule.amount))
+             for rule in rules if rule.kind == RateRule.LENGTH_OF_STAY),
+            reverse=True,
+        )
+
+    def rates(self, start, nights):
+        """Nightly rates in cents for `nights` nights from `start`."""
+        base = self.price_cents
+        percent = [0] * nights
+        amount = [0] * nights
+        for rule in self.nightly_rules:
+            first = 0 if rule.start is None else max(0, (rule.start - start).days)
+            last = nights - 1 if rule.end is None else min(nights - 1, (rule.end - start).days)
+            for i in range(first, last + 1):
+                if not rule.weekdays or rule.weekdays & (1 << (start + timedelta(days=i)).weekday()):
+                    percent[i] += rule.basis_points
+                    amount[i] += rule.cents
+        return [max(0, base + _percent_of(base, p) + a) for p, a in zip(percent, amount)]
+
+    def stay_adjustment(self, subtotal, nights):
+        for min_nights, basis_points, cents in self.stay_rules:
+            if nights >= min_nights:
+                return _percent_of(subtotal, basis_points) + cents * nights
+        return 0
+
+
+class RateCalendar:
+    """Prefix sums of a room's nightly rates (cents) from `start`."""
+    __slots__ = ('rates', 'start', 'prefix')
+
+    def __init__(self, rates, start, horizon):
+        self.rates = rates
+        self.start = start
+        self.prefix = array('q', accumulate(rates.rates(start, horizon), initial=0))
+
+    def quote(self, check_in, check_out, nightly=False):
+        """Quote for [check_in, check_out); `nightly` also lists the rate of each night."""
+        first, last = (check_in - self.start).days, (check_out - self.start).days
+        prefix = self.prefix
+        if first >= 0 and last < len(prefix):
+            subtotal = prefix[last] - prefix[first]
+            rates = [prefix[i + 1] - prefix[i] for i in range(first, last)] if nightly else None
+        else:
+            rates = self.rates.rates(check_in, last - first)
+            subtotal = sum(rates)
+        adjustment = self.rates.stay_adjustment(subtotal, last - first)
+        return Quote(
+            room_id=self.rates.room_id,
+            check_in=check_in,
+            check_out=check_out,
+            nightly=[from_cents(rate) for rate in rates] if rates is not None else None,
+            subtotal=from_cents(subtotal),
+            adjustment=from_cents(adjustment),
+            total=from_cents(max(0, subtotal + adjustment)),
+        )
+
+
+class CalendarStore:
+    """Per-process compiled calendars, dropped whenever PRICING_SCOPE, the database version or the date moves."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calendars = {}
+        self._state = None
+        self._db_version = None
+        self._db_checked = 0.0
+
+    def _database_version(self):
+        now = time.monotonic()
+        if self._db_version is None or now - self._db_checked >= pricing_options()['VERSION_TTL']:
+            self._db_version = tuple(
+                tuple(model.objects.aggregate(count=Count('id'), latest=Max('updated_at')).values())
+                for model in (Room, RateRule)
+            )
+            self._db_checked = now
+        return self._db_version
+
+    def _current(self):
+        state = (catalog_cache.version(PRICING_SCOPE), date.today(), self._database_version())
+        with self._lock:
+            if state != self._state:
+                self._calendars, self._state = {}, state
+            return self._calendars, state[1]
+
+    def for_rooms(self, rooms):
+        """{room id: RateCalendar} for Room instances (or rows with id, hotel_id, price)."""
+        calendars, today = self._current()
+        found = {room.id: calendars[room.id] for room in rooms if room.id in calendars}
+        missing = [room for room in rooms if room.id not in found]
+        if missing:
+            compiled = compile_calendars(missing, today)
+            with self._lock:
+                calendars.update(compiled)
+            found.update(compiled)
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._calendars, self._state = {}, None
+            self._db_version = None
+
+
+calendars = CalendarStore()
+
+
+def compile_calendars(rooms, start):
+    """RateCalendars for `rooms` from `start`, reading their rules in one query."""
+    rules = {}
+    for rule in RateRule.objects.filter(hotel_id__in={room.hotel_id for room in rooms}, is_active=True):
+        rules.setdefault((rule.hotel_id, rule.room_id), []).append(rule)
+    horizon = pricing_options()['HORIZON_DAYS']
+    return {
+        room.id: RateCalendar(
+            RoomRates(room.id, room.price, rules.get((room.hotel_id, None), []) + rules.get((room.hotel_id, room.id), [])),
+            start, horizon,
+        )
+        for room in rooms
+    }
+
+
+def quote_room(room, check_in, check_out, nightly=False):
+    """Quote for one Room instance (needs id, hotel_id and price)."""
+    return calendars.for_rooms([room])[room.id].quote(check_in, check_out, nightly)
+
+
+def quote_rooms(rooms, check_in, check_out):
+    """Quotes for the same stay in each of `rooms` (e.g. all rooms of a hotel), by room id."""
+    return {room_id: calendar.quote(check_in, check_out)
+            for room_id, calendar in calendars.for_rooms(rooms).items()}
+
+
+def invalidate_prices():
+    catalog_cache.bump(PRICING_SCOPE)
@@ -0,0 +1,234 @@
+"""
+Full-text hotel search.
+
+Hotels are indexed over name, location, description, amenities and the
+names/descriptions of their rooms. On SQLite the index is an FTS5 virtual
+table maintained in the same transaction as the write; on other databases
+(or with HOTEL_SEARCH_BACKEND = 'python') an in-process inverted index is
+rebuilt whenever the catalog version moves. Both backends match every query
+term as a prefix, fall back to close vocabulary terms for typos, and rank
+with BM25 weighted towards the hotel name.
+"""
+import bisect
+import difflib
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+from .cache import CATALOG_SCOPE, catalog_cache
+from .models import Hotel, Room
+
+FTS_TABLE = 'bookings_hotel_fts'
+FTS_VOCAB_TABLE = 'bookings_hotel_fts_vocab'
+
+# Indexed columns and their BM25 weights.
+FIELD_WEIGHTS = {
+    'name': 10.0,
+    'location': 5.0,
+    'amenities': 3.0,
+    'description': 1.0,
+    'rooms': 1.0,
+}
+
+# Shortest query term that gets typo-tolerant expansion, and how close a
+# vocabulary term must be (difflib ratio) to count as a typo of it.
+TYPO_MIN_LENGTH = 4
+TYPO_CUTOFF = 0.75
+TYPO_CANDIDATES = 3
+
+FTS_DOCUMENT_SQL = f"""
+    SELECT h.id, h.name, h.location, h.description,
+           (SELECT group_concat(value, ' ') FROM json_each(h.amenities)),
+           (SELECT group_concat(r.name || ' ' || r.description, ' ')
+              FROM bookings_room r WHERE r.hotel_id = h.id)
+      FROM bookings_hotel h
+"""
+
+
+def tokenize(text):
+    """Lower-cased, accent-folded word tokens (mirrors FTS5 unicode61)."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return re.findall(r'\w+', text.lower())
+
+
+def typo_candidates(term, vocabulary):
+    if len(term) < TYPO_MIN_LENGTH:
+        return []
+    return difflib.get_close_matches(term, vocabulary, n=TYPO_CANDIDATES, cutoff=TYPO_CUTOFF)
+
+
+class SQLiteFTSIndex:
+    """FTS5 index living next to the hotel table (see migration 0011)."""
+
+    def __init__(self):
+        self._vocabulary = (None, [])
+
+    def update_hotel(self, hotel_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [hotel_id])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, location, description, amenities, rooms) '
+                f'{FTS_DOCUMENT_SQL} WHERE h.id = %s',
+                [hotel_id],
+            )
+
+    def remove_hotel(self, hotel_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [hotel_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, location, description, amenities, rooms) '
+                f'{FTS_DOCUMENT_SQL}'
+            )
+
+    def vocabulary(self):
+        version = catalog_cache.version(CATALOG_SCOPE)
+        if self._vocabulary[0] != version:
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT term FROM {FTS_VOCAB_TABLE}')
+                self._vocabulary = (version, [row[0] for row in cursor.fetchall()])
+        return self._vocabulary[1]
+
+    def match_expression(self, terms):
+        vocabulary = self.vocabulary()
+        clauses = []
+        for term in terms:
+            options = [f'"{term}"*'] + [f'"{typo}"' for typo in typo_candidates(term, vocabulary)]
+            clauses.append('(' + ' OR '.join(options) + ')')
+        return ' AND '.join(clauses)
+
+    def search(self, query, limit=200):
+        """Ids of matching hotels, best first; `limit=None` returns every match."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        weights = ', '.join(str(weight) for weight in FIELD_WEIGHTS.values())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s',
+                [self.match_expression(terms), -1 if limit is None else limit],   # LIMIT -1: no limit
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PythonIndex:
+    """
+    Pure-Python inverted index for databases without FTS5. Built lazily and
+    rebuilt whenever the catalog version changes, so every process converges
+    on the committed catalog without cross-process messaging.
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+
+    def update_hotel(self, hotel_id):
+        self.version = None
+
+    remove_hotel = update_hotel
+
+    def rebuild(self):
+        rooms = defaultdict(list)
+        for hotel_id, name, description in Room.objects.values_list('hotel_id', 'name', 'description'):
+            rooms[hotel_id].append(f'{name} {description}')
+
+        postings = defaultdict(dict)
+        lengths = {}
+        hotels = Hotel.objects.values_list('id', 'name', 'location', 'description', 'amenities')
+        for hotel_id, name, location, description, amenities in hotels:
+            fields = {
+                'name': name,
+                'location': location,
+                'description': description,
+                'amenities': ' '.join(amenities or []),
+                'rooms': ' '.join(rooms[hotel_id]),
+            }
+            weighted = Counter()
+            for field, text in fields.items():
+                for token in tokenize(text):
+                    weighted[token] += FIELD_WEIGHTS[field]
+            lengths[hotel_id] = sum(weighted.values())
+            for token, frequency in weighted.items():
+                postings[token][hotel_id] = frequency
+
+        self.postings = dict(postings)
+        self.terms = sorted(self.postings)
+        self.lengths = lengths
+        self.average_length = (sum(lengths.values()) / len(lengths)) if lengths else 0.0
+
+    def ensure_current(self):
+        version = catalog_cache.version(CATALOG_SCOPE)
+        if self.version != version:
+            with self._lock:
+                if self.version != version:
+                    self.rebuild()
+                    self.version = version
+
+    def expand(self, term):
+        """Indexed terms matched by `term`: its prefix completions, else close typos."""
+        start = bisect.bisect_left(self.terms, term)
+        matches = []
+        for indexed in self.terms[start:]:
+            if not indexed.startswith(term):
+                break
+            matches.append(indexed)
+        return matches + [typo for typo in typo_candidates(term, self.terms) if typo not in matches]
+
+    def search(self, query, limit=200):
+        """Ids of matching hotels, best first; `limit=None` returns every match."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        self.ensure_current()
+
+        documents = len(self.lengths)
+        scores, matched = Counter(), None
+        for term in terms:
+            hits = Counter()
+            for indexed in self.expand(term):
+                postings = self.postings[indexed]
+                idf = math.log(1 + (documents - len(postings) + 0.5) / (len(postings) + 0.5))
+                for hotel_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[hotel_id] / (self.average_length or 1))
+                    hits[hotel_id] = max(hits[hotel_id], idf * frequency * (self.k1 + 1) / (frequency + norm))
+            # Every query term must match (AND semantics, as with FTS5).
+            matched = set(hits) if matched is None else matched & set(hits)
+            scores.update(hits)
+
+        ranked = sorted(matched, key=lambda hotel_id: (-scores[hotel_id], hotel_id))
+        return ranked[:limit]
+
+
+_indexes = {}
+_auto_backend = None
+
+
+def resolve_backend():
+    global _auto_backend
+    backend = getattr(settings, 'HOTEL_SEARCH_BACKEND', 'auto')
+    if backend != 'auto':
+        return backend
+    if _auto_backend is None:
+        has_fts = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+        _auto_backend = 'fts5' if has_fts else 'python'
+    return _auto_backend
+
+
+def get_search_index():
+    """The configured index: 'fts5', 'python', or 'auto' (FTS5 when its table exists)."""
+    backend = resolve_backend()
+    if backend not in _indexes:
+        _indexes[backend] = SQLiteFTSIndex() if backend == 'fts5' else PythonIndex()
+    return _indexes[backend]
@@ -1,17 +1,37 @@
-from datetime import timezone
+from abc import ABC, abstractmethod
+from datetime import date
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.encoding import filepath_to_uri
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
-from .models import Hotel, Room, Booking, User
-from django.utils import timezone
+from .models import Hotel, Room, Booking, Review, User
+from .aggregates import average_rating
+from .availability import taken_nights
+from .images import srcset
+from .pricing import pricing_options, quote_room
+from django.utils.timezone import now
 
 # Serializers for Hotel
-class HotelListSerializer(serializers.ModelSerializer):
+def image_srcset(manifest, name, request):
+    return srcset(manifest, name, lambda path: request.build_absolute_uri(default_storage.url(path)))
+
+class RatingMixin:
+    """`rating` (mean of the reviews, None without any) from the stored rating_sum/rating_count."""
+
+    def get_rating(self, obj):
+        return average_rating(obj.rating_sum, obj.rating_count)
+
+
+class HotelListSerializer(RatingMixin, serializers.ModelSerializer):
     uid = serializers.UUIDField(read_only=True)
     image_url = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+    rating = serializers.SerializerMethodField()
 
     class Meta:
         model = Hotel
-        fields = ['uid', 'name', 'location', 'stars', 'amenities', 'image_url']
+        fields = ['uid', 'name', 'location', 'stars', 'amenities', 'image_url', 'image_srcset',
+                  'min_price', 'room_count', 'max_capacity', 'rating', 'rating_count']
 
     def get_image_url(self, obj):
         request = self.context.get('request')
@@ -21,16 +41,21 @@ class HotelListSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.featured_image.url)
         return None
 
-class HotelDetailSerializer(serializers.ModelSerializer):
+    def get_image_srcset(self, obj):
+        return image_srcset(obj.image_derivatives, obj.featured_image.name, self.context.get('request'))
+
+class HotelDetailSerializer(RatingMixin, serializers.ModelSerializer):
     uid = serializers.UUIDField(read_only=True)
     image_url = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+    rating = serializers.SerializerMethodField()
     rooms = serializers.SerializerMethodField()
 
     class Meta:
         model = Hotel
         fields = [
             'uid', 'name', 'location', 'description',
-            'price', 'stars', 'amenities', 'image_url', 'rooms'
+            'price', 'stars', 'amenities', 'image_url', 'image_srcset', 'rating', 'rating_count', 'rooms'
         ]
 
     def get_image_url(self, obj):
@@ -41,23 +66,30 @@ class HotelDetailSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.featured_image.url)
         return None
 
+    def get_image_srcset(self, obj):
+        return image_srcset(obj.image_derivatives, obj.featured_image.name, self.context.get('request'))
+
     def get_rooms(self, obj):
-        # Use RoomSerializer defined below
-        rooms_qs = obj.rooms.filter(is_available=True)
-        return RoomSerializer(rooms_qs, many=True, context=self.context).data
+        # Use RoomSerializer defined below; views prefetch these as `available_rooms`
+        rooms = getattr(obj, 'available_rooms', None)
+        if rooms is None:
+            rooms = obj.rooms.filter(is_available=True).select_related('hotel')
+        return RoomSerializer(rooms, many=True, context=self.context).data
 
 # Serializer for Room
-class RoomSerializer(serializers.ModelSerializer):
+class RoomSerializer(RatingMixin, serializers.ModelSerializer):
     uid = serializers.UUIDField(read_only=True)
     hotel = serializers.UUIDField(source='hotel.uid', read_only=True)
     image_url = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+    rating = serializers.SerializerMethodField()
 
     class Meta:
         model = Room
         fields = [
             'uid', 'hotel', 'name', 'description',
             'bed_count', 'bathroom_count', 'bed_type',
-            'price', 'capacity', 'is_available', 'image_url'
+            'price', 'capacity', 'is_available', 'image_url', 'image_srcset', 'rating', 'rating_count'
         ]
 
     def get_image_url(self, obj):
@@ -66,6 +98,9 @@ class RoomSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.image.url)
         return None
 
+    def get_image_srcset(self, obj):
+        return image_srcset(obj.image_derivatives, obj.image.name, self.context.get('request'))
+
 # Serializer for Booking
 class BookingSerializer(serializers.ModelSerializer):
     uid = serializers.UUIDField(read_only=True)
@@ -79,7 +114,7 @@ class BookingSerializer(serializers.ModelSerializer):
         slug_field='uid'
     )
     room = serializers.SlugRelatedField(
-        queryset=Room.objects.all(),
+        queryset=Room.objects.select_related('hotel'),  # room_details needs hotel.uid
         slug_field='uid'
     )
 
@@ -87,9 +122,10 @@ class BookingSerializer(serializers.ModelSerializer):
         model = Booking
         fields = [
             'uid', 'user', 'hotel', 'room', 'room_details',
-            'check_in', 'check_out', 'status', 'total_price', 'created_at'
+            'check_in', 'check_out', 'status', 'total_price', 'created_at', 'hold_expires_at'
         ]
-        read_only_fields = ['uid', 'status', 'user', 'created_at']
+        # total_price is quoted by bookings/pricing.py; a client-sent value is ignored.
+        read_only_fields = ['uid', 'status', 'user', 'total_price', 'created_at', 'hold_expires_at']
 
     
 
@@ -110,21 +146,22 @@ class BookingSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError({'check_in': 'Check-in cannot be in the past.'})
 
         if room:
-            overlapping = Booking.objects.filter(
-                room=room,
-                check_in__lt=check_out,   # Existing booking starts before this booking ends
-                check_out__gt=check_in,   # Existing booking ends after this booking starts
-                status__in=[Booking.PENDING, Booking.COMPLETED]
-            )
+            # Point lookups on the (room, date) index; the unique constraint
+            # still catches a booking that races in before save().
+            overlapping = taken_nights(check_in, check_out).filter(room=room)
 
             if self.instance:
-                overlapping = overlapping.exclude(pk=self.instance.pk)
+                overlapping = overlapping.exclude(booking=self.instance)
 
             if overlapping.exists():
                 raise serializers.ValidationError("This room is already booked for the selected dates.")
 
             if not room.is_available:
                 raise serializers.ValidationError({'room': 'This room is not currently available.'})
+
+        if room and check_in and check_out:
+            validate_stay_length(check_in, check_out)
+            data['total_price'] = quote_room(room, check_in, check_out).total
         else:
             raise serializers.ValidationError({'room': 'Room must be specified.'})
 
@@ -138,6 +175,205 @@ class BookingSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
+# Serializer for Review; the view puts the reviewed room in the context
+class ReviewSerializer(serializers.ModelSerializer):
+    uid = serializers.UUIDField(read_only=True)
+    room = serializers.UUIDField(source='room.uid', read_only=True)
+    user = serializers.CharField(source='user.username', read_only=True)
+
+    class Meta:
+        model = Review
+        fields = ['uid', 'room', 'user', 'rating', 'comment', 'created_at']
+
+    def validate(self, data):
+        if Review.objects.filter(room=self.context['room'], user=self.context['request'].user).exists():
+            raise serializers.ValidationError('You have already reviewed this room.')
+        return data
+
+    def create(self, validated_data):
+        validated_data['user'] = self.context['request'].user
+        validated_data['room'] = self.context['room']
+        return super().create(validated_data)
+
+# Fast-path read serializers for list endpoints
+class FastListSerializer(ABC):
+    """
+    Read-only `many=True` serializer over `.values()` rows.
+
+    Produces exactly the JSON of its ModelSerializer counterpart without the
+    per-row field machinery: rows are plain dicts, and absolute media URLs are
+    built from a prefix resolved once per request instead of calling
+    request.build_absolute_uri() for every row.
+    """
+    values_fields = ()
+
+    def __init__(self, instance, many=True, context=None):
+        self.instance = instance
+        self.context = context or {}
+        self.media_url = self.media_url_builder(self.context.get('request'))
+
+    @classmethod
+    def values(cls, queryset):
+        # `id` and any annotations are always fetched so keyset pagination can
+        # read the row position from the dict.
+        return queryset.values('id', *cls.values_fields, *queryset.query.annotation_select)
+
+    @staticmethod
+    def media_url_builder(request):
+        if isinstance(default_storage, FileSystemStorage):
+            prefix = request.build_absolute_uri(default_storage.base_url)
+            return lambda name: prefix + filepath_to_uri(name).lstrip('/')
+        return lambda name: request.build_absolute_uri(default_storage.url(name))
+
+    @abstractmethod
+    def to_representation(self, row):
+        """The JSON-ready dict for one `.values()` row."""
+
+    @property
+    def data(self):
+        to_representation = self.to_representation
+        return [to_representation(row) for row in self.instance]
+
+
+class HotelListFastSerializer(FastListSerializer):
+    """Same output as HotelListSerializer."""
+    values_fields = ('uid', 'name', 'location', 'stars', 'amenities', 'image_url', 'featured_image',
+                     'image_derivatives', 'min_price', 'room_count', 'max_capacity', 'rating_sum', 'rating_count')
+    price_field = serializers.DecimalField(max_digits=8, decimal_places=2)
+
+    def to_representation(self, row):
+        image_url = row['image_url']
+        if not image_url and row['featured_image']:
+            image_url = self.media_url(row['featured_image'])
+        return {
+            'uid': str(row['uid']),
+            'name': row['name'],
+            'location': row['location'],
+            'stars': row['stars'],
+            'amenities': row['amenities'],
+            'image_url': image_url or None,
+            'image_srcset': srcset(row['image_derivatives'], row['featured_image'], self.media_url),
+            'min_price': self.price_field.to_representation(row['min_price']) if row['min_price'] is not None else None,
+            'room_count': row['room_count'],
+            'max_capacity': row['max_capacity'],
+            'rating': average_rating(row['rating_sum'], row['rating_count']),
+            'rating_count': row['rating_count'],
+        }
+
+
+class RoomFastSerializer(FastListSerializer):
+    """Same output as RoomSerializer."""
+    values_fields = (
+        'uid', 'hotel__uid', 'name', 'description', 'bed_count', 'bathroom_count',
+        'bed_type', 'price', 'capacity', 'is_available', 'image', 'image_derivatives',
+        'rating_sum', 'rating_count',
+    )
+    price_field = serializers.DecimalField(max_digits=8, decimal_places=2)
+
+    def to_representation(self, row):
+        return {
+            'uid': str(row['uid']),
+            'hotel': str(row['hotel__uid']),
+            'name': row['name'],
+            'description': row['description'],
+            'bed_count': row['bed_count'],
+            'bathroom_count': row['bathroom_count'],
+            'bed_type': row['bed_type'],
+            'price': self.price_field.to_representation(row['price']),
+            'capacity': row['capacity'],
+            'is_available': row['is_available'],
+            'image_url': self.media_url(row['image']) if row['image'] else None,
+            'image_srcset': srcset(row['image_derivatives'], row['image'], self.media_url),
+            'rating': average_rating(row['rating_sum'], row['rating_count']),
+            'rating_count': row['rating_count'],
+        }
+
+# Query parameters for the hotel search
+class HotelSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+
+# Query parameters for the bulk availability search
+class AvailabilityQuerySerializer(serializers.Serializer):
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    location = serializers.CharField(required=False, allow_blank=True)
+    capacity = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, data):
+        if data['check_in'] >= data['check_out']:
+            raise serializers.ValidationError({'check_out': 'Check-out must be after check-in.'})
+        return data
+
+# Quotes (bookings/pricing.py)
+def validate_stay_length(check_in, check_out):
+    max_nights = pricing_options()['MAX_NIGHTS']
+    if (check_out - check_in).days > max_nights:
+        raise serializers.ValidationError({'check_out': f'Stays are limited to {max_nights} nights.'})
+
+
+class QuoteItemSerializer(serializers.Serializer):
+    room = serializers.UUIDField()
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+
+    def validate(self, data):
+        if data['check_in'] >= data['check_out']:
+            raise serializers.ValidationError({'check_out': 'Check-out must be after check-in.'})
+        if data['check_in'] < now().date():
+            raise serializers.ValidationError({'check_in': 'Check-in cannot be in the past.'})
+        validate_stay_length(data['check_in'], data['check_out'])
+        return data
+
+
+class QuoteQuerySerializer(QuoteItemSerializer):
+    """GET /api/quotes/: one room, or every room of a hotel."""
+    room = serializers.UUIDField(required=False)
+    hotel = serializers.UUIDField(required=False)
+
+    def validate(self, data):
+        if ('room' in data) == ('hotel' in data):
+            raise serializers.ValidationError('Pass exactly one of room or hotel.')
+        return super().validate(data)
+
+
+class QuoteBatchSerializer(serializers.Serializer):
+    """POST /api/quotes/"""
+    items = QuoteItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        max_batch = pricing_options()['MAX_BATCH']
+        if len(items) > max_batch:
+            raise serializers.ValidationError(f'At most {max_batch} items per request.')
+        return items
+
+
+class QuoteSerializer(serializers.Serializer):
+    """Output of a pricing.Quote, with the room's uid."""
+    room = serializers.UUIDField()
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    nights = serializers.IntegerField()
+    nightly_rates = serializers.ListField(child=serializers.DecimalField(max_digits=10, decimal_places=2),
+                                          required=False)
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+    adjustment = serializers.DecimalField(max_digits=12, decimal_places=2)
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+    @staticmethod
+    def row(quote, room_uid):
+        row = {
+            'room': room_uid,
+            'check_in': quote.check_in,
+            'check_out': quote.check_out,
+            'nights': (quote.check_out - quote.check_in).days,
+            'subtotal': quote.subtotal,
+            'adjustment': quote.adjustment,
+            'total': quote.total,
+        }
+        if quote.nightly is not None:
+            row['nightly_rates'] = quote.nightly
+        return row
+
 # Serializer for User registration
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, style={'input_type': 'password'})
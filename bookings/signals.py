@@ -0,0 +1,145 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import CATALOG_SCOPE, catalog_cache, hotel_scope
+from .images import ImageDerivativeError, generate_derivatives, image_options
+from .aggregates import add_rating, refresh_room_stats
+from .authentication import user_rows
+from .models import ClaimsUser, Hotel, RateRule, Review, Room, User
+from .pricing import invalidate_prices
+from .search import get_search_index
+
+
+def invalidate_catalog(*scopes):
+    # Bump now so this process stops serving the old payload, and again on
+    # commit so a read that raced the transaction cannot pin stale data.
+    catalog_cache.bump(*scopes)
+    transaction.on_commit(lambda: catalog_cache.bump(*scopes))
+
+
+@receiver([post_save, post_delete], sender=Hotel)
+def hotel_changed(sender, instance, **kwargs):
+    invalidate_catalog(CATALOG_SCOPE, hotel_scope(instance.uid))
+
+
+@receiver([post_save, post_delete], sender=Room)
+def room_changed(sender, instance, **kwargs):
+    hotel_uid = Hotel.objects.filter(pk=instance.hotel_id).values_list('uid', flat=True).first()
+    scopes = [CATALOG_SCOPE]
+    if hotel_uid:
+        scopes.append(hotel_scope(hotel_uid))
+    invalidate_catalog(*scopes)
+
+
+@receiver([post_save, post_delete], sender=Room)
+def room_stats_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Both hotels when the room moved to another one.
+    refresh_room_stats({instance.hotel_id, getattr(instance, '_loaded_hotel_id', None)} - {None})
+    instance._loaded_hotel_id = instance.hotel_id
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    counted, current = getattr(instance, '_counted', None), (instance.room_id, instance.rating)
+    if counted == current:
+        return
+    if counted:
+        add_rating(*counted, sign=-1)   # edited rating or moved review
+    add_rating(*current)
+    instance._counted = current
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    add_rating(*getattr(instance, '_counted', (instance.room_id, instance.rating)), sign=-1)
+
+
+@receiver([post_save, post_delete], sender=Room)
+@receiver([post_save, post_delete], sender=RateRule)
+def prices_changed(sender, instance, **kwargs):
+    # Compiled rate calendars are per process; the version bump reaches all of them.
+    invalidate_prices()
+    transaction.on_commit(invalidate_prices)
+
+
+@receiver(post_delete, sender=Room)
+def room_deleted(sender, instance, **kwargs):
+    # A vanished room leaves no updated_at behind; touch its hotel so the
+    # hotel detail's Last-Modified still moves forward.
+    Hotel.objects.filter(pk=instance.hotel_id).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=ClaimsUser)
+def user_changed(sender, instance, **kwargs):
+    # Only this process's cache; the others catch up within USER_CACHE_TTL.
+    user_rows.discard(instance.pk)
+
+
+# ───── Search index ──────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=Hotel)
+def index_hotel(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_index().update_hotel(instance.pk)
+
+
+@receiver(post_delete, sender=Hotel)
+def unindex_hotel(sender, instance, **kwargs):
+    get_search_index().remove_hotel(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Room)
+def reindex_room_hotel(sender, instance, raw=False, **kwargs):
+    # Room names and descriptions are part of their hotel's document.
+    if not raw:
+        get_search_index().update_hotel(instance.hotel_id)
+
+
+# ───── Image derivatives ─────────────────────────────────────────────────────
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FIELDS = {Hotel: 'featured_image', Room: 'image'}
+
+
+@receiver(post_save, sender=Hotel)
+@receiver(post_save, sender=Room)
+def build_image_derivatives(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Runs after the file field committed the upload to storage. Bulk
+    # inserts skip this; build_image_derivatives (the command) covers them.
+    field = IMAGE_FIELDS[sender]
+    if raw or not image_options()['GENERATE_ON_UPLOAD'] or (update_fields and field not in update_fields):
+        return
+    name = getattr(instance, field).name
+    if (instance.image_derivatives or {}).get('source') == (name or None):
+        return
+    # Resizing is slow: keep it out of the save's transaction, and never let
+    # it fail a save that has already been committed.
+    transaction.on_commit(lambda: store_derivatives(sender, instance, name))
+
+
+def store_derivatives(model, instance, name):
+    manifest = {}
+    if name:
+        try:
+            manifest = generate_derivatives(name)
+        except ImageDerivativeError as exc:
+            logger.warning("No derivatives for %s %s: %s", model.__name__, instance.pk, exc)
+    if manifest == instance.image_derivatives:
+        return
+    instance.image_derivatives = manifest
+    # Only if the image is still the one resized; a later upload has its own callback.
+    if model.objects.filter(pk=instance.pk, **{IMAGE_FIELDS[model]: name}).update(image_derivatives=manifest):
+        # After the save's own invalidation, so drop payloads cached in between.
+        hotel_uid = instance.uid if model is Hotel else Hotel.objects.filter(
+            pk=instance.hotel_id).values_list('uid', flat=True).first()
+        catalog_cache.bump(CATALOG_SCOPE, hotel_scope(hotel_uid))
@@ -1,3 +1,1488 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import unittest
+from unittest import mock
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.http import Http404, HttpResponse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from benchmarks.endpoints import CASES, compare, make_fixtures, run_suite, uncovered_routes
+from hotel_backend.instrumentation import RequestMetricsMiddleware, request_metrics
+from hotel_backend.media import serve_media
+from hotel_backend.query_inspector import QueryInspectorMiddleware, fingerprint, inspect_queries, write_report
+from payment.models import Payment
+
+from .cache import CATALOG_SCOPE, catalog_cache
+from .search import get_search_index
+from .amenities import amenity_mask
+from .auth import EmailTokenObtainPairSerializer
+from .authentication import ClaimsJWTAuthentication, user_rows
+from .availability import available_rooms, booked_ranges, taken_nights
+from .holds import expire_holds
+from .models import Hotel, Room, Booking, RateRule, Review, RoomNight, User
+from .pagination import KeysetCursorPagination
+from .pricing import calendars, quote_room
+from .serializers import (
+    HotelListSerializer, HotelListFastSerializer, ReviewSerializer, RoomSerializer, RoomFastSerializer,
+)
+from .views import HotelListAPI, HotelFilterAPI, RoomListByUUIDAPI
+
+
+def make_hotel(name="Blue Nile Retreat", location="Bahir Dar, Ethiopia", **extra):
+    defaults = {'price': 100, 'amenities': ['Free WiFi']}
+    defaults.update(extra)
+    return Hotel.objects.create(name=name, location=location, **defaults)
+
+
+def make_room(hotel, name="Room 1", **extra):
+    defaults = {'price': 80, 'capacity': 2}
+    defaults.update(extra)
+    return Room.objects.create(hotel=hotel, name=name, **defaults)
+
+
+def make_user(email="guest@example.com"):
+    return User.objects.create_user(email=email, username=email.split('@')[0], password='pass12345')
+
+
+class AvailabilityAPITests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user()
+        self.bahir_dar = make_hotel()
+        self.gondar = make_hotel("Gondar Castle Inn", "Gondar, Ethiopia")
+        self.free = make_room(self.bahir_dar, "Room 1")
+        self.booked = make_room(self.bahir_dar, "Room 2")
+        self.large = make_room(self.gondar, "Suite", capacity=4)
+        self.check_in = date.today() + timedelta(days=10)
+        self.check_out = self.check_in + timedelta(days=3)
+
+    def book(self, room, check_in, check_out, status=Booking.PENDING):
+        return Booking.objects.create(
+            hotel=room.hotel, room=room, user=self.user,
+            check_in=check_in, check_out=check_out, total_price=100, status=status,
+        )
+
+    def search(self, **params):
+        params.setdefault('check_in', self.check_in.isoformat())
+        params.setdefault('check_out', self.check_out.isoformat())
+        return self.client.get(reverse('availability'), params)
+
+    def room_uids(self, response):
+        return {room['uid'] for hotel in response.data['hotels'] for room in hotel['rooms']}
+
+    def test_overlapping_booking_hides_room(self):
+        self.book(self.booked, self.check_in + timedelta(days=1), self.check_out + timedelta(days=1))
+        response = self.search()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.room_uids(response), {str(self.free.uid), str(self.large.uid)})
+
+    def test_adjacent_and_cancelled_bookings_do_not_block(self):
+        self.book(self.booked, self.check_out, self.check_out + timedelta(days=2))
+        self.book(self.booked, self.check_in - timedelta(days=2), self.check_in)
+        self.book(self.free, self.check_in, self.check_out, status=Booking.CANCELLED)
+        response = self.search()
+        self.assertEqual(len(self.room_uids(response)), 3)
+
+    def test_results_grouped_by_hotel(self):
+        response = self.search()
+        hotels = {hotel['uid']: hotel for hotel in response.data['hotels']}
+        self.assertEqual(len(hotels[str(self.bahir_dar.uid)]['rooms']), 2)
+        self.assertEqual(len(hotels[str(self.gondar.uid)]['rooms']), 1)
+
+    def test_location_and_capacity_filters(self):
+        response = self.search(location='gondar')
+        self.assertEqual(self.room_uids(response), {str(self.large.uid)})
+        response = self.search(capacity=3)
+        self.assertEqual(self.room_uids(response), {str(self.large.uid)})
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            self.search()
+
+    def test_rooms_are_paginated(self):
+        self.assertEqual(self.search().data['next'], None)
+        params = {'check_in': self.check_in.isoformat(), 'check_out': self.check_out.isoformat(), 'page_size': 1}
+        pages = KeysetPaginationTests.walk(self, reverse('availability'), params)
+        self.assertEqual([[room['uid'] for hotel in page['hotels'] for room in hotel['rooms']] for page in pages],
+                         [[str(self.free.uid)], [str(self.booked.uid)], [str(self.large.uid)]])
+        self.assertEqual(pages[1]['hotels'][0]['uid'], str(self.bahir_dar.uid))
+        previous = self.client.get(pages[1]['previous'])
+        self.assertEqual(self.room_uids(previous), {str(self.free.uid)})
+
+    def test_invalid_range_rejected(self):
+        response = self.search(check_out=self.check_in.isoformat())
+        self.assertEqual(response.status_code, 400)
+
+
+class RoomNightOccupancyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user()
+        self.client.force_authenticate(self.user)
+        self.hotel = make_hotel()
+        self.room = make_room(self.hotel)
+        self.check_in = date.today() + timedelta(days=5)
+
+    def book(self, nights=2, offset=0, **extra):
+        check_in = self.check_in + timedelta(days=offset)
+        return Booking.objects.create(
+            hotel=self.hotel, room=self.room, user=self.user, total_price=100,
+            check_in=check_in, check_out=check_in + timedelta(days=nights), **extra
+        )
+
+    def held_dates(self):
+        return sorted(RoomNight.objects.filter(room=self.room).values_list('date', flat=True))
+
+    def test_booking_materializes_each_night(self):
+        self.book(nights=3)
+        self.assertEqual(self.held_dates(), [self.check_in + timedelta(days=i) for i in range(3)])
+
+    def test_database_rejects_double_booking(self):
+        self.book(nights=3)
+        with self.assertRaises(IntegrityError):
+            self.book(nights=2, offset=2)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_cancel_releases_and_rebook_reclaims(self):
+        booking = self.book()
+        booking.status = Booking.CANCELLED
+        booking.save()
+        self.assertEqual(self.held_dates(), [])
+        self.book()
+        booking.status = Booking.PENDING
+        with self.assertRaises(IntegrityError):
+            booking.save()
+
+    def test_date_change_moves_nights(self):
+        booking = self.book(nights=2)
+        booking.check_in += timedelta(days=1)
+        booking.check_out += timedelta(days=2)
+        booking.save()
+        self.assertEqual(self.held_dates(), booking.stay_dates())
+
+    def post_booking(self, check_in, check_out):
+        return self.client.post(reverse('create-booking'), {
+            'hotel': str(self.hotel.uid), 'room': str(self.room.uid),
+            'check_in': check_in.isoformat(), 'check_out': check_out.isoformat(),
+            'total_price': '160.00',
+        })
+
+    def test_create_booking_api(self):
+        response = self.post_booking(self.check_in, self.check_in + timedelta(days=2))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(self.held_dates()), 2)
+
+        response = self.post_booking(self.check_in + timedelta(days=1), self.check_in + timedelta(days=4))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(self.held_dates()), 2)
+
+
+# Row counts the planner is told to expect (see simulate_table_stats).
+PRODUCTION_ROWS = {
+    'bookings_booking': 1_000_000,
+    'bookings_roomnight': 3_000_000,
+    'bookings_room': 50_000,
+    'bookings_hotel': 5_000,
+}
+LOW_CARDINALITY_COLUMNS = {'is_active', 'is_available', 'status', 'has_pool', 'has_gym'}
+
+
+def simulate_table_stats(rows_by_table):
+    """
+    Overwrite sqlite_stat1 so the query planner costs plans as if each table
+    held the given number of rows, without having to insert them.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+        for table, rows in rows_by_table.items():
+            cursor.execute('DELETE FROM sqlite_stat1 WHERE tbl = %s', [table])
+            cursor.execute('INSERT INTO sqlite_stat1 VALUES (%s, NULL, %s)', [table, str(rows)])
+            constraints = connection.introspection.get_constraints(cursor, table)
+            for name, info in constraints.items():
+                if not info['index'] or name.startswith('__'):
+                    continue
+                stat, matching = [rows], rows
+                for column in info['columns']:
+                    matching = max(1, matching // (2 if column in LOW_CARDINALITY_COLUMNS else 100))
+                    stat.append(matching)
+                if info['unique']:
+                    stat[-1] = 1
+                cursor.execute(
+                    'INSERT INTO sqlite_stat1 VALUES (%s, %s, %s)',
+                    [table, name, ' '.join(map(str, stat))],
+                )
+        cursor.execute('ANALYZE sqlite_schema')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite-specific')
+class QueryPlanTests(TestCase):
+    """
+    Guards the hot read paths against regressing to full table scans once
+    the tables reach production size.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hotel = make_hotel()
+        cls.room = make_room(cls.hotel)
+        simulate_table_stats(PRODUCTION_ROWS)
+
+    def assertNoFullScan(self, queryset, tables=PRODUCTION_ROWS):
+        plan = queryset.explain()
+        for table in tables:
+            scans = re.findall(rf'SCAN {table}\b(?! USING)', plan)
+            self.assertFalse(scans, f"full scan of {table}:\n{plan}")
+
+    def view_queryset(self, view_class, params=None, **kwargs):
+        request = APIRequestFactory().get('/', params or {})
+        view = view_class()
+        view.setup(request, **kwargs)
+        view.request = view.initialize_request(request)
+        view.format_kwarg = None
+        return view.filter_queryset(view.get_queryset())
+
+    def test_hotel_list_by_location(self):
+        queryset = self.view_queryset(HotelListAPI, {'location': 'Gondar, Ethiopia'})
+        self.assertNoFullScan(queryset)
+
+    def test_hotel_filter_by_price(self):
+        queryset = self.view_queryset(HotelFilterAPI, {'price__gte': 50, 'price__lte': 150, 'has_pool': True})
+        self.assertNoFullScan(queryset)
+
+    def test_hotel_detail_rooms(self):
+        self.assertNoFullScan(self.hotel.rooms.filter(is_available=True))
+
+    def test_room_list_by_hotel_uid(self):
+        queryset = self.view_queryset(RoomListByUUIDAPI, hotel_uid=self.hotel.uid)
+        self.assertNoFullScan(queryset)
+
+    def test_hold_expiry_sweep(self):
+        queryset = Booking.objects.filter(status=Booking.PENDING, hold_expires_at__lte=timezone.now())
+        self.assertNoFullScan(queryset.order_by('hold_expires_at').values_list('id', flat=True)[:500])
+        self.assertIn('booking_status_hold_idx', queryset.order_by('hold_expires_at').explain())
+
+    def test_booked_ranges(self):
+        self.assertNoFullScan(booked_ranges(self.room.id))
+
+    def test_booking_overlap_check(self):
+        check_in = date.today()
+        self.assertNoFullScan(taken_nights(check_in, check_in + timedelta(days=3)).filter(room=self.room))
+
+    def test_availability_probes_index(self):
+        check_in = date.today()
+        rooms = available_rooms(check_in, check_in + timedelta(days=3), location='Gondar')
+        # Candidate rooms are legitimately enumerated; the night lookup must not be.
+        self.assertNoFullScan(rooms, tables=['bookings_roomnight', 'bookings_booking'])
+
+
+class QueryBudgetMixin:
+    """
+    assertConstantQueries() fails when an endpoint's query count grows with
+    the size of its result, i.e. when something issues a query per row.
+    """
+
+    def count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(captured)
+
+    def assertConstantQueries(self, url, grow, budget, params=None):
+        before = self.count_queries(url, params)
+        grow()
+        after = self.count_queries(url, params)
+        self.assertEqual(before, after, f"{url} issues queries per row ({before} -> {after})")
+        self.assertLessEqual(after, budget, f"{url} exceeds its query budget")
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.hotel = make_hotel()
+        self.room = make_room(self.hotel)
+
+    def add_hotels(self, count=3):
+        for i in range(count):
+            hotel = make_hotel(f"Extra Hotel {i}")
+            make_room(hotel)
+            make_room(hotel, "Room 2")
+
+    def add_rooms(self, count=3):
+        for i in range(count):
+            make_room(self.hotel, f"Extra Room {i}")
+
+    def test_hotel_list(self):
+        self.assertConstantQueries(reverse('hotel-list'), self.add_hotels, budget=2)
+
+    def test_hotel_filter(self):
+        self.assertConstantQueries(reverse('hotel-filter'), self.add_hotels, budget=3, params={'price__gte': 10})
+
+    def test_hotel_detail(self):
+        url = reverse('hotel-detail-uuid', kwargs={'uid': self.hotel.uid})
+        self.assertConstantQueries(url, self.add_rooms, budget=3)
+
+    def test_room_list_by_hotel(self):
+        url = reverse('room-list', kwargs={'hotel_uid': self.hotel.uid})
+        self.assertConstantQueries(url, self.add_rooms, budget=2)
+
+    def test_room_detail(self):
+        url = reverse('room-detail', kwargs={'hotel_uid': self.hotel.uid, 'room_uid': self.room.uid})
+        self.assertConstantQueries(url, self.add_rooms, budget=2)
+
+    def test_stay_list(self):
+        self.assertConstantQueries(reverse('stay-list'), self.add_hotels, budget=2)
+
+    def test_stay_detail(self):
+        url = reverse('stay-detail', kwargs={'uid': self.room.uid})
+        self.assertConstantQueries(url, self.add_rooms, budget=2)
+
+    def test_availability(self):
+        check_in = date.today() + timedelta(days=3)
+        params = {'check_in': check_in.isoformat(), 'check_out': (check_in + timedelta(days=2)).isoformat()}
+        self.assertConstantQueries(reverse('availability'), self.add_hotels, budget=1, params=params)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        hotel = make_hotel()
+        # Repeated prices exercise the id tie-breaker.
+        self.rooms = [make_room(hotel, f"Room {i}", price=50 + (i % 3) * 10) for i in range(7)]
+
+    def walk(self, url, params=None):
+        pages, response = [], self.client.get(url, params or {})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            if not response.data['next']:
+                return pages
+            response = self.client.get(response.data['next'])
+
+    def test_walks_every_row_once_in_id_order(self):
+        pages = self.walk(reverse('stay-list'), {'page_size': 3})
+        self.assertEqual([len(page['results']) for page in pages], [3, 3, 1])
+        uids = [room['uid'] for page in pages for room in page['results']]
+        self.assertEqual(uids, [str(room.uid) for room in self.rooms])
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get(reverse('stay-list'), {'page_size': 3}).data
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNone(back['previous'])
+
+    def test_cursor_is_opaque(self):
+        next_link = self.client.get(reverse('stay-list'), {'page_size': 3}).data['next']
+        self.assertNotIn('id', next_link.split('cursor=')[1])
+
+    def test_composite_ordering_with_ties(self):
+        paginator = KeysetCursorPagination()
+        paginator.ordering = ('-price',)
+        queryset = Room.objects.all()
+        expected = list(queryset.order_by('-price', 'id'))
+        seen, request = [], APIRequestFactory().get('/', {'page_size': 2})
+        while True:
+            page = paginator.paginate_queryset(queryset, Request(request))
+            seen.extend(page)
+            link = paginator.get_next_link()
+            if not link:
+                break
+            request = APIRequestFactory().get(link)
+        self.assertEqual(seen, expected)
+
+
+class CatalogCacheTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.hotel = make_hotel()
+        self.room = make_room(self.hotel)
+        catalog_cache.backend.clear()
+
+    def test_repeat_read_is_served_from_cache(self):
+        url = reverse('stay-list')
+        self.assertEqual(self.count_queries(url), 2)
+        before = catalog_cache.stats()
+        # Only the conditional-GET validator aggregate is left.
+        self.assertEqual(self.count_queries(url), 1)
+        after = catalog_cache.stats()
+        self.assertEqual(after['hits'], before['hits'] + 1)
+
+    def test_room_change_invalidates_catalog_and_hotel_scopes(self):
+        stays = reverse('stay-list')
+        detail = reverse('hotel-detail-uuid', kwargs={'uid': self.hotel.uid})
+        self.client.get(stays)
+        self.client.get(detail)
+
+        self.room.price = 95
+        self.room.save()
+
+        self.assertEqual(self.client.get(stays).data['results'][0]['price'], '95.00')
+        self.assertEqual(self.client.get(detail).data['rooms'][0]['price'], '95.00')
+
+    def test_other_hotels_stay_cached(self):
+        other = make_hotel("Gondar Castle Inn")
+        url = reverse('hotel-detail-uuid', kwargs={'uid': other.uid})
+        self.client.get(url)
+        self.room.save()
+        self.assertEqual(self.count_queries(url), 1)
+
+    def test_hotel_delete_invalidates(self):
+        url = reverse('hotel-list')
+        self.assertEqual(len(self.client.get(url).data['results']), 1)
+        self.hotel.delete()
+        self.assertEqual(self.client.get(url).data['results'], [])
+
+    def test_stats_endpoint_is_staff_only(self):
+        url = reverse('catalog-cache-stats')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        staff = make_user("staff@example.com")
+        staff.is_staff = True
+        staff.save()
+        self.client.force_authenticate(staff)
+        self.assertEqual(set(self.client.get(url).data), {'hits', 'misses', 'hit_ratio'})
+
+
+class ConditionalGetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.hotel = make_hotel()
+        self.room = make_room(self.hotel)
+        self.detail = reverse('hotel-detail-uuid', kwargs={'uid': self.hotel.uid})
+
+    def test_validators_emitted(self):
+        response = self.client.get(self.detail)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+
+    def test_matching_etag_short_circuits_before_serializing(self):
+        etag = self.client.get(self.detail)['ETag']
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(captured), 1)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.detail)['Last-Modified']
+        response = self.client.get(self.detail, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_room_edit_changes_hotel_etag(self):
+        etag = self.client.get(self.detail)['ETag']
+        self.room.capacity = 3
+        self.room.save()
+        response = self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_etag_tracks_deletions_and_pages(self):
+        url = reverse('stay-list')
+        other = make_room(self.hotel, "Room 2")
+        first = self.client.get(url, {'page_size': 1})
+        second = self.client.get(first.data['next'])
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        other.delete()
+        response = self.client.get(url, {'page_size': 1}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_object_is_404(self):
+        url = reverse('stay-detail', kwargs={'uid': self.hotel.uid})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='*').status_code, 404)
+
+
+@override_settings(IMAGE_DERIVATIVES={'GENERATE_ON_UPLOAD': False})
+class FastSerializerParityTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        linked = make_hotel("Axum Heritage Lodge", image_url="https://cdn.example.com/axum.avif")
+        uploaded = make_hotel("Café Harar", amenities=["Spa", "Bar"], stars=5)
+        uploaded.featured_image.name = "hotel_images/café harar.jpg"
+        uploaded.image_derivatives = {'source': uploaded.featured_image.name, 'variants': {
+            'webp': {'640': 'derivatives/ab/ab12-640w.webp', '320': 'derivatives/ab/ab12-320w.webp'},
+        }}
+        uploaded.save()
+        bare = make_hotel("Jinka Valley Lodge", amenities=[])
+        for hotel in (linked, uploaded, bare):
+            make_room(hotel, "Room 1", price="79.90")
+            room = make_room(hotel, "Suite ü", price=120, bed_type='KING', is_available=False)
+            room.image.name = "room_images/suite 1.jpg"
+            room.save()
+        self.request = Request(APIRequestFactory().get('/', SERVER_NAME='hotels.example.com'))
+
+    def assertParity(self, slow_class, fast_class, queryset):
+        context = {'request': self.request}
+        slow = slow_class(queryset, many=True, context=context).data
+        fast = fast_class(fast_class.values(queryset), context=context).data
+        self.assertEqual(json.loads(JSONRenderer().render(fast)), json.loads(JSONRenderer().render(slow)))
+
+    def test_hotel_list_parity(self):
+        self.assertParity(HotelListSerializer, HotelListFastSerializer, Hotel.objects.order_by('id'))
+
+    def test_room_parity(self):
+        self.assertParity(RoomSerializer, RoomFastSerializer, Room.objects.select_related('hotel').order_by('id'))
+
+    def test_endpoint_bodies_identical(self):
+        hotel = Hotel.objects.first()
+        urls = [
+            (reverse('hotel-list'), {}),
+            (reverse('hotel-filter'), {'price__gte': 10}),
+            (reverse('stay-list'), {'page_size': 2}),
+            (reverse('room-list', kwargs={'hotel_uid': hotel.uid}), {}),
+        ]
+        for url, params in urls:
+            bodies = []
+            for enabled in (False, True):
+                catalog_cache.backend.clear()
+                with override_settings(FAST_LIST_SERIALIZERS=enabled):
+                    bodies.append(self.client.get(url, params).content)
+            self.assertEqual(bodies[0], bodies[1], url)
+
+
+class HotelSearchTests(TestCase):
+    backend = 'auto'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.gondar = make_hotel("Gondar Castle Inn", "Gondar, Ethiopia", description="Views of Fasil Ghebbi.")
+        self.lakeside = make_hotel(
+            "Bahir Dar Lakeside", description="Boat trips to Gondar monasteries.", amenities=["Spa", "Bar"],
+        )
+        self.coffee = make_hotel("Jimma Coffee House", "Jimma, Ethiopia")
+        make_room(self.coffee, "Honeymoon Suite", description="Private balcony over the café gardens.")
+
+    def search(self, q, **params):
+        with override_settings(HOTEL_SEARCH_BACKEND=self.backend):
+            response = self.client.get(reverse('hotel-search'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [hotel['name'] for hotel in response.data['results']]
+
+    def test_name_match_outranks_description_match(self):
+        self.assertEqual(self.search("gondar"), ["Gondar Castle Inn", "Bahir Dar Lakeside"])
+
+    def test_prefix_and_multi_term(self):
+        self.assertEqual(self.search("gon cast"), ["Gondar Castle Inn"])
+
+    def test_typo_tolerance(self):
+        self.assertEqual(self.search("gondr castel"), ["Gondar Castle Inn"])
+
+    def test_amenities_and_room_descriptions_indexed(self):
+        self.assertEqual(self.search("spa"), ["Bahir Dar Lakeside"])
+        self.assertEqual(self.search("balcony cafe"), ["Jimma Coffee House"])
+
+    def test_index_follows_writes(self):
+        self.gondar.name = "Fasil Palace Hotel"
+        self.gondar.save()
+        self.assertEqual(self.search("palace"), ["Fasil Palace Hotel"])
+        self.coffee.rooms.all().delete()
+        self.assertEqual(self.search("balcony"), [])
+        self.lakeside.delete()
+        self.assertEqual(self.search("spa"), [])
+
+    def test_inactive_hotels_hidden(self):
+        self.gondar.is_active = False
+        self.gondar.save()
+        self.assertEqual(self.search("gondar"), ["Bahir Dar Lakeside"])
+
+    def test_paginates_by_rank(self):
+        first = self.client.get(reverse('hotel-search'), {'q': 'gondar', 'page_size': 1}).data
+        second = self.client.get(first['next']).data
+        self.assertEqual([h['name'] for h in first['results'] + second['results']],
+                         ["Gondar Castle Inn", "Bahir Dar Lakeside"])
+
+    def test_filter_endpoint_search_uses_index(self):
+        response = self.client.get(reverse('hotel-filter'), {'search': 'castle'})
+        self.assertEqual([hotel['name'] for hotel in response.data['results']], ["Gondar Castle Inn"])
+
+    def test_filter_endpoint_search_is_not_truncated(self):
+        spa = ['Spa']
+        Hotel.objects.bulk_create([   # past search()'s default limit of 200
+            Hotel(name=f"Tana Lodge {i}", location="Bahir Dar, Ethiopia", price=100,
+                  amenities=spa if i % 2 else [], amenity_mask=amenity_mask(spa) if i % 2 else 0)
+            for i in range(205)
+        ])
+        with override_settings(HOTEL_SEARCH_BACKEND=self.backend):
+            catalog_cache.bump(CATALOG_SCOPE)
+            get_search_index().rebuild()
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(reverse('hotel-filter'), {'search': 'tana', 'page_size': 100})
+            pages = KeysetPaginationTests.walk(self, reverse('hotel-filter'), {'search': 'tana', 'page_size': 100})
+        self.assertEqual(sum(len(page['results']) for page in pages), 205)
+        self.assertEqual(response.data['facets']['amenities']['Spa'], 102)
+        # Validators, page and facets share one index lookup.
+        self.assertLessEqual(len([q for q in captured.captured_queries if ' MATCH ' in q['sql']]), 1)
+
+    def test_query_required(self):
+        self.assertEqual(self.client.get(reverse('hotel-search')).status_code, 400)
+
+
+class PythonHotelSearchTests(HotelSearchTests):
+    backend = 'python'
+
+
+class AmenityFacetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        make_hotel("Awash Falls Resort", amenities=["Spa", "Bar", "Pool"])
+        make_hotel("Adama Oasis", amenities=["spa", "Airport Shuttle"])
+        make_hotel("Dire Dawa Central", amenities=["Bar", "Parking"])
+
+    def names(self, response):
+        return sorted(hotel['name'] for hotel in response.data['results'])
+
+    def test_mask_follows_amenities(self):
+        hotel = Hotel.objects.get(name="Dire Dawa Central")
+        self.assertEqual(hotel.amenity_mask, amenity_mask(["Bar", "Parking"]))
+        hotel.amenities = ["Gym"]
+        hotel.save(update_fields=['amenities'])
+        hotel.refresh_from_db()
+        self.assertEqual(hotel.amenity_mask, amenity_mask(["Gym"]))
+
+    def test_filter_requires_every_amenity(self):
+        response = self.client.get(reverse('hotel-filter'), {'amenities': 'Spa,Bar'})
+        self.assertEqual(self.names(response), ["Awash Falls Resort"])
+        response = self.client.get(reverse('hotel-list'), {'amenities': 'spa'})
+        self.assertEqual(self.names(response), ["Adama Oasis", "Awash Falls Resort"])
+
+    def test_unknown_amenity_rejected(self):
+        response = self.client.get(reverse('hotel-filter'), {'amenities': 'Helipad'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_facets_count_filtered_results(self):
+        facets = self.client.get(reverse('hotel-filter')).data['facets']['amenities']
+        self.assertEqual((facets['Spa'], facets['Bar'], facets['Gym']), (2, 2, 0))
+        facets = self.client.get(reverse('hotel-filter'), {'amenities': 'Bar'}).data['facets']['amenities']
+        self.assertEqual((facets['Spa'], facets['Bar'], facets['Parking']), (1, 2, 1))
+
+
+class BookingHoldExpiryTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.hotel = make_hotel()
+        self.rooms = [make_room(self.hotel, name=f"Room {i}") for i in range(5)]
+        self.check_in = date.today() + timedelta(days=3)
+
+    def book(self, room, **extra):
+        return Booking.objects.create(
+            hotel=self.hotel, room=room, user=self.user, total_price=100,
+            check_in=self.check_in, check_out=self.check_in + timedelta(days=2), **extra
+        )
+
+    @override_settings(BOOKING_HOLD_TTL=600)
+    def test_new_pending_booking_gets_a_hold(self):
+        booking = self.book(self.rooms[0])
+        self.assertAlmostEqual((booking.hold_expires_at - booking.created_at).total_seconds(), 600, delta=5)
+        self.assertIsNone(self.book(self.rooms[1], status=Booking.COMPLETED).hold_expires_at)
+
+    def test_sweep_cancels_expired_holds_and_frees_nights(self):
+        past = timezone.now() - timedelta(minutes=1)
+        expired = [self.book(room, hold_expires_at=past) for room in self.rooms[:3]]
+        live = self.book(self.rooms[3])
+
+        metrics = expire_holds(batch_size=2)
+        self.assertEqual((metrics['cancelled'], metrics['nights_released'], metrics['batches']), (3, 6, 2))
+        self.assertEqual(
+            set(Booking.objects.filter(status=Booking.CANCELLED).values_list('id', flat=True)),
+            {booking.id for booking in expired},
+        )
+        self.assertEqual(set(RoomNight.objects.values_list('booking_id', flat=True)), {live.id})
+        # The released room can be booked again for the same nights.
+        self.book(self.rooms[0])
+        self.assertEqual(expire_holds()['cancelled'], 0)
+
+    def test_command_reports_metrics(self):
+        self.book(self.rooms[0], hold_expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command('expire_booking_holds', stdout=out)
+        self.assertRegex(out.getvalue(), r'cancelled=1 nights_released=2 batches=1 elapsed_ms=\d')
+
+
+def use_temporary_media_root(test):
+    media = tempfile.TemporaryDirectory()
+    test.addCleanup(media.cleanup)
+    override = override_settings(MEDIA_ROOT=media.name)
+    override.enable()
+    test.addCleanup(override.disable)
+    return media.name
+
+
+class SeedHotelsCommandTests(TestCase):
+    options = ['--hotels', '25', '--rooms-per-hotel', '4', '--users', '6', '--bookings', '300',
+               '--seed', '7', '--start-date', '2030-01-01', '--batch-size', '64']
+
+    def setUp(self):
+        self.media_root = use_temporary_media_root(self)
+
+    def seed(self, *extra):
+        call_command('seed_hotels', *self.options, *extra, stdout=StringIO())
+        return (
+            list(Hotel.objects.order_by('id').values_list('uid', 'name', 'price', 'amenities', 'featured_image')),
+            list(Room.objects.order_by('id').values_list('uid', 'hotel__uid', 'price', 'capacity')),
+            list(Booking.objects.order_by('id').values_list('uid', 'room__uid', 'user__email', 'check_in',
+                                                            'check_out', 'status', 'total_price')),
+        )
+
+    def test_counts_and_derived_columns(self):
+        media_before = sorted(os.listdir(os.path.join(settings.BASE_DIR, 'media', 'hotel_images')))
+        hotels, rooms, bookings = self.seed()
+        self.assertEqual((len(hotels), len(rooms), len(bookings)), (25, 100, 300))
+        self.assertEqual(User.objects.filter(email__endswith='@seed.example').count(), 6)
+        for hotel in Hotel.objects.all():
+            self.assertEqual(hotel.amenity_mask, amenity_mask(hotel.amenities))
+        # Bundled images are stored once per distinct content, under their hash.
+        self.assertRegex(Hotel.objects.get(name="Blue Nile Retreat").featured_image.name,
+                         r'^hotel_images/[0-9a-f]{64}\.jpg$')
+        stored = sorted(os.listdir(os.path.join(self.media_root, 'hotel_images')))
+        self.assertEqual(len(stored), len(set(Hotel.objects.values_list('featured_image', flat=True))))
+        self.seed()
+        self.assertEqual(sorted(os.listdir(os.path.join(self.media_root, 'hotel_images'))), stored)
+        self.assertEqual(sorted(os.listdir(os.path.join(settings.BASE_DIR, 'media', 'hotel_images'))), media_before)
+
+        active = Booking.objects.filter(status__in=Booking.ACTIVE_STATUSES)
+        self.assertEqual(RoomNight.objects.count(), sum(len(b.stay_dates()) for b in active))
+        self.assertEqual(set(get_search_index().search('Blue Nile')),
+                         set(Hotel.objects.filter(name__startswith="Blue Nile Retreat").values_list('id', flat=True)))
+
+    def test_same_seed_same_rows_whatever_the_workers(self):
+        first = self.seed()
+        self.assertEqual(self.seed('--workers', '2', '--batch-size', '17'), first)
+        self.assertNotEqual(self.seed('--seed', '8')[0], first[0])
+
+    def assertReseeds(self):
+        self.seed()
+        # Foreign keys are only checked at commit, which TestCase never reaches.
+        connection.check_constraints()
+
+    def test_reseed_wipes_reviews(self):
+        self.seed()
+        Review.objects.create(room=Room.objects.first(), user=make_user(), rating=4)
+        self.assertReseeds()
+        self.assertFalse(Review.objects.exists())
+
+    def test_reseed_keeps_payments_unlinked(self):
+        self.seed()
+        payment = Payment.objects.create(user=make_user(), booking=Booking.objects.first(), amount='10.00',
+                                         gateway='telebirr', transaction_id='txn-kept')
+        self.assertReseeds()
+        payment.refresh_from_db()
+        self.assertIsNone(payment.booking_id)
+
+    def test_reseed_wipes_rate_rules(self):
+        self.seed()
+        room = Room.objects.first()
+        RateRule.objects.create(hotel_id=room.hotel_id, room=room, kind=RateRule.WEEKDAY, weekdays=1, percent=10)
+        monday = date(2030, 1, 7)
+        quote_room(room, monday, monday + timedelta(days=1))
+        self.assertReseeds()
+        self.assertFalse(RateRule.objects.exists())
+        room = Room.objects.get(pk=room.pk)
+        self.assertEqual(quote_room(room, monday, monday + timedelta(days=1)).total, room.price)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+                   PAYMENT_GATEWAY={'ORDER_URL': 'http://127.0.0.1:9/api/order'})
+class EndpointBenchmarkTests(TestCase):
+    def setUp(self):
+        use_temporary_media_root(self)
+
+    def test_every_route_has_a_case(self):
+        self.assertEqual(uncovered_routes(), [])
+
+    def test_every_case_succeeds(self):
+        call_command('seed_hotels', '--hotels', '20', '--rooms-per-hotel', '2', '--users', '3',
+                     '--bookings', '20', '--seed', '1', stdout=StringIO())
+        results = run_suite(make_fixtures(payments=5), iterations=2, warmup=0, memory_iterations=1)
+        failing = {name: row['status'] for name, row in results.items() if max(row['status']) >= 400}
+        self.assertEqual(failing, {})
+        self.assertEqual(set(results), {case.name for case in CASES})
+
+    def test_compare_flags_regressions(self):
+        row = {'p50_ms': 10.0, 'p95_ms': 20.0, 'queries': 2, 'peak_kib': 100.0, 'status': [200]}
+        baseline = {'endpoints': {'hotel-list': row}}
+        noisy = {'endpoints': {'hotel-list': {**row, 'p50_ms': 12.0, 'peak_kib': 150.0}}}
+        self.assertEqual(compare(noisy, baseline), [])
+        slower = {'endpoints': {'hotel-list': {**row, 'p95_ms': 30.0, 'queries': 3}}}
+        self.assertEqual(compare(slower, baseline),
+                         ['hotel-list: p95_ms 20.0 -> 30.0', 'hotel-list: queries 2 -> 3'])
+        added = {'endpoints': {'hotel-list': row, 'hotel-reviews': row}}
+        self.assertEqual(compare(added, baseline),
+                         ['hotel-reviews: not in the baseline, re-record it with --update-baseline'])
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        request_metrics.reset()
+        self.hotel = make_hotel()
+        make_room(self.hotel)
+
+    @override_settings(REQUEST_METRICS={'SERVER_TIMING': True})
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('hotel-list'))
+        timing = dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'app', 'db', 'serialize', 'render'})
+        self.assertRegex(timing['db'], r'dur=[\d.]+;desc="\d+ queries"')
+
+    @override_settings(REQUEST_METRICS={})
+    def test_server_timing_is_off_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('hotel-list')))
+
+    async def test_async_requests_are_measured_without_a_thread_hop(self):
+        async def view(request):
+            return HttpResponse()
+        self.assertTrue(iscoroutinefunction(RequestMetricsMiddleware(view)))
+        await self.async_client.get(reverse('hotel-list'))
+        labels = (('view', 'hotel-list'), ('method', 'GET'))
+        self.assertEqual(request_metrics.snapshot('http_request_duration_seconds', labels + (('status', '2xx'),)).count, 1)
+        # The sync view's queries run in a sync_to_async thread and are still counted.
+        self.assertGreater(request_metrics.snapshot('http_request_queries', labels).sum, 0)
+
+    def test_histograms_per_view(self):
+        for _ in range(3):
+            self.client.get(reverse('stay-detail', kwargs={'uid': self.hotel.rooms.get().uid}))
+        labels = (('view', 'stay-detail'), ('method', 'GET'))
+        self.assertEqual(request_metrics.snapshot('http_request_duration_seconds', labels + (('status', '2xx'),)).count, 3)
+        # The first request misses the catalog cache, the other two are served from it.
+        self.assertEqual(request_metrics.snapshot('http_request_queries', labels).sum, 2 + 1 + 1)
+        self.assertEqual(request_metrics.snapshot('http_request_serialize_seconds', labels).count, 1)
+        self.assertGreater(request_metrics.snapshot('http_response_size_bytes', labels).sum, 0)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('hotel-list'))
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="hotel-list",method="GET",status="2xx",le="+Inf"} 1',
+                      body)
+        self.assertIn('http_request_queries_count{view="hotel-list",method="GET"} 1', body)
+        self.assertIn('catalog_cache_misses_total', body)
+
+    def test_metrics_endpoint_is_restricted(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(response.status_code, 403)
+        user = make_user()
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.9',
+                                   HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics_endpoint_accepts_jwt_staff(self):
+        user = make_user()
+        user.is_staff = True
+        user.save()
+        token = EmailTokenObtainPairSerializer.get_token(user).access_token
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.9', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(REQUEST_METRICS={'ENABLED': False})
+    def test_disabled_middleware_unloads(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RequestMetricsMiddleware(lambda request: None)
+        response = self.client.get(reverse('hotel-list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertIsNone(request_metrics.snapshot('http_request_queries', (('view', 'hotel-list'), ('method', 'GET'))))
+
+
+class QueryInspectorTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.report_path = os.path.join(self.tmp.name, 'queries.jsonl')
+        for i in range(3):
+            make_room(make_hotel(name=f"Hotel {i}"))
+
+    def test_fingerprint_ignores_literals_and_in_list_length(self):
+        one, _ = fingerprint('SELECT * FROM "bookings_room" WHERE "id" IN (%s) AND name = \'a\' LIMIT 21')
+        two, sql = fingerprint('SELECT *  FROM "bookings_room" WHERE "id" IN (%s, %s, %s) AND name = \'b\' LIMIT 5')
+        self.assertEqual(one, two)
+        self.assertEqual(sql, 'SELECT * FROM "bookings_room" WHERE "id" IN (...) AND name = ? LIMIT ?')
+
+    def test_detects_n_plus_one_with_callsite(self):
+        with inspect_queries(duplicate_threshold=3) as inspector:
+            for hotel in Hotel.objects.all():
+                list(hotel.rooms.all())
+        duplicates = inspector.duplicates()
+        self.assertEqual(len(duplicates), 1)
+        self.assertEqual(duplicates[0]['count'], 3)
+        self.assertIn('bookings_room', duplicates[0]['sql'])
+        [site] = duplicates[0]['callsites']
+        self.assertRegex(site, r'^bookings/tests\.py:\d+ in test_detects_n_plus_one_with_callsite$')
+
+        with inspect_queries(duplicate_threshold=3) as inspector:
+            for hotel in Hotel.objects.prefetch_related('rooms'):
+                list(hotel.rooms.all())
+        self.assertFalse(inspector.has_findings)
+
+    def test_middleware_writes_sampled_reports(self):
+        options = {'ENABLED': True, 'SLOW_MS': 0, 'REPORT_PATH': self.report_path}
+        with override_settings(QUERY_INSPECTOR=options):
+            self.client.get(reverse('hotel-list'))
+        with open(self.report_path) as f:
+            [report] = [json.loads(line) for line in f]
+        self.assertEqual((report['view'], report['method'], report['status']), ('hotel-list', 'GET', 200))
+        self.assertEqual(len(report['slow']), report['queries'])
+
+        with override_settings(QUERY_INSPECTOR={**options, 'SAMPLE_RATE': 0}):
+            self.client_class().get(reverse('hotel-list'))  # fresh client, so middleware is reloaded
+        with open(self.report_path) as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    def test_disabled_by_default(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryInspectorMiddleware(lambda request: None)
+
+    def test_query_report_aggregates_by_fingerprint(self):
+        for _ in range(2):
+            with inspect_queries(duplicate_threshold=3) as inspector:
+                for hotel in Hotel.objects.all():
+                    list(hotel.rooms.all())
+            write_report(inspector.report(view='hotel-list'), self.report_path)
+        out = StringIO()
+        call_command('query_report', self.report_path, '--json', stdout=out)
+        [row] = json.loads(out.getvalue())
+        self.assertEqual((row['requests'], row['count'], row['max_per_request']), (2, 6, 3))
+        self.assertEqual(row['views'], ['hotel-list'])
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        user_rows.clear()
+        self.client = APIClient()
+        self.user = make_user()
+        self.hotel = make_hotel()
+        self.room = make_room(self.hotel)
+        response = self.client.post(reverse('token_obtain_pair'),
+                                    {'email': self.user.email, 'password': 'pass12345'}, format='json')
+        self.access = response.data['access']
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        user, _ = ClaimsJWTAuthentication().authenticate(request)
+        return user
+
+    def test_token_carries_claims(self):
+        token = AccessToken(self.access)
+        self.assertEqual((token['uid'], token['email'], token['is_admin'], token['is_staff']),
+                         (str(self.user.uid), self.user.email, False, False))
+
+    def test_write_request_skips_user_query(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        check_in = date.today() + timedelta(days=5)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(reverse('create-booking'), {
+                'hotel': str(self.hotel.uid), 'room': str(self.room.uid),
+                'check_in': check_in.isoformat(), 'check_out': (check_in + timedelta(days=2)).isoformat(),
+                'total_price': '160.00',
+            })
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse([q['sql'] for q in captured if 'FROM "bookings_user"' in q['sql']])
+        self.assertEqual(Booking.objects.get().user, self.user)
+
+    def test_other_fields_load_once_through_cache(self):
+        user = self.authenticate(self.access)
+        self.assertEqual(user.uid, self.user.uid)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.username, 'guest')
+            self.assertTrue(user.is_active)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate(self.access).date_joined, self.user.date_joined)
+
+        self.user.phone = '+251911000000'
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(self.access).phone, '+251911000000')
+
+    def test_staff_claim_grants_admin_views(self):
+        self.user.is_staff = True
+        self.user.save()
+        staff_token = EmailTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {staff_token}')
+        self.assertEqual(self.client.get(reverse('catalog-cache-stats')).status_code, 200)
+
+    def test_tokens_without_claims_fall_back_to_lookup(self):
+        with self.assertNumQueries(1):
+            user = self.authenticate(AccessToken.for_user(self.user))
+        self.assertEqual(type(user), User)
+
+
+def png_bytes(width, height, color=(200, 30, 30)):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        use_temporary_media_root(self)
+
+    def upload(self, data, name='lake.png'):
+        hotel = make_hotel()
+        with self.captureOnCommitCallbacks(execute=True):   # derivatives are built after commit
+            hotel.featured_image.save(name, ContentFile(data))  # saves the hotel too
+        hotel.refresh_from_db()
+        return hotel
+
+    def test_upload_generates_hashed_derivatives_without_upscaling(self):
+        hotel = self.upload(png_bytes(800, 400))
+        manifest = hotel.image_derivatives
+        self.assertEqual(manifest['source'], hotel.featured_image.name)
+        self.assertEqual({fmt: sorted(paths) for fmt, paths in manifest['variants'].items()},
+                         {'webp': ['320', '640', '800'], 'jpeg': ['320', '640', '800']})
+        from PIL import Image
+        path = manifest['variants']['webp']['320']
+        self.assertRegex(path, r'^derivatives/[0-9a-f]{2}/[0-9a-f]{24}-320w\.webp$')
+        with default_storage.open(path) as f:
+            self.assertEqual(Image.open(f).size, (320, 160))
+
+        # Same bytes under another name share the derivative files.
+        self.assertEqual(self.upload(png_bytes(800, 400), 'copy.png').image_derivatives['variants'],
+                         manifest['variants'])
+
+    def test_serializers_expose_srcset(self):
+        hotel = self.upload(png_bytes(800, 400))
+        make_room(hotel)
+        body = self.client.get(reverse('hotel-list')).json()['results'][0]
+        webp = hotel.image_derivatives['variants']['webp']
+        self.assertEqual(body['image_srcset']['webp'], ', '.join(
+            f"http://testserver/media/{webp[width]} {width}w" for width in ('320', '640', '800')))
+        detail = self.client.get(reverse('hotel-detail', kwargs={'uid': hotel.uid})).json()
+        self.assertEqual(detail['image_srcset'], body['image_srcset'])
+        self.assertIsNone(detail['rooms'][0]['image_srcset'])
+
+    def test_command_skips_unchanged_sources_and_rebuilds_changed_ones(self):
+        hotel = self.upload(png_bytes(400, 300))
+        Hotel.objects.filter(pk=hotel.pk).update(image_derivatives={})
+        out = StringIO()
+        call_command('build_image_derivatives', stdout=out)
+        self.assertIn('1 source(s): 1 built, 0 unchanged, 0 failed; 1 row(s) updated', out.getvalue())
+        manifest = Hotel.objects.get(pk=hotel.pk).image_derivatives
+        self.assertEqual(sorted(manifest['variants']['jpeg']), ['320', '400'])
+
+        out = StringIO()
+        call_command('build_image_derivatives', stdout=out)
+        self.assertIn('1 source(s): 0 built, 1 unchanged, 0 failed; 0 row(s) updated', out.getvalue())
+
+        # The file is replaced in place: the digest changes, and so do the names.
+        with open(default_storage.path(hotel.featured_image.name), 'wb') as f:
+            f.write(png_bytes(400, 300, color=(0, 0, 255)))
+        call_command('build_image_derivatives', stdout=StringIO())
+        self.assertNotEqual(Hotel.objects.get(pk=hotel.pk).image_derivatives['digest'], manifest['digest'])
+
+    def test_undecodable_source_keeps_original_only(self):
+        with self.assertLogs('bookings.signals', 'WARNING'):
+            hotel = self.upload(b'not an image', 'broken.jpg')
+        self.assertEqual(hotel.image_derivatives, {})
+        err = StringIO()
+        call_command('build_image_derivatives', stdout=StringIO(), stderr=err)
+        self.assertIn(hotel.featured_image.name, err.getvalue())
+        body = self.client.get(reverse('hotel-list')).json()['results'][0]
+        self.assertIsNone(body['image_srcset'])
+        self.assertTrue(body['image_url'].endswith(hotel.featured_image.name))
+
+    def test_decompression_bomb_does_not_fail_the_save(self):
+        with mock.patch('PIL.Image.MAX_IMAGE_PIXELS', 1000), self.assertLogs('bookings.signals', 'WARNING') as logs:
+            hotel = self.upload(png_bytes(100, 100))   # > 2 × MAX_IMAGE_PIXELS
+        self.assertIn('DecompressionBombError', logs.output[0])
+        self.assertEqual(hotel.image_derivatives, {})
+        self.assertTrue(hotel.featured_image.name)
+
+    def test_derivatives_are_built_after_commit(self):
+        hotel = make_hotel()
+        with self.captureOnCommitCallbacks() as callbacks:
+            hotel.featured_image.save('lake.png', ContentFile(png_bytes(400, 300)))
+            self.assertEqual(Hotel.objects.get(pk=hotel.pk).image_derivatives, {})
+        for callback in callbacks:
+            callback()
+        self.assertEqual(sorted(Hotel.objects.get(pk=hotel.pk).image_derivatives['variants']['webp']), ['320', '400'])
+
+
+class MediaStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = use_temporary_media_root(self)
+
+    def test_identical_uploads_share_one_file(self):
+        first = default_storage.save('hotel_images/adama_oasis.jpg', ContentFile(b'same bytes'))
+        again = default_storage.save('hotel_images/adama_oasis.jpg', ContentFile(b'same bytes'))
+        other = default_storage.save('hotel_images/other.JPG', ContentFile(b'other bytes'))
+        self.assertEqual(first, again)
+        self.assertRegex(first, r'^hotel_images/[0-9a-f]{64}\.jpg$')
+        self.assertRegex(other, r'^hotel_images/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'hotel_images'))), 2)
+
+    def test_hash_like_upload_names_are_still_hashed(self):
+        existing = default_storage.save('hotel_images/lake.jpg', ContentFile(b'original'))
+        shadow = default_storage.save(existing, ContentFile(b'new bytes'))
+        forged = default_storage.save('hotel_images/' + 'a' * 64 + '.jpg', ContentFile(b'forged'))
+        self.assertNotEqual(shadow, existing)
+        with default_storage.open(existing) as f:
+            self.assertEqual(f.read(), b'original')
+        for name, data in ((shadow, b'new bytes'), (forged, b'forged')):
+            self.assertEqual(os.path.basename(name), hashlib.sha256(data).hexdigest() + '.jpg')
+
+    def test_hashed_files_are_immutable(self):
+        name = default_storage.save('hotel_images/lake.png', ContentFile(png_bytes(4, 4)))
+        response = self.client.get(default_storage.url(name))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), png_bytes(4, 4))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Content-Type'], 'image/png')
+
+        response = self.client.get(default_storage.url(name), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_legacy_names_get_short_max_age(self):
+        os.makedirs(os.path.join(self.media_root, 'hotel_images'))
+        with open(os.path.join(self.media_root, 'hotel_images', 'adama_oasis.jpg'), 'wb') as f:
+            f.write(b'legacy')
+        response = self.client.get('/media/hotel_images/adama_oasis.jpg')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+
+    def test_paths_outside_media_root_are_not_served(self):
+        request = APIRequestFactory().get('/')
+        for path in ('../hotel_backend/settings.py', '/etc/passwd', 'hotel_images'):
+            with self.assertRaises(Http404):
+                serve_media(request, path)
+        self.assertEqual(self.client.get('/media/missing.jpg').status_code, 404)
+
+    def test_offload_to_web_server(self):
+        name = default_storage.save('hotel_images/lake.png', ContentFile(png_bytes(4, 4)))
+        with override_settings(MEDIA_SERVING={'OFFLOAD': 'x-accel-redirect'}):
+            response = self.client.get(default_storage.url(name))
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{name}')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response.content, b'')
+
+        with override_settings(MEDIA_SERVING={'OFFLOAD': 'x-sendfile'}):
+            response = self.client.get(default_storage.url(name))
+        self.assertEqual(response['X-Sendfile'], default_storage.path(name))
+        self.assertIn('immutable', response['Cache-Control'])
+
+
+class PricingTests(TestCase):
+    def setUp(self):
+        calendars.clear()
+        self.hotel = make_hotel()
+        self.room = make_room(self.hotel, price=100)
+        self.other = make_room(self.hotel, name="Room 2", price=50)
+        today = date.today()
+        self.monday = today + timedelta(days=14 - today.weekday())
+
+    def total(self, room, nights, offset=0):
+        check_in = self.monday + timedelta(days=offset)
+        return quote_room(room, check_in, check_in + timedelta(days=nights)).total
+
+    def rule(self, kind, room=None, **fields):
+        return RateRule.objects.create(hotel=self.hotel, room=room, kind=kind, **fields)
+
+    def test_without_rules_price_times_nights(self):
+        self.assertEqual(self.total(self.room, 3), 300)
+        quote = quote_room(self.room, self.monday, self.monday + timedelta(days=2), nightly=True)
+        self.assertEqual(quote.nightly, [100, 100])
+        self.assertEqual(quote.adjustment, 0)
+
+    def test_nightly_rules(self):
+        self.rule(RateRule.SEASON, start_date=self.monday + timedelta(days=1),
+                  end_date=self.monday + timedelta(days=2), percent=20)
+        self.rule(RateRule.WEEKDAY, weekdays=(1 << 4) | (1 << 5), amount='15.50')   # Fri, Sat
+        self.rule(RateRule.WEEKDAY, room=self.other, weekdays=1, percent=-10)       # Mon, Room 2 only
+        quote = quote_room(self.room, self.monday, self.monday + timedelta(days=7), nightly=True)
+        self.assertEqual(quote.nightly, [100, 120, 120, 100, Decimal('115.50'), Decimal('115.50'), 100])
+        self.assertEqual(quote.total, 771)
+        self.assertEqual(self.total(self.other, 2), 45 + 60)
+
+    def test_longest_length_of_stay_rule_applies(self):
+        self.rule(RateRule.LENGTH_OF_STAY, min_nights=3, percent=-5)
+        self.rule(RateRule.LENGTH_OF_STAY, min_nights=7, percent=-10)
+        self.assertEqual(self.total(self.room, 2), 200)
+        self.assertEqual(self.total(self.room, 3), 285)
+        self.assertEqual(self.total(self.room, 7), 630)
+
+    def test_stays_beyond_the_horizon_match(self):
+        self.rule(RateRule.WEEKDAY, weekdays=64, percent=50)   # Sundays
+        with override_settings(PRICING={'HORIZON_DAYS': 30}):
+            calendars.clear()
+            inside = self.total(self.room, 7)
+            across = self.total(self.room, 14, offset=14)
+            beyond = self.total(self.room, 7, offset=70)
+        self.assertEqual(inside, beyond)
+        self.assertEqual(inside, 750)
+        self.assertEqual(across, 1500)
+
+    def test_rule_and_price_changes_invalidate_calendars(self):
+        self.assertEqual(self.total(self.room, 2), 200)
+        rule = self.rule(RateRule.SEASON, start_date=self.monday, end_date=self.monday, amount=25)
+        self.assertEqual(self.total(self.room, 2), 225)
+        rule.is_active = False
+        rule.save()
+        self.assertEqual(self.total(self.room, 2), 200)
+        self.room.price = 90
+        self.room.save()
+        self.assertEqual(self.total(self.room, 2), 180)
+
+    def test_changes_made_by_another_process_invalidate_calendars(self):
+        self.assertEqual(self.total(self.room, 2), 200)
+        # Another process's PRICING_SCOPE bump does not reach this one's LocMem cache.
+        with mock.patch('bookings.signals.invalidate_prices'):
+            with override_settings(PRICING={'VERSION_TTL': 3600}):
+                self.rule(RateRule.SEASON, start_date=self.monday, end_date=self.monday, amount=25)
+                self.assertEqual(self.total(self.room, 2), 200)   # not checked again yet
+            with override_settings(PRICING={'VERSION_TTL': 0}):
+                self.assertEqual(self.total(self.room, 2), 225)
+                RateRule.objects.all().delete()
+                self.assertEqual(self.total(self.room, 2), 200)
+
+    def test_booking_total_is_computed_by_the_server(self):
+        self.rule(RateRule.WEEKDAY, weekdays=1, amount=20)
+        user = make_user()
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post(reverse('create-booking'), {
+            'hotel': str(self.hotel.uid), 'room': str(self.room.uid),
+            'check_in': self.monday.isoformat(), 'check_out': (self.monday + timedelta(days=2)).isoformat(),
+            'total_price': '1.00',
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Booking.objects.get().total_price, 220)
+
+    def test_quote_endpoints(self):
+        self.rule(RateRule.LENGTH_OF_STAY, min_nights=2, amount=-10)
+        stay = {'check_in': self.monday.isoformat(), 'check_out': (self.monday + timedelta(days=2)).isoformat()}
+        response = self.client.get(reverse('quotes'), {'room': self.room.uid, **stay})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['nightly_rates'], ['100.00', '100.00'])
+        self.assertEqual(response.json()['total'], '180.00')
+
+        response = self.client.get(reverse('quotes'), {'hotel': self.hotel.uid, **stay})
+        self.assertEqual({row['room']: row['total'] for row in response.json()['quotes']},
+                         {str(self.room.uid): '180.00', str(self.other.uid): '80.00'})
+
+        response = self.client.post(reverse('quotes'), {'items': [
+            {'room': str(self.room.uid), **stay},
+            {'room': str(self.other.uid), 'check_in': stay['check_in'],
+             'check_out': (self.monday + timedelta(days=1)).isoformat()},
+        ]}, content_type='application/json')
+        self.assertEqual([row['total'] for row in response.json()['quotes']], ['180.00', '50.00'])
+
+        self.assertEqual(self.client.get(reverse('quotes'), {'room': self.hotel.uid, **stay}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('quotes'), stay).status_code, 400)
+        response = self.client.get(reverse('quotes'), {
+            'room': self.room.uid, 'check_in': stay['check_in'],
+            'check_out': (self.monday + timedelta(days=200)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_hotel_quote_queries(self):
+        stay = {'hotel': self.hotel.uid, 'check_in': self.monday.isoformat(),
+                'check_out': (self.monday + timedelta(days=3)).isoformat()}
+        calendars.clear()
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(reverse('quotes'), stay)
+        for i in range(5):
+            make_room(self.hotel, name=f"Extra {i}")
+        calendars.clear()
+        with CaptureQueriesContext(connection) as more_rooms:
+            self.client.get(reverse('quotes'), stay)
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get(reverse('quotes'), stay)
+        self.assertEqual(len(cold), len(more_rooms))
+        self.assertLess(len(warm), len(cold))
+
+
+class HotelRoomStatsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.cheap = make_hotel("Cheap")
+        self.dear = make_hotel("Dear")
+        self.empty = make_hotel("Empty")
+        self.same = make_hotel("Same")
+        make_room(self.cheap, price=40, capacity=2)
+        make_room(self.cheap, "Room 2", price=90, capacity=4)
+        make_room(self.dear, price=200)
+        make_room(self.same, price=40)
+
+    def stats(self, hotel):
+        hotel.refresh_from_db()
+        return hotel.min_price, hotel.room_count, hotel.max_capacity
+
+    def test_room_changes_maintain_stats(self):
+        self.assertEqual(self.stats(self.cheap), (40, 2, 4))
+        self.assertEqual(self.stats(self.empty), (None, 0, 0))
+
+        room = Room.objects.get(hotel=self.cheap, price=40)
+        room.is_available = False
+        room.save()
+        self.assertEqual(self.stats(self.cheap), (90, 1, 4))
+
+        room = Room.objects.get(pk=room.pk)
+        room.hotel = self.empty
+        room.is_available = True
+        room.save()
+        self.assertEqual(self.stats(self.empty), (40, 1, 2))
+        self.assertEqual(self.stats(self.cheap), (90, 1, 4))
+
+        Room.objects.filter(hotel=self.cheap).delete()
+        self.assertEqual(self.stats(self.cheap), (None, 0, 0))
+
+    def test_stale_save_keeps_stats(self):
+        # self.cheap was loaded before its rooms were created.
+        self.cheap.stars = 4
+        self.cheap.save()
+        self.assertEqual(self.stats(self.cheap), (40, 2, 4))
+        self.assertEqual(self.cheap.stars, 4)
+
+    def test_rebuild_repairs_bulk_updates(self):
+        Room.objects.filter(hotel=self.dear).update(price=10)   # skips signals
+        before = Hotel.objects.get(pk=self.dear.pk).updated_at
+        out = StringIO()
+        call_command('rebuild_aggregates', stdout=out)
+        self.assertIn('1 hotel(s) corrected', out.getvalue())
+        self.assertEqual(self.stats(self.dear), (10, 1, 2))
+        self.assertGreater(self.dear.updated_at, before)
+
+    def names(self, pages):
+        return [hotel['name'] for page in pages for hotel in page['results']]
+
+    def walk(self, params):
+        return KeysetPaginationTests.walk(self, reverse('hotel-list'), {'page_size': 1, **params})
+
+    def test_ordering_by_min_price_puts_hotels_without_rooms_last(self):
+        pages = self.walk({'ordering': 'min_price'})
+        self.assertEqual(self.names(pages), ["Cheap", "Same", "Dear", "Empty"])
+        self.assertEqual(pages[0]['results'][0]['min_price'], '40.00')
+        self.assertIsNone(pages[-1]['results'][0]['min_price'])
+        self.assertEqual(self.names(self.walk({'ordering': '-min_price'})), ["Empty", "Dear", "Cheap", "Same"])
+
+        # Back from the NULL page to the first.
+        results = []
+        response = self.client.get(reverse('hotel-list'), {'page_size': 1, 'ordering': 'min_price'})
+        for _ in range(3):
+            response = self.client.get(response.data['next'])
+        while response.data['previous']:
+            response = self.client.get(response.data['previous'])
+            results.extend(self.names([response.data]))
+        self.assertEqual(results, ["Dear", "Same", "Cheap"])
+
+    def test_filter_by_min_price(self):
+        response = self.client.get(reverse('hotel-filter'), {'min_price__lte': 100, 'ordering': '-min_price'})
+        self.assertEqual(self.names([response.data]), ["Cheap", "Same"])
+        response = self.client.get(reverse('hotel-filter'), {'max_capacity__gte': 3})
+        self.assertEqual(self.names([response.data]), ["Cheap"])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ReviewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.hotel = make_hotel()
+        self.room = make_room(self.hotel)
+        self.other_room = make_room(self.hotel, "Room 2")
+        self.user = make_user()
+        self.url = reverse('room-reviews', kwargs={'hotel_uid': self.hotel.uid, 'room_uid': self.room.uid})
+
+    def ratings(self, obj):
+        obj.refresh_from_db()
+        return obj.rating_sum, obj.rating_count
+
+    def review(self, room, rating, email):
+        return Review.objects.create(room=room, user=make_user(email), rating=rating)
+
+    def test_create_review_updates_aggregates(self):
+        self.assertEqual(self.client.post(self.url, {'rating': 4}).status_code, 401)
+        self.client.force_authenticate(self.user)
+        response = self.client.post(self.url, {'rating': 4, 'comment': 'Quiet'})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data['user'], self.user.username)
+        self.assertEqual(self.client.post(self.url, {'rating': 5}).status_code, 400)   # one per room
+        self.assertEqual(self.client.post(
+            reverse('room-reviews', kwargs={'hotel_uid': self.hotel.uid, 'room_uid': self.other_room.uid}),
+            {'rating': 6},
+        ).status_code, 400)
+
+        self.review(self.other_room, 1, 'b@example.com')
+        self.assertEqual(self.ratings(self.room), (4, 1))
+        self.assertEqual(self.ratings(self.hotel), (5, 2))
+        hotel = self.client.get(reverse('hotel-list')).data['results'][0]
+        self.assertEqual((hotel['rating'], hotel['rating_count']), (2.5, 2))
+
+    def test_concurrent_duplicate_review_is_a_400(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.post(self.url, {'rating': 4}).status_code, 201)
+        # The second request of a race has passed validate() before the first committed.
+        with mock.patch.object(ReviewSerializer, 'validate', lambda serializer, data: data):
+            response = self.client.post(self.url, {'rating': 5})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'non_field_errors': ['You have already reviewed this room.']})
+        self.assertEqual(self.ratings(self.room), (4, 1))
+
+    def test_stale_save_keeps_rating_aggregates(self):
+        room, hotel = Room.objects.get(pk=self.room.pk), Hotel.objects.get(pk=self.hotel.pk)
+        self.review(self.room, 5, 'a@example.com')
+        self.review(self.other_room, 3, 'b@example.com')
+        room.name, hotel.name = "Renamed room", "Renamed hotel"
+        room.save()
+        hotel.save()
+        self.assertEqual(self.ratings(self.room), (5, 1))
+        self.assertEqual(self.ratings(self.hotel), (8, 2))
+        self.assertEqual((self.room.name, self.hotel.name), ("Renamed room", "Renamed hotel"))
+
+    def test_edit_move_and_delete_adjust_aggregates(self):
+        review = self.review(self.room, 2, 'a@example.com')
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 5
+        review.save()
+        self.assertEqual(self.ratings(self.room), (5, 1))
+        review.room = self.other_room
+        review.save()
+        self.assertEqual(self.ratings(self.room), (0, 0))
+        self.assertEqual(self.ratings(self.other_room), (5, 1))
+        Review.objects.all().delete()
+        self.assertEqual(self.ratings(self.other_room), (0, 0))
+        self.assertEqual(self.ratings(self.hotel), (0, 0))
+
+    def test_reviews_are_listed_newest_first(self):
+        first = self.review(self.room, 3, 'a@example.com')
+        second = self.review(self.other_room, 4, 'b@example.com')
+        hotel_reviews = self.client.get(reverse('hotel-reviews', kwargs={'hotel_uid': self.hotel.uid})).data
+        self.assertEqual([r['uid'] for r in hotel_reviews['results']], [str(second.uid), str(first.uid)])
+        room_reviews = self.client.get(self.url).data
+        self.assertEqual([r['uid'] for r in room_reviews['results']], [str(first.uid)])
+
+    def test_hotels_sort_by_rating(self):
+        good, unrated = make_hotel("Good"), make_hotel("Unrated")
+        self.review(make_room(good), 5, 'a@example.com')
+        self.review(self.room, 3, 'b@example.com')
+        pages = KeysetPaginationTests.walk(self, reverse('hotel-list'), {'page_size': 1, 'ordering': '-rating'})
+        names = [hotel['name'] for page in pages for hotel in page['results']]
+        self.assertEqual(names, ["Good", self.hotel.name, "Unrated"])
+        self.assertIsNone(pages[-1]['results'][0]['rating'])
+
+    def test_rebuild_repairs_drift(self):
+        self.review(self.room, 4, 'a@example.com')
+        Room.objects.filter(pk=self.room.pk).update(rating_sum=40)
+        Review.objects.create(room=self.room, user=make_user('b@example.com'), rating=2)
+        Hotel.objects.filter(pk=self.hotel.pk).update(rating_count=0)
+        out = StringIO()
+        call_command('rebuild_aggregates', stdout=out)
+        self.assertIn('2 rating row(s) corrected', out.getvalue())
+        self.assertEqual(self.ratings(self.room), (6, 2))
+        self.assertEqual(self.ratings(self.hotel), (6, 2))
@@ -3,78 +3,199 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from rest_framework.permissions import IsAuthenticated
-from django.db import IntegrityError
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, IntegerField, Max, Prefetch, Value, When
+from django.http import Http404
+from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework import DjangoFilterBackend
 import traceback
 
-from .models import Hotel, Booking, Room
+from hotel_backend.instrumentation import timed
+
+from .models import Hotel, Review, Room
+from .aggregates import with_rating
+from .availability import available_rooms, booked_ranges, group_by_hotel
+from .cache import CachedCatalogMixin, catalog_cache, hotel_scope
+from .conditional import ConditionalGetMixin, make_validators
+from .filters import AmenityFilterBackend, IndexedSearchFilter, amenity_facets
+from .pagination import AvailabilityPagination, ReviewPagination, SearchRankPagination
+from .pricing import calendars, quote_room, quote_rooms
+from .search import get_search_index
 from .serializers import (
     HotelListSerializer,
     HotelDetailSerializer,
     RoomSerializer,
     BookingSerializer,
-    UserRegistrationSerializer
+    UserRegistrationSerializer,
+    AvailabilityQuerySerializer,
+    HotelSearchQuerySerializer,
+    HotelListFastSerializer,
+    RoomFastSerializer,
+    QuoteBatchSerializer,
+    QuoteQuerySerializer,
+    QuoteSerializer,
+    ReviewSerializer,
 )
 
 User = get_user_model()
 
+
+class FastListMixin:
+    """
+    Serve list() from `.values()` rows through `fast_serializer_class` when
+    FAST_LIST_SERIALIZERS is on; the ModelSerializer path stays the fallback.
+    """
+    fast_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        fast = self.fast_serializer_class
+        if fast is None or not getattr(settings, 'FAST_LIST_SERIALIZERS', True):
+            return super().list(request, *args, **kwargs)
+
+        queryset = fast.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        serializer = fast(page if page is not None else queryset, context=self.get_serializer_context())
+        with timed('serialize'):
+            data = serializer.data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class TimedRetrieveMixin:
+    """DRF's retrieve() with the serializer step reported as the 'serialize' phase."""
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        with timed('serialize'):
+            data = self.get_serializer(instance).data
+        return Response(data)
+
+
+class AmenityFacetMixin:
+    """Add per-amenity hotel counts for the filtered result set to list()."""
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data['facets'] = {
+            'amenities': amenity_facets(self.filter_queryset(self.get_queryset())),
+        }
+        return response
+
+
 # ───── Hotels ────────────────────────────────────────────────────────────────
 
-class HotelListAPI(generics.ListAPIView):
+class HotelListAPI(ConditionalGetMixin, CachedCatalogMixin, FastListMixin, generics.ListAPIView):
     """
-    GET /api/hotels/
-    List all active hotels (no price field in list).
+    GET /api/hotels/?ordering=min_price|-rating
+    List all active hotels (no price field in list; min_price is the cheapest available room).
     """
-    queryset = Hotel.objects.filter(is_active=True)
+    queryset = with_rating(Hotel.objects.filter(is_active=True))
     serializer_class = HotelListSerializer
-    filter_backends = [DjangoFilterBackend]
+    fast_serializer_class = HotelListFastSerializer
+    filter_backends = [DjangoFilterBackend, AmenityFilterBackend, filters.OrderingFilter]
     filterset_fields = ['location', 'has_pool']
+    # Denormalized columns only (bookings/aggregates.py); hotels without an
+    # available room come last, unrated hotels rate 0.
+    ordering_fields = ['min_price', 'rating']
 
 
-class HotelFilterAPI(generics.ListAPIView):
+class HotelFilterAPI(ConditionalGetMixin, CachedCatalogMixin, AmenityFacetMixin, FastListMixin,
+                     generics.ListAPIView):
     """
-    GET /api/hotels/filter/?location=…&has_pool=…&has_gym=…&price__gte=…&price__lte=…
-    Advanced hotel search.
+    GET /api/hotels/filter/?location=…&has_pool=…&has_gym=…&price__gte=…&price__lte=…&amenities=Spa,Bar
+                           &min_price__gte=…&min_price__lte=…&max_capacity__gte=…&ordering=min_price|-rating
+    Advanced hotel search, with per-amenity facet counts.
     """
-    queryset = Hotel.objects.filter(is_active=True)
+    queryset = with_rating(Hotel.objects.filter(is_active=True))
     serializer_class = HotelListSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    fast_serializer_class = HotelListFastSerializer
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, AmenityFilterBackend, filters.OrderingFilter]
     filterset_fields = {
         'has_pool': ['exact'],
         'has_gym': ['exact'],
         'price': ['gte', 'lte'],
+        'min_price': ['gte', 'lte'],
+        'max_capacity': ['gte'],
     }
     search_fields = ['location', 'name']
+    ordering_fields = ['min_price', 'rating']
 
 
-class HotelDetailAPI(generics.RetrieveAPIView):
+class HotelSearchAPI(CachedCatalogMixin, FastListMixin, generics.ListAPIView):
+    """
+    GET /api/hotels/search/?q=…
+    Full-text hotel search over name, location, description, amenities and
+    room descriptions; prefix and typo tolerant, best match first.
+    """
+    serializer_class = HotelListSerializer
+    fast_serializer_class = HotelListFastSerializer
+    pagination_class = SearchRankPagination
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        params = HotelSearchQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        hotel_ids = get_search_index().search(params.validated_data['q'])
+        if not hotel_ids:
+            return Hotel.objects.none().annotate(rank=Value(0))
+        rank = Case(
+            *[When(id=hotel_id, then=Value(position)) for position, hotel_id in enumerate(hotel_ids)],
+            output_field=IntegerField(),
+        )
+        return Hotel.objects.filter(is_active=True, id__in=hotel_ids).annotate(rank=rank)
+
+
+class HotelDetailAPI(ConditionalGetMixin, CachedCatalogMixin, TimedRetrieveMixin, generics.RetrieveAPIView):
     """
     GET /api/hotels/<uuid:uid>/
     Retrieve hotel details including nested rooms.
     """
-    queryset = Hotel.objects.filter(is_active=True)
+    queryset = Hotel.objects.filter(is_active=True).prefetch_related(
+        Prefetch('rooms', queryset=Room.objects.filter(is_available=True), to_attr='available_rooms')
+    )
     serializer_class = HotelDetailSerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = 'uid'
 
+    def get_cache_scope(self):
+        return hotel_scope(self.kwargs['uid'])
+
+    def get_validators(self):
+        # The payload nests the available rooms, so they feed the validators too.
+        state = Hotel.objects.filter(is_active=True, uid=self.kwargs['uid']).aggregate(
+            hotel_modified=Max('updated_at'),
+            rooms_modified=Max('rooms__updated_at'),
+            room_count=Count('rooms'),
+        )
+        if state['hotel_modified'] is None:
+            return None, None
+        last_modified = max(filter(None, [state['hotel_modified'], state['rooms_modified']]))
+        return make_validators(self.request, last_modified, state['room_count'])
+
 
 # ───── Rooms ─────────────────────────────────────────────────────────────────
 
-class RoomListByUUIDAPI(generics.ListAPIView):
+class RoomListByUUIDAPI(ConditionalGetMixin, CachedCatalogMixin, FastListMixin, generics.ListAPIView):
     """
     GET /api/hotels/<uuid:hotel_uid>/rooms/
     List all rooms for the hotel matching that UUID (public).
     """
     serializer_class = RoomSerializer
+    fast_serializer_class = RoomFastSerializer
     permission_classes = [permissions.AllowAny]
 
+    def get_cache_scope(self):
+        return hotel_scope(self.kwargs['hotel_uid'])
+
     def get_queryset(self):
         hotel_uid = self.kwargs.get('hotel_uid')
-        return Room.objects.filter(hotel__uid=hotel_uid)
+        return Room.objects.filter(hotel__uid=hotel_uid).select_related('hotel')
 
 
-class RoomDetailAPI(generics.RetrieveAPIView):
+class RoomDetailAPI(ConditionalGetMixin, CachedCatalogMixin, TimedRetrieveMixin, generics.RetrieveAPIView):
     """
     GET /api/hotels/<uuid:hotel_uid>/rooms/<uuid:room_uid>/
     Retrieve one room by UID under a given hotel.
@@ -84,9 +205,12 @@ class RoomDetailAPI(generics.RetrieveAPIView):
     lookup_field = 'uid'
     lookup_url_kwarg = 'room_uid'
 
+    def get_cache_scope(self):
+        return hotel_scope(self.kwargs['hotel_uid'])
+
     def get_queryset(self):
         hotel_uid = self.kwargs['hotel_uid']
-        return Room.objects.filter(hotel__uid=hotel_uid)
+        return Room.objects.filter(hotel__uid=hotel_uid).select_related('hotel')
 
 
 @api_view(['GET'])
@@ -95,11 +219,142 @@ def RoomBookedRangesAPI(request, room_id):
     GET /api/rooms/<room_id>/booked_ranges/
     Returns date ranges of past or pending bookings for a room.
     """
-    qs = Booking.objects.filter(
-        room_id=room_id,
-        status__in=[Booking.PENDING, Booking.COMPLETED]
-    ).values('check_in', 'check_out')
-    return Response(list(qs))
+    return Response(list(booked_ranges(room_id)))
+
+
+class AvailabilityAPI(APIView):
+    """
+    GET /api/availability/?check_in=…&check_out=…&location=…&capacity=…&page_size=…
+    Rooms free for the whole stay, grouped by hotel, one keyset page of rooms
+    per query. A hotel whose rooms straddle two pages appears on both.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        params = AvailabilityQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+
+        paginator = AvailabilityPagination()
+        rooms = paginator.paginate_queryset(available_rooms(
+            query['check_in'],
+            query['check_out'],
+            location=query.get('location'),
+            capacity=query.get('capacity'),
+        ), request, view=self)
+        context = {'request': request}
+        hotels = []
+        with timed('serialize'):
+            for hotel, hotel_rooms in group_by_hotel(rooms):
+                data = HotelListSerializer(hotel, context=context).data
+                data['rooms'] = RoomSerializer(hotel_rooms, many=True, context=context).data
+                hotels.append(data)
+
+        return Response({
+            'check_in': query['check_in'],
+            'check_out': query['check_out'],
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+            'hotels': hotels,
+        })
+
+
+# ───── Reviews ───────────────────────────────────────────────────────────────
+
+class HotelReviewListAPI(generics.ListAPIView):
+    """
+    GET /api/hotels/<uuid:hotel_uid>/reviews/
+    Reviews of every room of the hotel, newest first.
+    """
+    serializer_class = ReviewSerializer
+    pagination_class = ReviewPagination
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        reviews = Review.objects.filter(room__hotel__uid=self.kwargs['hotel_uid'])
+        if 'room_uid' in self.kwargs:
+            reviews = reviews.filter(room__uid=self.kwargs['room_uid'])
+        return reviews.select_related('user', 'room')
+
+
+class RoomReviewListCreateAPI(HotelReviewListAPI):
+    """
+    GET  /api/hotels/<uuid:hotel_uid>/rooms/<uuid:room_uid>/reviews/
+    POST /api/hotels/<uuid:hotel_uid>/rooms/<uuid:room_uid>/reviews/ {"rating": 1-5, "comment": …}
+    The room's and hotel's rating aggregates follow (bookings/aggregates.py).
+    """
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method == 'POST':
+            context['room'] = get_object_or_404(
+                Room.objects.only('id', 'uid', 'hotel_id'),
+                hotel__uid=self.kwargs['hotel_uid'], uid=self.kwargs['room_uid'],
+            )
+        return context
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            # A concurrent POST can pass validate() too; unique_review_per_user_room decides.
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            return Response({'non_field_errors': ['You have already reviewed this room.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+# ───── Quotes ────────────────────────────────────────────────────────────────
+
+class QuoteAPI(APIView):
+    """
+    GET  /api/quotes/?room=<uid>&check_in=…&check_out=…   one room, with nightly rates
+    GET  /api/quotes/?hotel=<uid>&check_in=…&check_out=…  every room of the hotel
+    POST /api/quotes/ {"items": [{"room", "check_in", "check_out"}, …]}
+    Prices come from the compiled rate calendars (bookings/pricing.py).
+    """
+    permission_classes = [permissions.AllowAny]
+    room_fields = ('id', 'uid', 'hotel_id', 'price')
+
+    def get(self, request):
+        params = QuoteQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        check_in, check_out = query['check_in'], query['check_out']
+
+        if 'room' in query:
+            room = get_object_or_404(Room.objects.only(*self.room_fields), uid=query['room'])
+            quote = quote_room(room, check_in, check_out, nightly=True)
+            return Response(QuoteSerializer(QuoteSerializer.row(quote, room.uid)).data)
+
+        rooms = list(Room.objects.filter(hotel__uid=query['hotel'], hotel__is_active=True)
+                     .only(*self.room_fields).order_by('id'))
+        if not rooms:
+            raise Http404
+        quotes = quote_rooms(rooms, check_in, check_out)
+        with timed('serialize'):
+            data = QuoteSerializer([QuoteSerializer.row(quotes[room.id], room.uid) for room in rooms], many=True).data
+        return Response({'hotel': query['hotel'], 'check_in': check_in, 'check_out': check_out, 'quotes': data})
+
+    def post(self, request):
+        batch = QuoteBatchSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        items = batch.validated_data['items']
+
+        rooms = {room.uid: room for room in Room.objects.filter(uid__in={item['room'] for item in items})
+                 .only(*self.room_fields)}
+        unknown = sorted(str(item['room']) for item in items if item['room'] not in rooms)
+        if unknown:
+            return Response({'items': [f'Unknown room {uid}.' for uid in unknown]}, status=status.HTTP_400_BAD_REQUEST)
+        compiled = calendars.for_rooms(list(rooms.values()))
+        rows = [
+            QuoteSerializer.row(compiled[rooms[item['room']].id].quote(item['check_in'], item['check_out']), item['room'])
+            for item in items
+        ]
+        return Response({'quotes': QuoteSerializer(rows, many=True).data})
 
 
 # ───── Booking ───────────────────────────────────────────────────────────────
@@ -139,17 +394,18 @@ class RegisterUserAPI(generics.CreateAPIView):
 
 # ───── Stays (all rooms) ─────────────────────────────────────────────────────
 
-class StayListAPI(generics.ListAPIView):
+class StayListAPI(ConditionalGetMixin, CachedCatalogMixin, FastListMixin, generics.ListAPIView):
     """
     GET /api/stays/
     Returns all rooms regardless of availability.
     """
     queryset = Room.objects.all().select_related('hotel')
     serializer_class = RoomSerializer
+    fast_serializer_class = RoomFastSerializer
     permission_classes = [permissions.AllowAny]
 
 
-class StayDetailAPI(generics.RetrieveAPIView):
+class StayDetailAPI(ConditionalGetMixin, CachedCatalogMixin, TimedRetrieveMixin, generics.RetrieveAPIView):
     """
     GET /api/stays/<uuid:uid>/
     Returns single room details by its UUID.
@@ -159,3 +415,16 @@ class StayDetailAPI(generics.RetrieveAPIView):
     permission_classes = [permissions.AllowAny]
     lookup_field = 'uid'
     lookup_url_kwarg = 'uid'
+
+
+# ───── Monitoring ────────────────────────────────────────────────────────────
+
+class CatalogCacheStatsAPI(APIView):
+    """
+    GET /api/cache/stats/
+    Hit/miss counters of this process's catalog cache (staff only).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(catalog_cache.stats())
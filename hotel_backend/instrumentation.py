@@ -0,0 +1,277 @@
+"""
+Per-request performance instrumentation.
+
+RequestMetricsMiddleware measures for every request the wall time, the
+time spent in and number of database queries, the serializer and render
+phases, and the response size. Each measurement is added to in-process
+histograms labelled by route name and method. metrics_view exposes them
+in the Prometheus text format to the ALLOWED_IPS and to staff, whether
+logged in through the session or a JWT. With SERVER_TIMING on (settings
+turn it on under DEBUG only) each response also carries them in a
+Server-Timing header; it is off by default, as query counts and phase
+timings tell anonymous clients more than they should know.
+
+The middleware is sync and async capable, so it does not push async
+views (payment initiation) onto a thread under ASGI. Queries are timed
+by a wrapper installed once on every connection, which finds the
+request through a ContextVar; sync_to_async copies the context into
+the thread that runs the ORM, so queries issued there are counted too.
+
+With REQUEST_METRICS['ENABLED'] off the middleware unloads itself
+(MiddlewareNotUsed). timed() and the query wrapper then cost a single
+ContextVar lookup.
+
+Histograms are per process. Prometheus scrapes each worker and sums them.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+
+from bookings.cache import catalog_cache
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SERVER_TIMING': False,
+    'ALLOWED_IPS': ['127.0.0.1'],   # who may scrape /metrics (staff users always may)
+}
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ("Wall time of the request", DURATION_BUCKETS),
+    'http_request_db_seconds': ("Time spent executing database queries", DURATION_BUCKETS),
+    'http_request_queries': ("Database queries per request", QUERY_BUCKETS),
+    'http_request_serialize_seconds': ("Time spent in serializers (queries excluded)", DURATION_BUCKETS),
+    'http_request_render_seconds': ("Time spent rendering the response body", DURATION_BUCKETS),
+    'http_response_size_bytes': ("Response body size", SIZE_BUCKETS),
+}
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def metrics_options():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_METRICS', {})}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(HISTOGRAMS[name][1])
+            histogram.observe(value)
+
+    def snapshot(self, name, labels):
+        with self._lock:
+            return self.histograms.get((name, labels))
+
+    def exposition(self):
+        """The registry in Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            items = sorted(self.histograms.items())
+            lines = []
+            for name, (help_text, buckets) in HISTOGRAMS.items():
+                series = [(labels, histogram) for (metric, labels), histogram in items if metric == name]
+                if not series:
+                    continue
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for labels, histogram in series:
+                    label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+                    cumulative = 0
+                    for bound, count in zip((*buckets, '+Inf'), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{{label_text}}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{{label_text}}} {histogram.count}')
+        return lines
+
+
+request_metrics = MetricsRegistry()
+
+
+class RequestStats:
+    __slots__ = ('db_time', 'queries', 'phases')
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.queries = 0
+        self.phases = {}
+
+
+def time_query(execute, sql, params, many, context):
+    """connection.execute_wrappers hook: time every query of the current request."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - started
+        stats.queries += 1
+
+
+def install_query_timer(connection, **kwargs):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+connection_created.connect(install_query_timer, dispatch_uid='request_metrics_query_timer')
+
+
+@contextmanager
+def timed(phase):
+    """
+    Attribute the enclosed block to `phase` ('serialize', ...) of the
+    current request. Queries run inside the block are left out, as
+    they are already counted as db time.
+    """
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started, db_before = time.perf_counter(), stats.db_time
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started - (stats.db_time - db_before)
+        stats.phases[phase] = stats.phases.get(phase, 0.0) + elapsed
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        options = metrics_options()
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = options['SERVER_TIMING']
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # Connections opened before this module was imported missed connection_created.
+        for alias in connections:
+            install_query_timer(connections[alias])
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called just before DRF/template responses are rendered.
+        stats = _current.get()
+        if stats is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: stats.phases.__setitem__('render', time.perf_counter() - started)
+            )
+        return response
+
+    def record(self, request, response, stats, duration):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        labels = (('view', view), ('method', request.method))
+        request_metrics.observe('http_request_duration_seconds',
+                                labels + (('status', f'{response.status_code // 100}xx'),), duration)
+        request_metrics.observe('http_request_db_seconds', labels, stats.db_time)
+        request_metrics.observe('http_request_queries', labels, stats.queries)
+        for phase in ('serialize', 'render'):
+            if phase in stats.phases:
+                request_metrics.observe(f'http_request_{phase}_seconds', labels, stats.phases[phase])
+        if not response.streaming:
+            request_metrics.observe('http_response_size_bytes', labels, len(response.content))
+
+        if self.server_timing:
+            entries = [f'app;dur={duration * 1000:.2f}',
+                       f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries"']
+            entries += [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in stats.phases.items()]
+            response['Server-Timing'] = ', '.join(entries)
+
+
+def is_staff(request):
+    """Staff logged in through the session, or through the API's authenticators (JWT)."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authenticator().authenticate(request)
+        except APIException:
+            return False
+        if result is not None:
+            return result[0].is_staff
+    return False
+
+
+def metrics_view(request):
+    """GET /metrics — Prometheus scrape endpoint."""
+    if request.META.get('REMOTE_ADDR') not in metrics_options()['ALLOWED_IPS'] and not is_staff(request):
+        return HttpResponseForbidden()
+
+    cache = catalog_cache.stats()
+    lines = request_metrics.exposition() + [
+        '# HELP catalog_cache_hits_total Catalog cache hits',
+        '# TYPE catalog_cache_hits_total counter',
+        f'catalog_cache_hits_total {cache["hits"]}',
+        '# HELP catalog_cache_misses_total Catalog cache misses',
+        '# TYPE catalog_cache_misses_total counter',
+        f'catalog_cache_misses_total {cache["misses"]}',
+    ]
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
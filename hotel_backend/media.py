@@ -0,0 +1,134 @@
+"""
+Content-addressed media storage and media serving.
+
+ContentAddressedStorage names every saved file after the SHA-256 of its
+bytes, in the directory the caller asked for:
+
+    hotel_images/adama_oasis.jpg -> hotel_images/3f1c…e9.jpg
+
+Saving the same bytes again returns the existing name without writing,
+so identical uploads share one file. Every upload is hashed, whatever
+its name; only content marked with prehashed() by our own code (the
+image derivatives, whose names hash their source) keeps the given name.
+
+A content-addressed name never points at other bytes, so serve_media
+marks those files `immutable` with a one-year max-age. Other files,
+e.g. uploads from before this storage, get a short max-age.
+
+With MEDIA_SERVING['OFFLOAD'] set to 'x-accel-redirect' (nginx) or
+'x-sendfile' (Apache, lighttpd), serve_media only checks the path and
+sets headers; the web server streams the bytes. Without offload it
+streams the file itself, which is meant for development.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import uuid
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+DEFAULTS = {
+    'OFFLOAD': None,                     # None, 'x-accel-redirect' or 'x-sendfile'
+    'ACCEL_PREFIX': '/protected-media/',  # nginx `internal` location aliasing MEDIA_ROOT
+    'IMMUTABLE_MAX_AGE': 365 * 24 * 3600,
+    'MAX_AGE': 3600,
+}
+
+# <sha256>.ext from the storage, <digest>-<width>w.ext from bookings/images.py
+HASHED_NAME = re.compile(r'^[0-9a-f]{24,64}(?:-\d+w)?\.[a-z0-9]+$')
+
+
+def media_options():
+    return {**DEFAULTS, **getattr(settings, 'MEDIA_SERVING', {})}
+
+
+def is_content_addressed(name):
+    return bool(HASHED_NAME.match(os.path.basename(name)))
+
+
+def prehashed(content):
+    """Mark `content` as saved under a name the caller derived from its bytes."""
+    content.prehashed = True
+    return content
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    content_addressed = True
+
+    def content_name(self, name, content):
+        # Never trust a hash-like name from an upload: it could shadow an
+        # existing file or claim bytes it does not hold.
+        if getattr(content, 'prehashed', False) and is_content_addressed(name):
+            return name
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+        directory, basename = os.path.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        return os.path.join(directory, digest.hexdigest() + extension).replace('\\', '/')
+
+    def get_available_name(self, name, max_length=None):
+        # _save() picks the final name; a random suffix would defeat dedup.
+        return name
+
+    def _save(self, name, content):
+        target = self.content_name(name, content)
+        if self.exists(target):
+            return target
+        # Write under a unique name and rename into place: concurrent saves of
+        # the same bytes both succeed and readers never see a partial file.
+        partial = super()._save(f'{target}.{uuid.uuid4().hex}.part', content)
+        os.replace(self.path(partial), self.path(target))
+        return target
+
+
+def is_content_addressed_storage(storage=default_storage):
+    return getattr(storage, 'content_addressed', False)
+
+
+@require_safe
+def serve_media(request, path):
+    """GET MEDIA_URL<path> — media files with cache headers, optionally offloaded to the web server."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    options = media_options()
+    immutable = is_content_addressed(path)
+    etag = f'"{os.path.splitext(os.path.basename(path))[0]}"' if immutable else f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    elif options['OFFLOAD'] == 'x-accel-redirect':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = options['ACCEL_PREFIX'] + quote(path.lstrip('/'))
+    elif options['OFFLOAD'] == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = full_path
+    else:
+        response = FileResponse(open(full_path, 'rb'))
+    if options['OFFLOAD'] and response.status_code == 200:
+        # The web server sends the body but keeps our Content-Type.
+        response['Content-Type'] = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if immutable:
+        response['Cache-Control'] = f"public, max-age={options['IMMUTABLE_MAX_AGE']}, immutable"
+    else:
+        response['Cache-Control'] = f"public, max-age={options['MAX_AGE']}"
+    return response
@@ -0,0 +1,188 @@
+"""
+Opt-in slow-query and duplicate-query (N+1) detector.
+
+QueryInspectorMiddleware samples a fraction of requests. For a sampled
+request every query goes through a connection.execute_wrapper that
+records its SQL fingerprint, duration and the line of project code
+that issued it. At the end of the request:
+
+- a fingerprint seen DUPLICATE_THRESHOLD times or more is a duplicate,
+  typically a query run once per row of a list (N+1);
+- a query taking SLOW_MS or longer is slow.
+
+Requests with findings, or every sampled request with REPORT_ALL, are
+appended as one JSON object per line to REPORT_PATH. `manage.py
+query_report` aggregates that file by fingerprint.
+
+The fingerprint is the SQL with literals replaced by '?' and IN lists
+collapsed, so `id IN (%s, %s)` and `id IN (%s)` count as one query.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 1.0,           # fraction of requests inspected
+    'SLOW_MS': 100,
+    'DUPLICATE_THRESHOLD': 3,     # same fingerprint this often in one request
+    'REPORT_PATH': os.path.join(settings.BASE_DIR, 'logs', 'queries.jsonl'),
+    'REPORT_ALL': False,          # also report sampled requests without findings
+}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_VALUES = re.compile(r'\bVALUES\s*(?:\((?:[^()]|\([^()]*\))*\)\s*,?\s*)+', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+_write_lock = threading.Lock()
+_HERE = os.path.abspath(__file__)
+# Modules whose execute wrappers sit between the ORM and the inspector.
+_WRAPPERS = (_HERE, os.path.join(os.path.dirname(_HERE), 'instrumentation.py'))
+
+
+def inspector_options():
+    return {**DEFAULTS, **getattr(settings, 'QUERY_INSPECTOR', {})}
+
+
+def normalize(sql):
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _VALUES.sub('VALUES (...) ', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    """(fingerprint id, normalized SQL)."""
+    normalized = normalize(sql)
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12], normalized
+
+
+def callsite():
+    """'path:line in function' of the innermost project frame outside Django and the query wrappers."""
+    root = str(settings.BASE_DIR)
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and filename not in _WRAPPERS and 'site-packages' not in filename:
+            return f"{os.path.relpath(filename, root)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryInspector:
+    """execute_wrapper that keeps one entry per fingerprint."""
+
+    def __init__(self, slow_ms=None, duplicate_threshold=None):
+        options = inspector_options()
+        self.slow_ms = options['SLOW_MS'] if slow_ms is None else slow_ms
+        self.duplicate_threshold = (options['DUPLICATE_THRESHOLD'] if duplicate_threshold is None
+                                    else duplicate_threshold)
+        self.fingerprints = {}
+        self.slow = []
+        self.queries = 0
+        self.db_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, (time.perf_counter() - started) * 1000, context['connection'].alias)
+
+    def record(self, sql, ms, alias):
+        key, normalized = fingerprint(sql)
+        entry = self.fingerprints.get(key)
+        if entry is None:
+            entry = self.fingerprints[key] = {
+                'fingerprint': key, 'sql': normalized, 'alias': alias, 'count': 0, 'total_ms': 0.0, 'callsites': {},
+            }
+        site = callsite()
+        entry['count'] += 1
+        entry['total_ms'] += ms
+        entry['callsites'][site] = entry['callsites'].get(site, 0) + 1
+        self.queries += 1
+        self.db_ms += ms
+        if ms >= self.slow_ms:
+            self.slow.append({'fingerprint': key, 'sql': normalized, 'ms': round(ms, 3), 'callsite': site})
+
+    def duplicates(self):
+        return sorted(
+            ({**entry, 'total_ms': round(entry['total_ms'], 3)}
+             for entry in self.fingerprints.values() if entry['count'] >= self.duplicate_threshold),
+            key=lambda entry: -entry['count'],
+        )
+
+    def report(self, **extra):
+        return {
+            **extra,
+            'queries': self.queries,
+            'db_ms': round(self.db_ms, 3),
+            'fingerprints': len(self.fingerprints),
+            'duplicates': self.duplicates(),
+            'slow': self.slow,
+        }
+
+    @property
+    def has_findings(self):
+        return bool(self.slow) or any(entry['count'] >= self.duplicate_threshold
+                                      for entry in self.fingerprints.values())
+
+
+@contextmanager
+def inspect_queries(**options):
+    """Inspect every query run inside the block on any connection; yields the QueryInspector."""
+    inspector = QueryInspector(**options)
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(inspector))
+        yield inspector
+
+
+def write_report(report, path=None):
+    path = path or inspector_options()['REPORT_PATH']
+    line = json.dumps(report, default=str, sort_keys=True) + '\n'
+    with _write_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as f:
+            f.write(line)
+
+
+class QueryInspectorMiddleware:
+    def __init__(self, get_response):
+        options = inspector_options()
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.options = options
+
+    def __call__(self, request):
+        if random.random() >= self.options['SAMPLE_RATE']:
+            return self.get_response(request)
+        started = time.perf_counter()
+        with inspect_queries() as inspector:
+            response = self.get_response(request)
+        if inspector.has_findings or self.options['REPORT_ALL']:
+            match = request.resolver_match
+            write_report(inspector.report(
+                ts=time.time(),
+                method=request.method,
+                path=request.path,
+                view=match.view_name if match else None,
+                status=response.status_code,
+                duration_ms=round((time.perf_counter() - started) * 1000, 3),
+            ), self.options['REPORT_PATH'])
+        return response
@@ -49,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'hotel_backend.instrumentation.RequestMetricsMiddleware',  # Outermost, so it times the whole stack
+    'hotel_backend.query_inspector.QueryInspectorMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # Must be at the top
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -116,6 +118,67 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are named by content hash, so identical files are stored once (hotel_backend/media.py)
+STORAGES = {
+    'default': {'BACKEND': 'hotel_backend.media.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# serve_media: let nginx ('x-accel-redirect') or Apache ('x-sendfile') stream the bytes in production
+MEDIA_SERVING = {
+    'OFFLOAD': None,
+    'ACCEL_PREFIX': '/protected-media/',
+}
+
+# Caches: catalog payloads live in process memory unless another backend
+# (e.g. Redis/Memcached) is configured under the 'catalog' alias.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CACHE_TIMEOUT = 300  # seconds
+
+# Resized WebP/JPEG copies of hotel and room images (bookings/images.py, build_image_derivatives)
+IMAGE_DERIVATIVES = {
+    'WIDTHS': (320, 640, 1280),
+    'FORMATS': ('webp', 'jpeg'),
+    'GENERATE_ON_UPLOAD': True,
+}
+
+# Hotel search index: 'auto' (SQLite FTS5 when available), 'fts5' or 'python'
+HOTEL_SEARCH_BACKEND = 'auto'
+
+# List endpoints serialize .values() rows instead of model instances
+FAST_LIST_SERIALIZERS = True
+
+# Per-request timing histograms, /metrics and Server-Timing (hotel_backend/instrumentation.py)
+REQUEST_METRICS = {
+    'ENABLED': True,
+    'SERVER_TIMING': DEBUG,   # exposes query counts and timings to every client
+    'ALLOWED_IPS': ['127.0.0.1'],
+}
+
+# Sampled slow/duplicate query reports (hotel_backend/query_inspector.py); aggregate with query_report
+QUERY_INSPECTOR = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 1.0,
+    'SLOW_MS': 100,
+    'DUPLICATE_THRESHOLD': 3,
+    'REPORT_PATH': os.path.join(BASE_DIR, 'logs', 'queries.jsonl'),
+}
+
+# Seconds an unpaid PENDING booking holds its room before expire_booking_holds cancels it
+BOOKING_HOLD_TTL = 15 * 60
+# A payment in flight keeps the hold if started less than this long ago, and at most this long past the TTL
+BOOKING_HOLD_PAYMENT_GRACE = 30 * 60
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -125,8 +188,11 @@ AUTH_USER_MODEL = 'bookings.User'
 # DRF Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'bookings.authentication.ClaimsJWTAuthentication',
     ),
+    # Keyset (cursor) pagination on every list endpoint, 20 rows per page
+    'DEFAULT_PAGINATION_CLASS': 'bookings.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 20,
 }
 
 # CORS Settings (Allow all for development)
@@ -155,4 +221,34 @@ SIMPLE_JWT = {
     "SIGNING_KEY": SECRET_KEY,
     "AUTH_HEADER_TYPES": ("Bearer",),
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
-}
\ No newline at end of file
+}
+
+# Claims-based JWT auth: loaded user rows are reused for USER_CACHE_TTL seconds (bookings/authentication.py)
+CLAIMS_AUTH = {
+    'USER_CACHE_SIZE': 1024,
+    'USER_CACHE_TTL': 30,
+}
+
+# Node SuperApp payment gateway client (see payment/gateway.py for defaults)
+PAYMENT_GATEWAY = {
+    "ORDER_URL": "http://localhost:3001/api/order",
+    "CONNECT_TIMEOUT": 2.0,
+    "READ_TIMEOUT": 10.0,
+    "MAX_CONCURRENCY": 20,
+    "FAILURE_THRESHOLD": 5,
+    "RESET_TIMEOUT": 30.0,
+}
+
+PAYMENT_OUTBOX = {
+    "BATCH_SIZE": 20,
+    "LEASE_SECONDS": 60,
+    "MAX_ATTEMPTS": 8,
+    "BACKOFF_BASE": 2.0,
+    "BACKOFF_MAX": 600.0,
+}
+
+PAYMENT_WEBHOOKS = {
+    "BATCH_MODE": False,
+    "BATCH_SIZE": 500,
+    "FLUSH_INTERVAL": 0.5,
+}
@@ -1,25 +1,32 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.views.generic import RedirectView
 from django.conf import settings
-from django.conf.urls.static import static
 from bookings import views
 from bookings.views import HotelDetailAPI
 
 from bookings.views import (
     HotelListAPI,
     HotelFilterAPI,
+    HotelSearchAPI,
     HotelDetailAPI,
     RoomDetailAPI,
     RoomListByUUIDAPI,        # ← updated name
     RoomBookedRangesAPI,
+    AvailabilityAPI,
+    QuoteAPI,
+    HotelReviewListAPI,
+    RoomReviewListCreateAPI,
     CreateBookingAPI,
     RegisterUserAPI,
     StayListAPI,
     StayDetailAPI,
+    CatalogCacheStatsAPI,
 )
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from bookings.auth import EmailTokenObtainPairView
+from hotel_backend.instrumentation import metrics_view
+from hotel_backend.media import serve_media
 
 urlpatterns = [
     path('', RedirectView.as_view(url='api/hotels/')),
@@ -29,6 +36,7 @@ urlpatterns = [
     # Hotels
     path('api/hotels/',        HotelListAPI.as_view(),      name='hotel-list'),
     path('api/hotels/filter/', HotelFilterAPI.as_view(),    name='hotel-filter'),
+    path('api/hotels/search/', HotelSearchAPI.as_view(),    name='hotel-search'),
     path('api/hotels/<int:pk>/', HotelDetailAPI.as_view(),  name='hotel-detail'),
 
     # Rooms
@@ -39,6 +47,8 @@ urlpatterns = [
     ),
 
     path('api/rooms/<int:room_id>/booked_ranges/', RoomBookedRangesAPI, name='room-booked-ranges'),
+    path('api/availability/', AvailabilityAPI.as_view(), name='availability'),
+    path('api/quotes/', QuoteAPI.as_view(), name='quotes'),
     path('api/hotels/<uuid:uid>/',     HotelDetailAPI.as_view(), name='hotel-detail-uuid'),
     path('api/hotels/<uuid:uid>/', HotelDetailAPI.as_view(), name='hotel-detail'),
 
@@ -51,6 +61,11 @@ urlpatterns = [
     path('api/hotels/<uuid:hotel_uid>/rooms/<uuid:room_uid>/',
          RoomDetailAPI.as_view(), name='room-detail'),
 
+    # Reviews
+    path('api/hotels/<uuid:hotel_uid>/reviews/', HotelReviewListAPI.as_view(), name='hotel-reviews'),
+    path('api/hotels/<uuid:hotel_uid>/rooms/<uuid:room_uid>/reviews/',
+         RoomReviewListCreateAPI.as_view(), name='room-reviews'),
+
     # Bookings
     path('api/bookings/',      CreateBookingAPI.as_view(),  name='create-booking'),
 
@@ -63,9 +78,13 @@ urlpatterns = [
     # Stays (all rooms / single room)
     path('api/stays/',         StayListAPI.as_view(),       name='stay-list'),
     path('api/stays/<uuid:uid>/', StayDetailAPI.as_view(), name='stay-detail'),
+
+    # Monitoring
+    path('api/cache/stats/', CatalogCacheStatsAPI.as_view(), name='catalog-cache-stats'),
+    path('metrics', metrics_view, name='metrics'),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Media (cache headers; bytes offloaded to the web server when MEDIA_SERVING['OFFLOAD'] is set)
+    re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.+)$", serve_media, name='media'),
+]
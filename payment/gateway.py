@@ -0,0 +1,150 @@
+"""
+HTTP client for the Node SuperApp payment gateway (API/service/server.js).
+
+One pooled keep-alive session per process, connect/read timeouts on every
+call, a cap on in-flight calls and a circuit breaker: when the gateway is
+slow or down, callers fail fast with GatewayUnavailable instead of piling
+up on the socket and exhausting workers.
+"""
+import threading
+import time
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+
+DEFAULTS = {
+    'ORDER_URL': 'http://localhost:3001/api/order',
+    'CONNECT_TIMEOUT': 2.0,     # seconds to establish the TCP connection
+    'READ_TIMEOUT': 10.0,       # seconds to wait for the response
+    'POOL_SIZE': 20,            # keep-alive connections kept per host
+    'MAX_CONCURRENCY': 20,      # in-flight calls allowed per process
+    'ACQUIRE_TIMEOUT': 1.0,     # seconds to wait for a free slot
+    'FAILURE_THRESHOLD': 5,     # consecutive failures that open the circuit
+    'RESET_TIMEOUT': 30.0,      # seconds the circuit stays open
+}
+
+
+class GatewayError(Exception):
+    """The gateway call failed (network error, timeout, bad response)."""
+
+
+class GatewayUnavailable(GatewayError):
+    """The call was not attempted: circuit open or too many calls in flight."""
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures. While open
+    every call is refused until `reset_timeout` has passed; then a single
+    trial call is let through (half-open) and its outcome closes or re-opens
+    the circuit.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def cancel(self):
+        """Hand back a permission from allow() that was not used."""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self.trial_in_flight = False
+
+
+class GatewayClient:
+    def __init__(self, **options):
+        self.options = {**DEFAULTS, **options}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.options['POOL_SIZE'], max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.slots = threading.BoundedSemaphore(self.options['MAX_CONCURRENCY'])
+        self.breaker = CircuitBreaker(self.options['FAILURE_THRESHOLD'], self.options['RESET_TIMEOUT'])
+
+    def create_order(self, payload):
+        """POST an order to the gateway and return its decoded JSON body."""
+        if not self.breaker.allow():
+            raise GatewayUnavailable("Payment gateway circuit is open")
+        if not self.slots.acquire(timeout=self.options['ACQUIRE_TIMEOUT']):
+            # Not the gateway's fault, so this is not counted as a failure.
+            self.breaker.cancel()
+            raise GatewayUnavailable("Too many payment gateway calls in flight")
+        try:
+            response = self.session.post(
+                self.options['ORDER_URL'],
+                json=payload,
+                timeout=(self.options['CONNECT_TIMEOUT'], self.options['READ_TIMEOUT']),
+            )
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as exc:
+            self.breaker.record_failure()
+            raise GatewayError(str(exc)) from exc
+        finally:
+            self.slots.release()
+        self.breaker.record_success()
+        return data
+
+    async def acreate_order(self, payload):
+        """create_order() off the event loop, for async views."""
+        return await sync_to_async(self.create_order, thread_sensitive=False)(payload)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_gateway_client():
+    """The process-wide client configured from settings.PAYMENT_GATEWAY."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GatewayClient(**getattr(settings, 'PAYMENT_GATEWAY', {}))
+    return _client
+
+
+@receiver(setting_changed)
+def reset_gateway_client(setting, **kwargs):
+    global _client
+    if setting == 'PAYMENT_GATEWAY':
+        _client = None
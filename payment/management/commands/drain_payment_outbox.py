@@ -0,0 +1,50 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from payment.outbox import drain
+
+
+def work(batch_size, poll_interval, once):
+    """One worker: drain batches until told to stop; returns rows processed."""
+    processed = 0
+    while True:
+        try:
+            claimed = drain(batch_size)
+        except OperationalError:
+            # e.g. SQLite "database is locked" while another worker commits.
+            time.sleep(poll_interval)
+            continue
+        processed += claimed
+        if not claimed:
+            if once:
+                return processed
+            time.sleep(poll_interval)
+
+
+class Command(BaseCommand):
+    help = "Deliver queued payment gateway orders (transactional outbox worker)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help="Worker processes to run")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Rows claimed per round trip (default PAYMENT_OUTBOX['BATCH_SIZE'])")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep when nothing is due")
+        parser.add_argument('--once', action='store_true', help="Exit once nothing is due instead of polling")
+
+    def handle(self, *args, **options):
+        job = (options['batch_size'], options['poll_interval'], options['once'])
+        processes = options['processes']
+        try:
+            if processes <= 1:
+                processed = work(*job)
+            else:
+                # Children must open their own database connections.
+                connections.close_all()
+                with multiprocessing.get_context('fork').Pool(processes) as pool:
+                    processed = sum(pool.starmap(work, [job] * processes))
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(f"Processed {processed} outbox row(s)")
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from payment.settlement import match_unlinked_payments, settle_bookings
+
+
+class Command(BaseCommand):
+    help = "Link unlinked payments to their bookings and complete bookings that are paid"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window-hours', type=float, default=24,
+                            help="Max hours between booking creation and its payment")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Payments linked per UPDATE")
+        parser.add_argument('--dry-run', action='store_true', help="Report matches without writing")
+
+    def handle(self, *args, **options):
+        linked = match_unlinked_payments(
+            window=timedelta(hours=options['window_hours']),
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            self.stdout.write(f"Would link {linked} payment(s)")
+            return
+        with transaction.atomic():
+            settled = settle_bookings()
+        self.stdout.write(f"Linked {linked} payment(s), completed {settled} booking(s)")
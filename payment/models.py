@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 from hotel_backend import settings
 
@@ -17,6 +18,8 @@ class Payment(models.Model):
     ]
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    booking = models.ForeignKey('bookings.Booking', on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='payments')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     gateway = models.CharField(max_length=20, choices=GATEWAY_CHOICES)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -25,3 +28,54 @@ class Payment(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.amount} - {self.status}"
+
+
+class PaymentOutbox(models.Model):
+    """
+    Gateway order waiting to be sent. Written in the same transaction as its
+    Payment and delivered by the drain_payment_outbox worker (see outbox.py).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    payment = models.OneToOneField(Payment, on_delete=models.CASCADE, related_name='outbox')
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    lease_token = models.UUIDField(null=True, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='outbox_status_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.payment.transaction_id} - {self.status}"
+
+
+class WebhookReceipt(models.Model):
+    """
+    One row per distinct gateway notification; the unique key makes a
+    retried (transaction_id, status) pair a no-op (see webhooks.py).
+    """
+    transaction_id = models.CharField(max_length=100)
+    status = models.CharField(max_length=20)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['transaction_id', 'status'], name='unique_webhook_receipt'),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_id} - {self.status}"
@@ -0,0 +1,136 @@
+"""
+Transactional outbox for payment gateway orders.
+
+InitiatePaymentView writes the Payment and a PaymentOutbox row in one
+transaction and returns; nothing is lost if the process dies before the
+gateway is reached. Workers (manage.py drain_payment_outbox) claim due rows
+in batches under a lease, call the gateway outside any transaction and
+record the outcome. Failed calls are retried with exponential backoff until
+MAX_ATTEMPTS, after which the payment is marked failed. The gateway gets the
+same transaction_id on every retry, so it can deduplicate a delivery whose
+response was lost.
+"""
+import random
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .gateway import GatewayError, GatewayUnavailable, get_gateway_client
+from .models import Payment, PaymentOutbox
+
+DEFAULTS = {
+    'BATCH_SIZE': 20,           # rows claimed per round trip
+    'LEASE_SECONDS': 60,        # a claim older than this is up for grabs again
+    'MAX_ATTEMPTS': 8,          # gateway calls before the payment is failed
+    'BACKOFF_BASE': 2.0,        # seconds before the first retry, doubled per attempt
+    'BACKOFF_MAX': 600.0,       # ceiling for a single retry delay
+}
+
+
+def outbox_options():
+    return {**DEFAULTS, **getattr(settings, 'PAYMENT_OUTBOX', {})}
+
+
+def backoff(attempts, options=None):
+    """Delay before retry number `attempts`, with jitter so retries don't re-synchronise."""
+    options = options or outbox_options()
+    delay = min(options['BACKOFF_MAX'], options['BACKOFF_BASE'] * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def enqueue_order(payment, payload):
+    """Queue the gateway order for `payment`; call inside the transaction that created it."""
+    return PaymentOutbox.objects.create(payment=payment, payload=payload)
+
+
+def claimable(now):
+    return PaymentOutbox.objects.filter(
+        Q(status='pending', available_at__lte=now) | Q(status='processing', locked_until__lte=now)
+    )
+
+
+def claim_batch(size=None, only=None):
+    """
+    Lease up to `size` due rows to the caller and return them.
+
+    Where the database supports it, candidates are locked with SKIP LOCKED
+    so concurrent workers pick disjoint rows without waiting. The claim
+    itself is a conditional UPDATE that re-checks the row is still due, so
+    on databases without row locks (SQLite) two workers never own the same
+    row either: the loser's UPDATE simply matches nothing.
+    """
+    options = outbox_options()
+    size = size or options['BATCH_SIZE']
+    now = timezone.now()
+    token = uuid.uuid4()
+    with transaction.atomic():
+        candidates = claimable(now).order_by('available_at', 'id')
+        if only is not None:
+            candidates = candidates.filter(pk__in=only)
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.values_list('id', flat=True)[:size])
+        if not ids:
+            return []
+        claimable(now).filter(id__in=ids).update(
+            status='processing',
+            lease_token=token,
+            locked_until=now + timedelta(seconds=options['LEASE_SECONDS']),
+            updated_at=now,
+        )
+    return list(PaymentOutbox.objects.filter(lease_token=token).select_related('payment'))
+
+
+def _release(entry, **fields):
+    # Only the current lease holder may record an outcome; a worker whose
+    # lease expired mid-call finds its row re-claimed and updates nothing.
+    return PaymentOutbox.objects.filter(pk=entry.pk, lease_token=entry.lease_token).update(
+        lease_token=None, locked_until=None, updated_at=timezone.now(), **fields
+    )
+
+
+def record_success(entry, response):
+    _release(entry, status='sent', attempts=entry.attempts + 1, response=response, last_error='')
+    return 'sent'
+
+
+def record_failure(entry, exc):
+    options = outbox_options()
+    now = timezone.now()
+    if isinstance(exc, GatewayUnavailable):
+        # Refused locally (circuit open / no free slot): the order was never
+        # sent, so reschedule without spending an attempt.
+        _release(entry, status='pending', available_at=now + backoff(1, options), last_error=str(exc))
+        return 'pending'
+
+    attempts = entry.attempts + 1
+    if attempts >= options['MAX_ATTEMPTS']:
+        with transaction.atomic():
+            if _release(entry, status='failed', attempts=attempts, last_error=str(exc)):
+                Payment.objects.filter(pk=entry.payment_id, status='pending').update(status='failed')
+        return 'failed'
+    _release(entry, status='pending', attempts=attempts,
+             available_at=now + backoff(attempts, options), last_error=str(exc))
+    return 'pending'
+
+
+def deliver(entry, client=None):
+    """Send one claimed row to the gateway and record the outcome."""
+    client = client or get_gateway_client()
+    try:
+        response = client.create_order(entry.payload)
+    except GatewayError as exc:
+        return record_failure(entry, exc)
+    return record_success(entry, response)
+
+
+def drain(batch_size=None, client=None):
+    """Deliver one claimed batch; returns how many rows were processed."""
+    entries = claim_batch(batch_size)
+    for entry in entries:
+        deliver(entry, client)
+    return len(entries)
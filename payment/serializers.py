@@ -1,5 +1,9 @@
+from decimal import Decimal
+
 from rest_framework import serializers
-from .models import  Payment
+
+from bookings.models import Booking
+from .models import  Payment, PaymentOutbox
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
@@ -8,4 +12,46 @@ class PaymentSerializer(serializers.ModelSerializer):
 
 class PaymentNotificationSerializer(serializers.Serializer):
     transaction_id = serializers.CharField()
-    status = serializers.ChoiceField(choices=['success', 'failed'])
\ No newline at end of file
+    status = serializers.ChoiceField(choices=['success', 'failed'])
+
+class PaymentVerifySerializer(serializers.Serializer):
+    payment_id = serializers.IntegerField()
+    success = serializers.BooleanField(default=False)
+
+class PaymentInitiateSerializer(serializers.Serializer):
+    """Expects the paying user as context['user']; a booking's payment is for exactly its total."""
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'), required=False)
+    gateway = serializers.ChoiceField(choices=Payment.GATEWAY_CHOICES, default='telebirr')
+    booking = serializers.SlugRelatedField(slug_field='uid', queryset=Booking.objects.all(), required=False)
+
+    def validate_booking(self, booking):
+        if booking.user_id != self.context['user'].id:
+            raise serializers.ValidationError("Booking not found.")
+        if booking.status != Booking.PENDING:
+            raise serializers.ValidationError("Booking is not awaiting payment.")
+        return booking
+
+    def validate(self, attrs):
+        booking = attrs.get('booking')
+        if booking is None:
+            if 'amount' not in attrs:
+                raise serializers.ValidationError({'amount': "This field is required."})
+        elif attrs.setdefault('amount', booking.total_price) != booking.total_price:
+            # The total is priced server-side (bookings/pricing.py); never trust another figure.
+            raise serializers.ValidationError({'amount': f"Must equal the booking total, {booking.total_price}."})
+        return attrs
+
+
+class PaymentOutboxSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PaymentOutbox
+        fields = ['status', 'attempts', 'available_at', 'last_error', 'response']
+
+
+class PaymentStatusSerializer(serializers.ModelSerializer):
+    booking = serializers.SlugRelatedField(slug_field='uid', read_only=True)
+    delivery = PaymentOutboxSerializer(source='outbox', read_only=True)
+
+    class Meta:
+        model = Payment
+        fields = ['id', 'booking', 'amount', 'gateway', 'status', 'transaction_id', 'created_at', 'delivery']
@@ -0,0 +1,65 @@
+"""
+Booking settlement: a successful payment completes its booking.
+
+settle_bookings() is one UPDATE over bookings joined to their successful
+payments and is meant to run inside the transaction that marked the
+payments successful, so a payment is never 'success' while its booking is
+still pending. match_unlinked_payments() links payments created without a
+booking (older clients) to the booking they pay for, in bulk.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+
+from bookings.models import Booking
+
+from .models import Payment
+
+
+def settle_bookings(transaction_ids=None):
+    """
+    Complete pending bookings that have a successful payment covering their
+    total, limited to `transaction_ids` when given. Returns the number of
+    bookings completed.
+    """
+    # One filter() call, so every condition applies to the same payment row.
+    paid = {'payments__status': 'success', 'payments__amount__gte': F('total_price')}
+    if transaction_ids is not None:
+        paid['payments__transaction_id__in'] = transaction_ids
+    return Booking.objects.filter(status=Booking.PENDING, **paid).update(status=Booking.COMPLETED, hold_expires_at=None)
+
+
+def match_unlinked_payments(window=timedelta(hours=24), batch_size=1000, dry_run=False):
+    """
+    Link pending/successful payments that have no booking to a pending,
+    unpaid booking of the same user for exactly the same amount, created at
+    most `window` before the payment. Only unambiguous pairs are linked:
+    the payment must have one candidate booking and the booking one
+    candidate payment. Returns the number of payments linked.
+
+    Two reads and one bulk UPDATE per batch_size links, whatever the volume.
+    """
+    payments = Payment.objects.filter(booking__isnull=True, status__in=['pending', 'success']).values_list(
+        'id', 'user_id', 'amount', 'created_at')
+    bookings = Booking.objects.filter(status=Booking.PENDING, payments__isnull=True).values_list(
+        'id', 'user_id', 'total_price', 'created_at')
+
+    candidates = defaultdict(list)
+    for booking_id, user_id, total_price, created_at in bookings.iterator():
+        candidates[user_id, total_price].append((booking_id, created_at))
+
+    claims = defaultdict(list)
+    for payment_id, user_id, amount, created_at in payments.iterator():
+        matches = [booking_id for booking_id, booked_at in candidates.get((user_id, amount), ())
+                   if booked_at <= created_at <= booked_at + window]
+        if len(matches) == 1:
+            claims[matches[0]].append(payment_id)
+
+    links = [Payment(id=payment_ids[0], booking_id=booking_id)
+             for booking_id, payment_ids in claims.items() if len(payment_ids) == 1]
+    if not dry_run:
+        with transaction.atomic():
+            Payment.objects.bulk_update(links, ['booking'], batch_size=batch_size)
+    return len(links)
@@ -1,3 +1,532 @@
-from django.test import TestCase
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from bookings.auth import EmailTokenObtainPairSerializer
+from bookings.holds import expire_holds
+from bookings.models import Booking, User
+from bookings.tests import make_hotel, make_room
+from .gateway import CircuitBreaker, GatewayClient, GatewayError, GatewayUnavailable
+from .models import Payment, PaymentOutbox, WebhookReceipt
+from .outbox import backoff, claim_batch, drain, record_success
+from .settlement import settle_bookings
+from .webhooks import apply_notifications, webhook_buffer
+
+
+class StubGateway:
+    """
+    Local stand-in for the Node SuperApp order endpoint. `mode` switches
+    between 'ok', 'error' (HTTP 500) and 'slow' (sleeps past the read timeout).
+    """
+
+    def __init__(self):
+        self.mode = 'ok'
+        self.delay = 0.5
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                stub.requests.append((body, self.client_address))
+                if stub.mode == 'slow':
+                    time.sleep(stub.delay)
+                status = 500 if stub.mode == 'error' else 200
+                payload = json.dumps({'checkout_url': f"https://pay.example/{body['transaction_id']}"}).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client already gave up (read timeout)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/api/order'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class GatewayTestCase(TestCase):
+    def setUp(self):
+        self.stub = StubGateway()
+        self.addCleanup(self.stub.close)
+        self.settings_override = override_settings(PAYMENT_GATEWAY={
+            'ORDER_URL': self.stub.url,
+            'READ_TIMEOUT': 0.2,
+            'FAILURE_THRESHOLD': 2,
+            'RESET_TIMEOUT': 60,
+        })
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.user = User.objects.create_user(email="payer@example.com", username="payer", password="pass12345")
+
+
+class GatewayClientTests(GatewayTestCase):
+    def client_for(self, **options):
+        return GatewayClient(ORDER_URL=self.stub.url, READ_TIMEOUT=0.2, **options)
+
+    def test_reuses_keep_alive_connection(self):
+        client = self.client_for()
+        for i in range(3):
+            client.create_order({'transaction_id': str(i)})
+        ports = {address[1] for _, address in self.stub.requests}
+        self.assertEqual(len(ports), 1)
+
+    def test_read_timeout_bounds_slow_gateway(self):
+        self.stub.mode = 'slow'
+        started = time.monotonic()
+        with self.assertRaises(GatewayError):
+            self.client_for().create_order({'transaction_id': 'slow'})
+        self.assertLess(time.monotonic() - started, self.stub.delay)
+
+    def test_circuit_opens_and_fails_fast(self):
+        client = self.client_for(FAILURE_THRESHOLD=2)
+        self.stub.mode = 'error'
+        for _ in range(2):
+            with self.assertRaises(GatewayError):
+                client.create_order({'transaction_id': 'x'})
+        with self.assertRaises(GatewayUnavailable):
+            client.create_order({'transaction_id': 'x'})
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_concurrency_cap(self):
+        client = self.client_for(MAX_CONCURRENCY=1, ACQUIRE_TIMEOUT=0.01)
+        self.stub.mode, self.stub.delay = 'slow', 0.1
+        client.options['READ_TIMEOUT'] = 1
+        worker = threading.Thread(target=client.create_order, args=({'transaction_id': 'first'},))
+        worker.start()
+        time.sleep(0.03)
+        with self.assertRaises(GatewayUnavailable):
+            client.create_order({'transaction_id': 'second'})
+        worker.join()
+
+
+class CircuitBreakerTests(TestCase):
+    def test_half_open_trial(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        now[0] = 10
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # only one trial at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        now[0] = 20
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+
+
+class InitiatePaymentTests(GatewayTestCase):
+    def test_sync_view_queues_without_calling_gateway(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(reverse('payment-initiate'), {'amount': '150.00'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        payment = Payment.objects.get(transaction_id=response.data['transaction_id'])
+        self.assertEqual(payment.outbox.status, 'pending')
+        self.assertEqual(payment.outbox.payload['transaction_id'], payment.transaction_id)
+        self.assertEqual(self.stub.requests, [])
+
+    def test_sync_view_validates_amount(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(reverse('payment-initiate'), {'amount': 'lots'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Payment.objects.exists())
+
+    async def test_async_view(self):
+        token = await self.async_token()
+        response = await self.async_client.post(
+            reverse('payment-initiate-async'), {'amount': '99.50', 'gateway': 'cbebirr'},
+            content_type='application/json', headers={'Authorization': f'Bearer {token}'},
+        )
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertTrue(body['gateway_response']['checkout_url'].endswith(body['transaction_id']))
+        payment = await Payment.objects.aget(id=body['payment_id'])
+        self.assertEqual(payment.gateway, 'cbebirr')
+
+    async def test_async_view_leaves_failed_delivery_queued(self):
+        self.stub.mode = 'error'
+        token = await self.async_token()
+        response = await self.async_client.post(
+            reverse('payment-initiate-async'), {'amount': '10'},
+            content_type='application/json', headers={'Authorization': f'Bearer {token}'},
+        )
+        self.assertEqual(response.status_code, 202)
+        outbox = await PaymentOutbox.objects.aget(payment_id=response.json()['payment_id'])
+        self.assertEqual((outbox.status, outbox.attempts), ('pending', 1))
+
+    def test_async_view_trusts_token_claims(self):
+        token = EmailTokenObtainPairSerializer.get_token(self.user).access_token
+        with CaptureQueriesContext(connection) as queries:
+            response = async_to_sync(self.async_client.post)(
+                reverse('payment-initiate-async'), {'amount': '10'},
+                content_type='application/json', headers={'Authorization': f'Bearer {token}'},
+            )
+        self.assertIn(response.status_code, (201, 202))
+        self.assertFalse([q for q in queries if 'FROM "bookings_user"' in q['sql']])
+
+    async def test_async_view_requires_token(self):
+        response = await self.async_client.post(reverse('payment-initiate-async'), {}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    async def async_token(self):
+        return str(AccessToken.for_user(self.user))
+
+
+@override_settings(PAYMENT_OUTBOX={'MAX_ATTEMPTS': 3, 'BACKOFF_BASE': 1})
+class PaymentOutboxTests(GatewayTestCase):
+    def queue(self, count=1):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        ids = [client.post(reverse('payment-initiate'), {'amount': '20'}, format='json').data['payment_id']
+               for _ in range(count)]
+        return ids if count > 1 else ids[0]
+
+    def make_due(self):
+        PaymentOutbox.objects.update(available_at=timezone.now())
+
+    def test_drain_delivers_and_status_endpoint_reports_it(self):
+        payment_id = self.queue()
+        self.assertEqual(drain(), 1)
+        self.assertEqual(drain(), 0)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        data = client.get(reverse('payment-status', args=[payment_id])).data
+        self.assertEqual(data['status'], 'pending')  # settled later by the webhook
+        self.assertEqual(data['delivery']['status'], 'sent')
+        self.assertEqual(data['delivery']['response']['checkout_url'],
+                         f"https://pay.example/{data['transaction_id']}")
+
+    def test_status_endpoint_is_owner_only(self):
+        payment_id = self.queue()
+        other = User.objects.create_user(email="other@example.com", username="other", password="pass12345")
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(client.get(reverse('payment-status', args=[payment_id])).status_code, 404)
+
+    def test_failures_back_off_then_fail_payment(self):
+        payment_id = self.queue()
+        self.stub.mode = 'error'
+        with override_settings(PAYMENT_GATEWAY={'ORDER_URL': self.stub.url, 'FAILURE_THRESHOLD': 100}):
+            drain()
+            outbox = PaymentOutbox.objects.get(payment_id=payment_id)
+            self.assertEqual((outbox.status, outbox.attempts), ('pending', 1))
+            self.assertGreater(outbox.available_at, timezone.now())
+            self.assertTrue(outbox.last_error)
+            self.assertEqual(drain(), 0)  # not due yet
+
+            for _ in range(2):
+                self.make_due()
+                drain()
+        outbox.refresh_from_db()
+        self.assertEqual((outbox.status, outbox.attempts), ('failed', 3))
+        self.assertEqual(Payment.objects.get(pk=payment_id).status, 'failed')
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_open_circuit_reschedules_without_spending_attempts(self):
+        self.queue(3)
+        self.stub.mode = 'error'
+        drain()  # two failures open the circuit, the third call is refused locally
+        attempts = sorted(PaymentOutbox.objects.values_list('attempts', flat=True))
+        self.assertEqual(attempts, [0, 1, 1])
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_backoff_grows_exponentially(self):
+        options = {'BACKOFF_BASE': 2, 'BACKOFF_MAX': 60}
+        for attempts, ceiling in [(1, 2), (3, 8), (10, 60)]:
+            delay = backoff(attempts, options).total_seconds()
+            self.assertTrue(ceiling / 2 <= delay <= ceiling)
+
+    def test_claims_are_disjoint_and_leases_expire(self):
+        self.queue(3)
+        first, second = claim_batch(2), claim_batch(2)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertEqual(claim_batch(), [])
+
+        PaymentOutbox.objects.filter(pk=first[0].pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        reclaimed = claim_batch()
+        self.assertEqual([entry.pk for entry in reclaimed], [first[0].pk])
+        # The original holder lost its lease and can no longer record an outcome.
+        record_success(first[0], {'late': True})
+        self.assertEqual(PaymentOutbox.objects.get(pk=first[0].pk).status, 'processing')
+
+    def test_drain_command(self):
+        self.queue(3)
+        out = StringIO()
+        call_command('drain_payment_outbox', '--once', '--batch-size', '2', stdout=out)
+        self.assertIn('Processed 3', out.getvalue())
+        self.assertEqual(PaymentOutbox.objects.filter(status='sent').count(), 3)
+
+
+class WebhookIngestionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="payer@example.com", username="payer", password="pass12345")
+        self.client = APIClient()
+
+    def make_payments(self, count):
+        Payment.objects.bulk_create([
+            Payment(user=self.user, amount='10.00', gateway='telebirr', transaction_id=f'txn-{i}')
+            for i in range(count)
+        ])
+        return [f'txn-{i}' for i in range(count)]
+
+    def notify(self, transaction_id, status):
+        return self.client.post(reverse('payment-webhook'),
+                                {'transaction_id': transaction_id, 'status': status}, format='json')
+
+    def test_retries_are_idempotent(self):
+        self.make_payments(1)
+        self.assertEqual(self.notify('txn-0', 'success').data, {'status': 'updated'})
+        self.assertEqual(self.notify('txn-0', 'success').data, {'status': 'duplicate'})
+        # A contradicting late notification cannot rewrite a settled payment.
+        self.assertEqual(self.notify('txn-0', 'failed').data, {'status': 'ignored'})
+        self.assertEqual(Payment.objects.get().status, 'success')
+        self.assertEqual(WebhookReceipt.objects.count(), 2)
+
+    def test_unknown_transaction_leaves_no_receipt(self):
+        self.assertEqual(self.notify('missing', 'success').status_code, 404)
+        self.assertFalse(WebhookReceipt.objects.exists())
+
+    def test_duplicate_costs_no_payment_write(self):
+        self.make_payments(1)
+        self.notify('txn-0', 'success')
+        with CaptureQueriesContext(connection) as queries:
+            self.notify('txn-0', 'success')
+        self.assertFalse([q for q in queries if 'payment_payment' in q['sql']])
+
+    def test_replay_load(self):
+        """Replay a retry storm: every payment notified 4-6 times, some with both outcomes."""
+        ids = self.make_payments(400)
+        storm = []
+        for round_ in range(5):
+            for i, transaction_id in enumerate(ids):
+                storm.append((transaction_id, 'failed' if i % 7 == 0 else 'success'))
+                if i % 11 == 0 and round_ == 2:
+                    storm.append((transaction_id, 'failed'))
+        random.Random(13).shuffle(storm)
+        storm.append(('txn-unknown', 'success'))
+        expected = {}
+        for transaction_id, status in storm:
+            expected.setdefault(transaction_id, status)
+
+        with override_settings(PAYMENT_WEBHOOKS={'BATCH_MODE': True, 'BATCH_SIZE': 500, 'FLUSH_INTERVAL': 60}):
+            with CaptureQueriesContext(connection) as queries:
+                for transaction_id, status in storm:
+                    self.assertEqual(self.notify(transaction_id, status).status_code, 202)
+                webhook_buffer.flush()
+        self.assertEqual(len(webhook_buffer), 0)
+
+        final = dict(Payment.objects.values_list('transaction_id', 'status'))
+        self.assertEqual(final, {t: s for t, s in expected.items() if t in final})
+        receipts = set(WebhookReceipt.objects.values_list('transaction_id', 'status'))
+        self.assertEqual(receipts, set(storm) - {('txn-unknown', 'success')})
+        # Each 500-notification flush is a fixed handful of set-based statements.
+        batches = -(-len(storm) // 500)
+        self.assertLessEqual(len(queries), batches * 8)
+
+    def test_batch_keeps_first_status_per_transaction(self):
+        self.make_payments(2)
+        outcome = apply_notifications([
+            ('txn-0', 'success'), ('txn-0', 'failed'), ('txn-0', 'success'), ('txn-1', 'failed'), ('nope', 'failed'),
+        ])
+        self.assertEqual(outcome, {'applied': 2, 'ignored': 1, 'duplicate': 1, 'unknown': 1})
+        self.assertEqual(dict(Payment.objects.values_list('transaction_id', 'status')),
+                         {'txn-0': 'success', 'txn-1': 'failed'})
+
+
+class SettlementTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="payer@example.com", username="payer", password="pass12345")
+        self.hotel = make_hotel()
+        self.room = make_room(self.hotel)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def book(self, nights_from=1, total='160.00', user=None, room=None):
+        check_in = date.today() + timedelta(days=nights_from)
+        return Booking.objects.create(hotel=self.hotel, user=user or self.user, room=room or self.room,
+                                      check_in=check_in, check_out=check_in + timedelta(days=2), total_price=total)
+
+    def test_initiate_links_booking_and_defaults_amount(self):
+        booking = self.book()
+        response = self.client.post(reverse('payment-initiate'), {'booking': str(booking.uid)}, format='json')
+        self.assertEqual(response.status_code, 202)
+        payment = Payment.objects.get(pk=response.data['payment_id'])
+        self.assertEqual((payment.booking, payment.amount), (booking, Decimal('160.00')))
+
+    def test_initiate_rejects_amount_other_than_booking_total(self):
+        booking = self.book()
+        for amount in ('0.01', '0.00', '999.00'):
+            response = self.client.post(reverse('payment-initiate'), {'booking': str(booking.uid), 'amount': amount},
+                                        format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('amount', response.data)
+        response = self.client.post(reverse('payment-initiate'), {'booking': str(booking.uid), 'amount': '160.00'},
+                                    format='json')
+        self.assertEqual(response.status_code, 202)
+
+    def test_underpaid_booking_is_not_completed(self):
+        booking = self.book()
+        Payment.objects.create(user=self.user, booking=booking, amount='0.01', gateway='telebirr',
+                               transaction_id='txn-cheap')
+        APIClient().post(reverse('payment-webhook'), {'transaction_id': 'txn-cheap', 'status': 'success'},
+                         format='json')
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, Booking.PENDING)
+        self.assertEqual(settle_bookings(), 0)
+
+    def test_hold_outlives_payment_in_flight(self):
+        booking = self.book()
+        payment = Payment.objects.create(user=self.user, booking=booking, amount='160.00', gateway='telebirr',
+                                         transaction_id='txn-slow')
+        later = timezone.now() + timedelta(seconds=settings.BOOKING_HOLD_TTL + 60)
+        self.assertEqual(expire_holds(now=later)['cancelled'], 0)
+
+        APIClient().post(reverse('payment-webhook'), {'transaction_id': 'txn-slow', 'status': 'success'},
+                         format='json')
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, Booking.COMPLETED)
+        self.assertEqual(booking.room_nights.count(), 2)
+
+        other = self.book(nights_from=5)
+        Payment.objects.create(user=self.user, booking=other, amount='160.00', gateway='telebirr',
+                               transaction_id='txn-failed', status='failed')
+        self.assertEqual(expire_holds(now=later)['cancelled'], 1)
+        other.refresh_from_db()
+        self.assertEqual(other.status, Booking.CANCELLED)
+
+    def test_abandoned_payment_does_not_pin_the_hold(self):
+        booking = self.book()
+        Payment.objects.create(user=self.user, booking=booking, amount='160.00', gateway='telebirr',
+                               transaction_id='txn-abandoned')
+        expiry = booking.hold_expires_at
+        grace = timedelta(seconds=settings.BOOKING_HOLD_PAYMENT_GRACE)
+        self.assertEqual(expire_holds(now=expiry + timedelta(seconds=1))['cancelled'], 0)
+        # Still pending once the payment is older than the grace: the hold lapses.
+        self.assertEqual(expire_holds(now=timezone.now() + grace + timedelta(seconds=1))['cancelled'], 1)
+        booking.refresh_from_db()
+        self.assertEqual((booking.status, booking.room_nights.count()), (Booking.CANCELLED, 0))
+
+    def test_payments_cannot_extend_a_hold_past_the_grace(self):
+        booking = self.book()
+        grace = timedelta(seconds=settings.BOOKING_HOLD_PAYMENT_GRACE)
+        late = booking.hold_expires_at + grace
+        # A fresh payment started at the last moment does not buy another grace period.
+        payment = Payment.objects.create(user=self.user, booking=booking, amount='160.00', gateway='telebirr',
+                                         transaction_id='txn-late')
+        Payment.objects.filter(pk=payment.pk).update(created_at=late - timedelta(seconds=1))
+        self.assertEqual(expire_holds(now=late)['cancelled'], 1)
+
+    def test_initiate_rejects_someone_elses_booking(self):
+        other = User.objects.create_user(email="other@example.com", username="other", password="pass12345")
+        booking = self.book(user=other)
+        response = self.client.post(reverse('payment-initiate'), {'booking': str(booking.uid)}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('booking', response.data)
+
+    def test_webhook_success_completes_booking_in_one_update(self):
+        booking = self.book()
+        Payment.objects.create(user=self.user, booking=booking, amount='160.00', gateway='telebirr',
+                               transaction_id='txn-1')
+        with CaptureQueriesContext(connection) as queries:
+            APIClient().post(reverse('payment-webhook'), {'transaction_id': 'txn-1', 'status': 'success'},
+                             format='json')
+        booking_writes = [q for q in queries if q['sql'].startswith('UPDATE "bookings_booking"')]
+        self.assertEqual(len(booking_writes), 1)
+        booking.refresh_from_db()
+        self.assertEqual((booking.status, booking.hold_expires_at), (Booking.COMPLETED, None))
+
+    def test_failed_payment_leaves_booking_pending(self):
+        booking = self.book()
+        payment = Payment.objects.create(user=self.user, booking=booking, amount='160.00', gateway='telebirr',
+                                         transaction_id='txn-1')
+        self.client.post(reverse('payment-verify'), {'payment_id': payment.id, 'success': False}, format='json')
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, Booking.PENDING)
+        # A failed payment is settled: verifying it again cannot complete the booking.
+        response = self.client.post(reverse('payment-verify'), {'payment_id': payment.id, 'success': True},
+                                    format='json')
+        self.assertEqual(response.data, {'status': 'failed'})
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, Booking.PENDING)
+
+    def test_verify_parses_form_encoded_false(self):
+        booking = self.book()
+        payment = Payment.objects.create(user=self.user, booking=booking, amount='160.00', gateway='telebirr',
+                                         transaction_id='txn-1')
+        response = self.client.post(reverse('payment-verify'), {'payment_id': payment.id, 'success': 'false'})
+        self.assertEqual(response.data, {'status': 'failed'})
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, Booking.PENDING)
+
+    def test_verify_success_completes_booking_once(self):
+        booking = self.book()
+        payment = Payment.objects.create(user=self.user, booking=booking, amount='160.00', gateway='telebirr',
+                                         transaction_id='txn-1')
+        self.client.post(reverse('payment-verify'), {'payment_id': payment.id, 'success': True}, format='json')
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, Booking.COMPLETED)
+        self.assertTrue(WebhookReceipt.objects.filter(transaction_id='txn-1', status='success').exists())
+        response = self.client.post(reverse('payment-verify'), {'payment_id': payment.id, 'success': False},
+                                    format='json')
+        self.assertEqual(response.data, {'status': 'success'})
+
+    def test_reconcile_links_unambiguous_pairs_in_bulk(self):
+        rooms = [make_room(self.hotel, name=f"Room {i}") for i in range(300)]
+        users = [User.objects.create_user(email=f"g{i}@example.com", username=f"g{i}", password="x")
+                 for i in range(3)]
+        bookings = [self.book(user=users[i % 3], room=room, total=f'{100 + i}.00') for i, room in enumerate(rooms)]
+        # Same user and amount as bookings[0]: its payment is ambiguous and must be left alone.
+        twin = self.book(nights_from=10, total='100.00', user=users[0], room=rooms[1])
+        Payment.objects.bulk_create([
+            Payment(user=b.user, amount=b.total_price, gateway='telebirr', transaction_id=f'txn-{b.id}',
+                    status='success' if i % 2 else 'pending')
+            for i, b in enumerate(bookings)
+        ])
+        # Paid before the booking existed: outside the window.
+        Payment.objects.filter(transaction_id=f'txn-{bookings[3].id}').update(
+            created_at=bookings[3].created_at - timedelta(hours=1))
+
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('reconcile_payments', stdout=out)
+        self.assertIn('Linked 298 payment(s), completed 149 booking(s)', out.getvalue())
+        self.assertLess(len(queries), 10)
+        self.assertIsNone(Payment.objects.get(transaction_id=f'txn-{bookings[0].id}').booking)
+        self.assertEqual(Payment.objects.get(transaction_id=f'txn-{bookings[5].id}').booking, bookings[5])
+        twin.refresh_from_db()
+        self.assertEqual(twin.status, Booking.PENDING)
+        self.assertEqual(Booking.objects.filter(status=Booking.COMPLETED, payments__status='success').count(), 149)
@@ -1,8 +1,12 @@
 from django.urls import path
-from .views import InitiatePaymentView, VerifyPaymentView, WebhookPaymentNotificationView
+from .views import (
+    InitiatePaymentView, AsyncInitiatePaymentView, PaymentStatusView, VerifyPaymentView, WebhookPaymentNotificationView,
+)
 
 urlpatterns = [
     path('initiate/', InitiatePaymentView.as_view(), name='payment-initiate'),
+    path('initiate/async/', AsyncInitiatePaymentView.as_view(), name='payment-initiate-async'),
+    path('<int:pk>/', PaymentStatusView.as_view(), name='payment-status'),
     path('verify/', VerifyPaymentView.as_view(), name='payment-verify'),
     path('webhook/', WebhookPaymentNotificationView.as_view(), name='payment-webhook'),  # NEW
 ]
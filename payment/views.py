@@ -1,77 +1,180 @@
 from django.shortcuts import render
+from django.http import JsonResponse
+from django.views import View
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.urls import reverse
 from .serializers import PaymentNotificationSerializer
 from .models import Payment
-from .serializers import PaymentSerializer
+from .serializers import PaymentSerializer, PaymentInitiateSerializer, PaymentStatusSerializer, PaymentVerifySerializer
+from .gateway import GatewayError, get_gateway_client
+from .outbox import claim_batch, enqueue_order, record_failure, record_success
+from .webhooks import apply_notification, webhook_buffer, webhook_options
 from django.utils.decorators import method_decorator
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from django.views.decorators.csrf import csrf_exempt
-import requests
+import json
 import uuid
 
 
-@method_decorator(csrf_exempt, name='dispatch')
-class InitiatePaymentView(generics.CreateAPIView):
-    serializer_class = PaymentSerializer
-    permission_classes = [permissions.IsAuthenticated]
+def order_payload(amount, transaction_id):
+    return {
+        "title": "Payment from Django",
+        "amount": amount,
+        "transaction_id": transaction_id
+    }
 
-    def post(self, request, *args, **kwargs):
-        amount = request.data.get('amount')
-        gateway = request.data.get('gateway', 'telebirr')  # default fallback
-        transaction_id = str(uuid.uuid4())
 
-        # 1. Call Node.js SuperApp API
-        try:
-            response = requests.post("http://localhost:3001/api/order", json={
-                "title": "Payment from Django",
-                "amount": amount,
-                "transaction_id": transaction_id
-            })
-            response.raise_for_status()
-            superapp_response = response.json()
-        except Exception as e:
-            return Response({"error": "Payment gateway error", "details": str(e)}, status=502)
-
-        # 2. Save locally
+def queued_response(payment, request):
+    return {
+        "status": "queued",
+        "payment_id": payment.id,
+        "transaction_id": payment.transaction_id,
+        "status_url": request.build_absolute_uri(reverse('payment-status', args=[payment.id])),
+    }
+
+
+async def authenticate(request):
+    """The user of the first of DEFAULT_AUTHENTICATION_CLASSES to accept the request, or None."""
+    for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        authenticated = await sync_to_async(authenticator().authenticate)(request)
+        if authenticated is not None:
+            return authenticated[0]
+    return None
+
+
+def create_queued_payment(user, amount, gateway, booking=None):
+    """Payment plus its outbox row, committed together (see outbox.py)."""
+    transaction_id = str(uuid.uuid4())
+    with transaction.atomic():
         payment = Payment.objects.create(
-            user=request.user,
+            user=user,
+            booking=booking,
             amount=amount,
             gateway=gateway,
             status='pending',
             transaction_id=transaction_id
         )
-
-        return Response({
-            "status": "initiated",
-            "payment_id": payment.id,
-            "transaction_id": transaction_id,
-            "gateway_response": superapp_response
-        }, status=status.HTTP_201_CREATED)
+        outbox = enqueue_order(payment, order_payload(str(payment.amount), transaction_id))
+    return payment, outbox
 
 
 @method_decorator(csrf_exempt, name='dispatch')
-class VerifyPaymentView(generics.GenericAPIView):
+class InitiatePaymentView(generics.CreateAPIView):
+    """
+    POST /payment/initiate/
+    Records the payment and queues the gateway order; the drain_payment_outbox
+    worker talks to the gateway. Poll status_url for the gateway response.
+    """
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        payment_id = request.data.get('payment_id')
-        success = request.data.get('success', False)
+        serializer = PaymentInitiateSerializer(data=request.data, context={'user': request.user})
+        serializer.is_valid(raise_exception=True)
+        payment, _ = create_queued_payment(request.user, **serializer.validated_data)
+        return Response(queued_response(payment, request), status=status.HTTP_202_ACCEPTED)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncInitiatePaymentView(View):
+    """
+    POST /payment/initiate/async/
+    Queues the order like InitiatePaymentView, then tries to deliver it in
+    the request: the gateway call is awaited, so a slow gateway parks a
+    coroutine instead of pinning a worker. If delivery fails the order stays
+    queued for the worker and the response is the same 202 as the sync view.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            user = await authenticate(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({"detail": str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+        if user is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."},
+                                status=status.HTTP_401_UNAUTHORIZED)
+
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({"detail": "Malformed JSON body."}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = PaymentInitiateSerializer(data=data, context={'user': user})
+        if not await sync_to_async(serializer.is_valid)():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        payment, outbox = await sync_to_async(create_queued_payment)(user, **serializer.validated_data)
+
+        # Claim our own row so a worker polling at the same moment can't send it twice.
+        claimed = await sync_to_async(claim_batch)(1, only=[outbox.pk])
+        if claimed:
+            entry = claimed[0]
+            try:
+                superapp_response = await get_gateway_client().acreate_order(entry.payload)
+            except GatewayError as e:
+                await sync_to_async(record_failure)(entry, e)
+            else:
+                await sync_to_async(record_success)(entry, superapp_response)
+                return JsonResponse({
+                    "status": "initiated",
+                    "payment_id": payment.id,
+                    "transaction_id": payment.transaction_id,
+                    "gateway_response": superapp_response
+                }, status=status.HTTP_201_CREATED)
+
+        return JsonResponse(queued_response(payment, request), status=status.HTTP_202_ACCEPTED)
+
+
+class PaymentStatusView(generics.RetrieveAPIView):
+    """
+    GET /payment/<id>/
+    The payment and the state of its queued gateway order, including the
+    gateway's response once it has been delivered.
+    """
+    serializer_class = PaymentStatusSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Payment.objects.filter(user=self.request.user).select_related('outbox', 'booking')
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class VerifyPaymentView(generics.GenericAPIView):
+    """
+    POST /payment/verify/ {"payment_id": …, "success": true|false}
+    Goes through apply_notification like the webhook: only a pending payment
+    moves, once, and a settled one is reported as it stands.
+    """
+    serializer_class = PaymentVerifySerializer
+    permission_classes = [permissions.IsAuthenticated]
 
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
         try:
-            payment = Payment.objects.get(id=payment_id, user=request.user)
+            payment = Payment.objects.get(id=serializer.validated_data['payment_id'], user=request.user)
         except Payment.DoesNotExist:
             return Response({'error': 'Payment not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        payment.status = 'success' if success else 'failed'
-        payment.save()
+        apply_notification(payment.transaction_id, 'success' if serializer.validated_data['success'] else 'failed')
+        payment.refresh_from_db(fields=['status'])
         return Response({'status': payment.status})
 
 
 @method_decorator(csrf_exempt, name='dispatch')
 class WebhookPaymentNotificationView(generics.GenericAPIView):
+    """
+    POST /payment/webhook/
+    Idempotent: a repeated (transaction_id, status) pair or a notification
+    for an already settled payment is acknowledged without writing. In
+    batch mode notifications are acknowledged with 202 and applied in bulk
+    (see webhooks.py).
+    """
     permission_classes = []
     serializer_class = PaymentNotificationSerializer
 
@@ -83,11 +186,11 @@ class WebhookPaymentNotificationView(generics.GenericAPIView):
         transaction_id = serializer.validated_data['transaction_id']
         new_status = serializer.validated_data['status']
 
-        try:
-            payment = Payment.objects.get(transaction_id=transaction_id)
-        except Payment.DoesNotExist:
-            return Response({'error': 'Transaction not found'}, status=status.HTTP_404_NOT_FOUND)
+        if webhook_options()['BATCH_MODE']:
+            webhook_buffer.add(transaction_id, new_status)
+            return Response({'status': 'accepted'}, status=status.HTTP_202_ACCEPTED)
 
-        payment.status = new_status
-        payment.save()
-        return Response({'status': 'updated'}, status=status.HTTP_200_OK)
+        outcome = apply_notification(transaction_id, new_status)
+        if outcome == 'unknown':
+            return Response({'error': 'Transaction not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'status': 'updated' if outcome == 'applied' else outcome}, status=status.HTTP_200_OK)
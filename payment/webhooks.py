@@ -0,0 +1,157 @@
+"""
+Idempotent ingestion of gateway payment notifications.
+
+Gateways retry aggressively, so the same (transaction_id, status) pair can
+arrive many times. Each distinct pair is recorded once in WebhookReceipt and
+applied with a conditional UPDATE that only moves a payment out of
+'pending': replays, late duplicates and contradicting retries never rewrite
+a settled payment. A successful payment completes its booking in the same
+transaction (settlement.py).
+
+With PAYMENT_WEBHOOKS['BATCH_MODE'] the view acknowledges immediately and
+the process-wide buffer applies notifications in bulk, either when
+BATCH_SIZE are waiting or FLUSH_INTERVAL after the first one. A batch is a
+handful of set-based queries however many notifications it carries, which
+keeps SQLite's single writer lock short during retry storms. The trade-off:
+notifications acknowledged but still buffered are lost if the process dies,
+so only enable it where the gateway offers reconciliation.
+"""
+import atexit
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+
+from .models import Payment, WebhookReceipt
+from .settlement import settle_bookings
+
+DEFAULTS = {
+    'BATCH_MODE': False,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.5,
+}
+
+
+def webhook_options():
+    return {**DEFAULTS, **getattr(settings, 'PAYMENT_WEBHOOKS', {})}
+
+
+def apply_notification(transaction_id, status):
+    """
+    Apply one notification. Returns 'applied', 'duplicate' (pair seen
+    before), 'ignored' (payment already settled) or 'unknown' (no such
+    transaction; nothing is recorded so a later delivery can still apply).
+    """
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                WebhookReceipt.objects.create(transaction_id=transaction_id, status=status)
+        except IntegrityError:
+            return 'duplicate'
+        if Payment.objects.filter(transaction_id=transaction_id, status='pending').update(status=status):
+            if status == 'success':
+                settle_bookings([transaction_id])
+            return 'applied'
+        if Payment.objects.filter(transaction_id=transaction_id).exists():
+            return 'ignored'
+        transaction.set_rollback(True)
+        return 'unknown'
+
+
+def apply_notifications(notifications):
+    """
+    Apply a batch of (transaction_id, status) pairs with set-based queries
+    and return a Counter of outcomes (same keys as apply_notification).
+    When one batch carries conflicting statuses for a transaction the first
+    one wins, as it would have arriving one by one.
+    """
+    outcome = Counter()
+    distinct = list(dict.fromkeys(notifications))
+    outcome['duplicate'] += len(notifications) - len(distinct)
+    transaction_ids = {transaction_id for transaction_id, _ in distinct}
+
+    with transaction.atomic():
+        known = set(Payment.objects.filter(transaction_id__in=transaction_ids)
+                    .values_list('transaction_id', flat=True))
+        seen = set(WebhookReceipt.objects.filter(transaction_id__in=known)
+                   .values_list('transaction_id', 'status'))
+        fresh = []
+        for pair in distinct:
+            if pair[0] not in known:
+                outcome['unknown'] += 1
+            elif pair in seen:
+                outcome['duplicate'] += 1
+            else:
+                fresh.append(pair)
+        WebhookReceipt.objects.bulk_create(
+            [WebhookReceipt(transaction_id=transaction_id, status=status) for transaction_id, status in fresh],
+            ignore_conflicts=True,
+        )
+
+        by_status, first = defaultdict(list), set()
+        for transaction_id, status in fresh:
+            if transaction_id not in first:
+                first.add(transaction_id)
+                by_status[status].append(transaction_id)
+        for status, ids in by_status.items():
+            outcome['applied'] += Payment.objects.filter(
+                transaction_id__in=ids, status='pending'
+            ).update(status=status)
+            if status == 'success':
+                settle_bookings(ids)
+        outcome['ignored'] += len(fresh) - outcome['applied']
+    return outcome
+
+
+class WebhookBuffer:
+    """Process-wide buffer used in batch mode; thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._timer = None
+        self.totals = Counter()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, transaction_id, status):
+        options = webhook_options()
+        with self._lock:
+            self._pending.append((transaction_id, status))
+            full = len(self._pending) >= options['BATCH_SIZE']
+            if not full and self._timer is None:
+                self._timer = threading.Timer(options['FLUSH_INTERVAL'], self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not batch:
+            return Counter()
+        try:
+            outcome = apply_notifications(batch)
+        except Exception:
+            with self._lock:
+                self._pending[:0] = batch  # keep them for the next flush
+            raise
+        self.totals.update(outcome)
+        return outcome
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread opened its own connection; don't leak it.
+            connections.close_all()
+
+
+webhook_buffer = WebhookBuffer()
+atexit.register(webhook_buffer.flush)